@@ -1,7 +1,8 @@
 import json
 import os
-import secrets
-import hashlib
+import hmac
+
+from session_token import issue_token, TOKEN_TTL
 
 def handler(event: dict, context) -> dict:
     '''Авторизация администратора для доступа к админ-панели'''
@@ -42,10 +43,25 @@ def handler(event: dict, context) -> dict:
                     })
                 }
             
+            if not os.environ.get('ADMIN_TOKEN_SECRET'):
+                return {
+                    'statusCode': 500,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({
+                        'success': False,
+                        'message': 'Секрет для подписи токенов не настроен'
+                    })
+                }
+            
             # Проверка логина и пароля
-            if username == admin_username and password == admin_password:
-                # Генерируем токен
-                token = secrets.token_urlsafe(32)
+            username_ok = hmac.compare_digest(username.encode(), admin_username.encode())
+            password_ok = hmac.compare_digest(password.encode(), admin_password.encode())
+            if username_ok and password_ok:
+                # Подписанный токен проверяется другими функциями без обращения к БД
+                token = issue_token(username)
                 
                 return {
                     'statusCode': 200,
@@ -55,7 +71,8 @@ def handler(event: dict, context) -> dict:
                     },
                     'body': json.dumps({
                         'success': True,
-                        'token': token
+                        'token': token,
+                        'expiresIn': TOKEN_TTL
                     })
                 }
             else:
@@ -0,0 +1,91 @@
+"""
+Подписанные HMAC-SHA256 токены сессии администратора.
+Проверка токена не требует обращения к БД: достаточно секрета ADMIN_TOKEN_SECRET.
+
+Одинаковая копия модуля лежит в backend/auth, backend/diagnostics, backend/generate-report, backend/mechanic-auth,
+backend/mechanics, backend/storage-info и backend/storage-cleanup — изменения вносить во все копии.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+TOKEN_TTL = 12 * 60 * 60
+TOKEN_HEADER = 'X-Auth-Token'
+
+_SECRET_CACHE = None
+
+
+def _secret() -> bytes:
+    global _SECRET_CACHE
+    if _SECRET_CACHE is None:
+        secret = os.environ.get('ADMIN_TOKEN_SECRET')
+        if not secret:
+            raise RuntimeError('ADMIN_TOKEN_SECRET не настроен')
+        _SECRET_CACHE = secret.encode()
+    return _SECRET_CACHE
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _sign(payload: str) -> bytes:
+    return hmac.new(_secret(), payload.encode(), hashlib.sha256).digest()
+
+
+def issue_token(subject: str, ttl: int = TOKEN_TTL) -> str:
+    '''Выпускает токен вида <payload>.<подпись> со сроком действия ttl секунд'''
+    now = int(time.time())
+    claims = {'sub': subject, 'iat': now, 'exp': now + ttl}
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode())
+    return f'{payload}.{_b64encode(_sign(payload))}'
+
+
+def verify_token(token: str):
+    '''Возвращает claims токена или None, если подпись неверна или срок истёк'''
+    if not token or token.count('.') != 1:
+        return None
+    payload, signature = token.split('.')
+    try:
+        if not hmac.compare_digest(_b64decode(signature), _sign(payload)):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(claims, dict) or claims.get('exp', 0) < time.time():
+        return None
+    return claims
+
+
+def get_request_token(event: dict):
+    '''Достаёт токен из заголовка X-Auth-Token (или Authorization: Bearer)'''
+    headers = event.get('headers') or {}
+    for key, value in headers.items():
+        name = key.lower()
+        if name == TOKEN_HEADER.lower():
+            return value
+        if name == 'authorization' and value and value.lower().startswith('bearer '):
+            return value[7:]
+    return None
+
+
+def require_admin(event: dict):
+    '''None, если запрос подписан действующим токеном администратора, иначе готовый ответ 401'''
+    if verify_token(get_request_token(event)):
+        return None
+    return {
+        'statusCode': 401,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps({'error': 'Требуется авторизация администратора'}),
+        'isBase64Encoded': False
+    }
@@ -0,0 +1,81 @@
+"""
+Подписи вопросов и ответов по кодам из справочников чек-листов.
+В checklist_answers хранятся коды ответов (answer_code) и свободный текст (answer_note),
+подписи подставляются при чтении. Старые строки, для которых код не удалось определить,
+по-прежнему хранят question_text и answer_value — они имеют приоритет.
+
+Одинаковая копия модуля (вместе с checklist_data.py и priemka_data.py) лежит в
+backend/max-webhook, backend/generate-report и backend/diagnostics — изменения вносить во все копии.
+"""
+from checklist_data import get_checklist_questions_full
+from priemka_data import get_priemka_questions
+
+# Типы диагностик, вопросы которых есть в справочниках
+CATALOG_TYPES = ('5min', 'priemka')
+
+# Основные ответы 5-ти минутки, общие для всех вопросов
+CHECKLIST_ANSWER_LABELS = {
+    'ok': 'Исправно',
+    'bad': 'Неисправно',
+    'na': 'Не предусмотрено',
+    'no_leaks': 'Нет течей',
+    'has_leaks': 'Есть течи',
+    'complete': 'Завершить, замечаний нет',
+    'add_notes': 'Добавить замечания',
+    'need_disassembly': 'Требуется дополнительный разбор',
+}
+
+PRIEMKA_ANSWER_LABELS = {
+    'complete': 'Замечаний нет',
+    'not_applicable': 'Не предусмотрено',
+}
+
+_QUESTION_INDEX = None
+
+
+def _questions():
+    global _QUESTION_INDEX
+    if _QUESTION_INDEX is None:
+        index = {}
+        for question in get_checklist_questions_full():
+            index[('5min', question['id'])] = question
+        for question in get_priemka_questions():
+            index[('priemka', question['id'])] = question
+        _QUESTION_INDEX = index
+    return _QUESTION_INDEX
+
+
+def find_question(diagnostic_type: str, question_number: int):
+    return _questions().get((diagnostic_type, question_number))
+
+
+def question_title(diagnostic_type: str, question_number: int, stored_text: str = None) -> str:
+    '''Текст вопроса: сохранённый в строке или из справочника'''
+    if stored_text:
+        return stored_text
+    question = find_question(diagnostic_type, question_number)
+    return question['title'] if question else f'Вопрос {question_number}'
+
+
+def answer_label(diagnostic_type: str, question_number: int, code: str, note: str = None, stored_label: str = None) -> str:
+    '''Подпись ответа по коду; свободный текст (answer_note) дописывается к подписи'''
+    if stored_label:
+        return stored_label
+    if diagnostic_type == 'priemka':
+        if code == 'photo':
+            return f'Фото прикреплено. Комментарий: {note}' if note else 'Фото прикреплено'
+        if code == 'add_notes':
+            return f'Замечания: {note}'
+        if code in PRIEMKA_ANSWER_LABELS:
+            return PRIEMKA_ANSWER_LABELS[code]
+    else:
+        if code == 'other':
+            return f'Иное: {note}'
+        if code in CHECKLIST_ANSWER_LABELS:
+            return CHECKLIST_ANSWER_LABELS[code]
+
+    question = find_question(diagnostic_type, question_number)
+    option = next((o for o in (question or {}).get('options', []) if o['value'] == code), None)
+    if option:
+        return option['label']
+    return note or code or ''
@@ -1,10 +1,43 @@
+import csv
+import gzip
 import json
 import os
+import re
+import tempfile
+import uuid
 import psycopg2
 import boto3
-from datetime import datetime
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
+from session_token import require_admin
+from answer_catalog import CATALOG_TYPES, answer_label, question_title
+
+# Максимум изменений в одном ответе инкрементальной синхронизации
+SYNC_PAGE_SIZE = 500
+# Курсор синхронизации: «граница.версия[.граница_следующего_курсора]»; старые курсоры — одно число (версия)
+SYNC_CURSOR_PATTERN = re.compile(r'^\d+(\.\d+){0,2}$')
+# Сколько хранятся надгробия удалённых диагностик; клиент с более старым курсором загружает список заново
+TOMBSTONE_RETENTION_DAYS = 30
+# Сколько строк выгрузки забирается с сервера за одно обращение к именованному курсору
+EXPORT_FETCH_SIZE = 2000
+EXPORT_FORMATS = ('csv', 'xlsx')
+# Выгрузка доступна по подписанной ссылке этот срок, секунды; старые файлы удаляет storage-cleanup
+EXPORT_URL_TTL = 15 * 60
+# Кириллические буквы госномера, совпадающие по написанию с латинскими (как в normalize_car_number в БД)
+CAR_NUMBER_LOOKALIKES = str.maketrans('АВЕКМНОРСТУХ', 'ABEKMHOPCTYX')
+HISTORY_LIMIT = 50
+# Минимальная длина части номера для нечёткого поиска: триграммный индекс работает от 3 символов
+FUZZY_MIN_LENGTH = 3
+# На сколько месяцев вперёд держим готовые секции таблиц диагностик (как в max-webhook)
+PARTITION_MONTHS_AHEAD = 2
+# Месяц (год, месяц), для которого секции уже проверены этим контейнером
+_partitions_checked_month = None
+EXPORT_COLUMNS = [
+    'ID диагностики', 'Дата', 'Механик', 'Гос. номер', 'Пробег', 'Тип',
+    '№ вопроса', 'Вопрос', 'Тип ответа', 'Ответ', 'Подответы', 'Фото'
+]
+
 def handler(event: dict, context) -> dict:
     '''API для сохранения и получения диагностик автомобилей'''
     
@@ -16,12 +49,20 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Cache-Control, If-None-Match'
+                'Access-Control-Allow-Headers': 'Content-Type, Cache-Control, If-None-Match, X-Auth-Token'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
+    query_params = event.get('queryStringParameters', {}) or {}
+    
+    # Удаление и выгрузка доступны только администратору; проверка подписи без обращения к БД
+    if method == 'DELETE' or (method == 'GET' and query_params.get('export')):
+        unauthorized = require_admin(event)
+        if unauthorized:
+            return unauthorized
+    
     db_url = os.environ.get('DATABASE_URL')
     schema = os.environ.get('MAIN_DB_SCHEMA')
     
@@ -49,7 +90,9 @@ def handler(event: dict, context) -> dict:
                 }
             
             krasnoyarsk_tz = ZoneInfo('Asia/Krasnoyarsk')
-            now_krsk = datetime.now(krasnoyarsk_tz).strftime('%Y-%m-%d %H:%M:%S')
+            now = datetime.now(krasnoyarsk_tz)
+            _ensure_partitions(conn, schema, now)
+            now_krsk = now.strftime('%Y-%m-%d %H:%M:%S')
             cur.execute(
                 f"INSERT INTO {schema}.diagnostics (mechanic, car_number, mileage, diagnostic_type, created_at, updated_at) "
                 f"VALUES ('{mechanic}', '{car_number}', {mileage}, '{diagnostic_type}', '{now_krsk}', '{now_krsk}') RETURNING id, created_at"
@@ -59,28 +102,40 @@ def handler(event: dict, context) -> dict:
             created_at = result[1]
             
             if checklist_answers:
+                cur.execute(
+                    f"UPDATE {schema}.diagnostics SET answer_count = %s, defect_count = %s, photo_count = %s WHERE id = %s",
+                    (
+                        len(checklist_answers),
+                        sum(1 for answer in checklist_answers if answer.get('answerValue') == 'bad'),
+                        sum(len(answer.get('photoUrls') or []) for answer in checklist_answers),
+                        diagnostic_id
+                    )
+                )
+                # Для справочных типов храним только коды, подписи подставляются при чтении
+                in_catalog = diagnostic_type in CATALOG_TYPES
                 for answer in checklist_answers:
-                    question_id = answer.get('questionId')
-                    question_text = answer.get('questionText', '').replace("'", "''")
-                    answer_value = answer.get('answerValue', '').replace("'", "''")
-                    answer_label = answer.get('answerLabel', '').replace("'", "''")
-                    sub_answers = json.dumps(answer.get('subAnswers', {})) if answer.get('subAnswers') else None
-                    text_input = answer.get('textInput', '').replace("'", "''") if answer.get('textInput') else None
-                    photo_urls = answer.get('photoUrls', [])
-                    
-                    photo_urls_str = 'NULL'
-                    if photo_urls:
-                        photo_urls_escaped = [url.replace("'", "''") for url in photo_urls]
-                        photo_urls_str = "ARRAY['" + "','".join(photo_urls_escaped) + "']"
-                    
-                    sub_answers_str = f"'{sub_answers}'" if sub_answers else 'NULL'
-                    text_input_str = f"'{text_input}'" if text_input else 'NULL'
-                    answer_type = 'single' if not answer.get('subAnswers') else 'multiple'
-                    
+                    sub_answers = answer.get('subAnswers')
+                    answer_type = 'single' if not sub_answers else 'multiple'
                     cur.execute(
                         f"INSERT INTO {schema}.checklist_answers "
-                        f"(diagnostic_id, question_number, question_text, answer_type, answer_value, sub_answers, photo_urls) "
-                        f"VALUES ({diagnostic_id}, {question_id}, '{question_text}', '{answer_type}', '{answer_label}', {sub_answers_str}, {photo_urls_str})"
+                        f"(diagnostic_id, question_number, question_text, answer_type, answer_code, answer_value, answer_note, sub_answers, photo_urls, diagnostic_created_at) "
+                        f"VALUES (%s, %s, %s, %s, %s, %s, %s, %s::jsonb, %s, %s) "
+                        f"ON CONFLICT (diagnostic_id, question_number, diagnostic_created_at) DO UPDATE SET "
+                        f"question_text = EXCLUDED.question_text, answer_type = EXCLUDED.answer_type, "
+                        f"answer_code = EXCLUDED.answer_code, answer_value = EXCLUDED.answer_value, "
+                        f"answer_note = EXCLUDED.answer_note, sub_answers = EXCLUDED.sub_answers, photo_urls = EXCLUDED.photo_urls",
+                        (
+                            diagnostic_id,
+                            answer.get('questionId'),
+                            None if in_catalog else answer.get('questionText', ''),
+                            answer_type,
+                            answer.get('answerValue') or None,
+                            None if in_catalog else answer.get('answerLabel', ''),
+                            answer.get('textInput') or None,
+                            json.dumps(sub_answers, ensure_ascii=False) if sub_answers else None,
+                            answer.get('photoUrls') or None,
+                            created_at
+                        )
                     )
             
             conn.commit()
@@ -100,7 +155,6 @@ def handler(event: dict, context) -> dict:
             }
         
         elif method == 'DELETE':
-            query_params = event.get('queryStringParameters', {}) or {}
             diagnostic_id = query_params.get('id')
             
             if not diagnostic_id:
@@ -115,7 +169,7 @@ def handler(event: dict, context) -> dict:
                 }
             
             cur.execute(
-                f"SELECT photo_url FROM {schema}.diagnostic_photos WHERE diagnostic_id = {diagnostic_id}"
+                f"SELECT DISTINCT photo_url FROM {schema}.diagnostic_photos WHERE diagnostic_id = {diagnostic_id}"
             )
             photo_rows = cur.fetchall()
 
@@ -158,9 +212,15 @@ def handler(event: dict, context) -> dict:
 
             print(f"[delete] Total deleted from S3: {deleted_count} files")
 
+            _subtract_defect_stats(cur, schema, int(diagnostic_id))
             cur.execute(f"DELETE FROM {schema}.diagnostic_photos WHERE diagnostic_id = {diagnostic_id}")
             cur.execute(f"DELETE FROM {schema}.checklist_answers WHERE diagnostic_id = {diagnostic_id}")
             cur.execute(f"DELETE FROM {schema}.diagnostics WHERE id = {diagnostic_id}")
+            cur.execute(
+                f"DELETE FROM {schema}.diagnostics_tombstones "
+                f"WHERE deleted_at < CURRENT_TIMESTAMP - make_interval(days => %s)",
+                (TOMBSTONE_RETENTION_DAYS,)
+            )
             conn.commit()
             
             return {
@@ -174,17 +234,122 @@ def handler(event: dict, context) -> dict:
             }
         
         elif method == 'GET':
-            query_params = event.get('queryStringParameters', {}) or {}
             diagnostic_id = query_params.get('id')
+            since = query_params.get('since')
+            export_format = query_params.get('export')
+            
+            if query_params.get('carNumber'):
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps(_car_history(cur, schema, query_params['carNumber']), ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            if query_params.get('view') == 'defect_stats':
+                try:
+                    stats = _defect_stats(cur, schema, query_params)
+                except ValueError:
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'Некорректные параметры статистики'}),
+                        'isBase64Encoded': False
+                    }
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps(stats, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            if export_format:
+                if export_format not in EXPORT_FORMATS:
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'Формат выгрузки: csv или xlsx'}),
+                        'isBase64Encoded': False
+                    }
+                try:
+                    date_from = datetime.strptime(query_params['from'], '%Y-%m-%d') if query_params.get('from') else None
+                    date_to = datetime.strptime(query_params['to'], '%Y-%m-%d') if query_params.get('to') else None
+                except ValueError:
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'Даты выгрузки в формате ГГГГ-ММ-ДД'}),
+                        'isBase64Encoded': False
+                    }
+                result = _export_diagnostics(
+                    conn, schema, export_format, date_from, date_to, query_params.get('type')
+                )
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps(result),
+                    'isBase64Encoded': False
+                }
+            
+            if since is not None:
+                if not SYNC_CURSOR_PATTERN.match(since):
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'Некорректный курсор синхронизации'}),
+                        'isBase64Encoded': False
+                    }
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps(_changes_since(cur, schema, since)),
+                    'isBase64Encoded': False
+                }
             
+            sync_cursor = None
             if diagnostic_id:
                 cur.execute(
-                    f"SELECT id, mechanic, car_number, mileage, diagnostic_type, created_at "
+                    f"SELECT {DIAGNOSTIC_COLUMNS} "
                     f"FROM {schema}.diagnostics WHERE id = {diagnostic_id}"
                 )
                 row = cur.fetchone()
                 
                 if not row:
+                    archived = _load_archived_diagnostic(cur, schema, int(diagnostic_id))
+                    if archived:
+                        return {
+                            'statusCode': 200,
+                            'headers': {
+                                'Content-Type': 'application/json',
+                                'Access-Control-Allow-Origin': '*'
+                            },
+                            'body': json.dumps(archived, ensure_ascii=False),
+                            'isBase64Encoded': False
+                        }
                     return {
                         'statusCode': 404,
                         'headers': {
@@ -195,40 +360,30 @@ def handler(event: dict, context) -> dict:
                         'isBase64Encoded': False
                     }
                 
-                diagnostic = {
-                    'id': row[0],
-                    'mechanic': row[1],
-                    'carNumber': row[2],
-                    'mileage': row[3],
-                    'diagnosticType': row[4],
-                    'createdAt': row[5].isoformat()
-                }
+                diagnostic = _row_to_diagnostic(row)
             else:
                 limit = query_params.get('limit', '50')
+                # Курсор берём до выборки: изменения между запросами придут повторно, но не потеряются
+                sync_cursor = _current_sync_cursor(cur, schema)
                 cur.execute(
-                    f"SELECT id, mechanic, car_number, mileage, diagnostic_type, created_at "
+                    f"SELECT {DIAGNOSTIC_COLUMNS} "
                     f"FROM {schema}.diagnostics WHERE completed = true ORDER BY created_at DESC LIMIT {limit}"
                 )
                 rows = cur.fetchall()
                 
-                diagnostic = [
-                    {
-                        'id': row[0],
-                        'mechanic': row[1],
-                        'carNumber': row[2],
-                        'mileage': row[3],
-                        'diagnosticType': row[4],
-                        'createdAt': row[5].isoformat()
-                    }
-                    for row in rows
-                ]
+                diagnostic = [_row_to_diagnostic(row) for row in rows]
+            
+            headers = {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            }
+            if sync_cursor is not None:
+                headers['X-Sync-Cursor'] = str(sync_cursor)
+                headers['Access-Control-Expose-Headers'] = 'X-Sync-Cursor'
             
             return {
                 'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
+                'headers': headers,
                 'body': json.dumps(diagnostic),
                 'isBase64Encoded': False
             }
@@ -257,4 +412,390 @@ def handler(event: dict, context) -> dict:
         if 'cur' in locals():
             cur.close()
         if 'conn' in locals():
-            conn.close()
\ No newline at end of file
+            conn.close()
+
+
+def _ensure_partitions(conn, schema, now):
+    '''Создание месячных секций диагностик на ближайшие месяцы (раз в месяц на контейнер), как в max-webhook'''
+    global _partitions_checked_month
+    month = (now.year, now.month)
+    if _partitions_checked_month == month:
+        return
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT {schema}.ensure_diagnostics_partitions(%s)", (PARTITION_MONTHS_AHEAD,))
+        created = cur.fetchone()[0]
+        conn.commit()
+        _partitions_checked_month = month
+        if created:
+            print(f"[INFO] Created {created} diagnostics partitions")
+    except Exception as e:
+        # Строки без своей секции попадают в секцию по умолчанию, сохранение диагностики не прерываем
+        conn.rollback()
+        print(f"[WARNING] Failed to ensure diagnostics partitions: {str(e)}")
+    finally:
+        cur.close()
+
+
+DIAGNOSTIC_COLUMNS = 'id, mechanic, car_number, mileage, diagnostic_type, created_at, photo_count, defect_count, answer_count'
+
+
+def _row_to_diagnostic(row):
+    return {
+        'id': row[0],
+        'mechanic': row[1],
+        'carNumber': row[2],
+        'mileage': row[3],
+        'diagnosticType': row[4],
+        'createdAt': row[5].isoformat(),
+        'photoCount': row[6],
+        'defectCount': row[7],
+        'answerCount': row[8]
+    }
+
+
+def _load_archived_diagnostic(cur, schema, diagnostic_id):
+    '''Диагностика из архива S3: читается только её gzip-член по смещению из archived_diagnostics'''
+    cur.execute(
+        f"SELECT archive_key, byte_offset, byte_length FROM {schema}.archived_diagnostics WHERE diagnostic_id = %s",
+        (diagnostic_id,)
+    )
+    location = cur.fetchone()
+    if not location:
+        return None
+    archive_key, offset, length = location
+
+    s3 = boto3.client('s3',
+        endpoint_url='https://bucket.poehali.dev',
+        aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+        aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
+    )
+    obj = s3.get_object(Bucket='files', Key=archive_key, Range=f"bytes={offset}-{offset + length - 1}")
+    record = json.loads(gzip.decompress(obj['Body'].read()).decode('utf-8'))
+
+    header = record['diagnostic']
+    diagnostic_type = header['diagnostic_type']
+    return {
+        'id': header['id'],
+        'mechanic': header['mechanic'],
+        'carNumber': header['car_number'],
+        'mileage': header['mileage'],
+        'diagnosticType': diagnostic_type,
+        'createdAt': header['created_at'],
+        'photoCount': header.get('photo_count', len(record['photos'])),
+        'defectCount': header.get('defect_count', 0),
+        'answerCount': header.get('answer_count', len(record['answers'])),
+        'archived': True,
+        'reportUrl': header.get('report_url'),
+        'reportWithPhotosUrl': header.get('report_with_photos_url'),
+        'answers': [
+            {
+                'questionNumber': answer['question_number'],
+                'question': question_title(diagnostic_type, answer['question_number'], answer.get('question_text')),
+                'answerCode': answer.get('answer_code'),
+                'answer': answer_label(
+                    diagnostic_type, answer['question_number'], answer.get('answer_code'),
+                    answer.get('answer_note'), answer.get('answer_value')
+                ),
+                'subAnswers': answer.get('sub_answers'),
+                'photoUrls': answer.get('photo_urls') or []
+            }
+            for answer in record['answers']
+        ],
+        'photos': [
+            {
+                'questionIndex': photo['question_index'],
+                'url': photo['photo_url'],
+                'caption': photo.get('caption')
+            }
+            for photo in record['photos']
+        ]
+    }
+
+
+def _snapshot_xmin(cur):
+    '''Самая старая незавершённая транзакция: изменения, которые ещё не видны, сделаны транзакциями не старше неё'''
+    cur.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+    return cur.fetchone()[0]
+
+
+def _current_sync_cursor(cur, schema):
+    '''Курсор для полной загрузки списка: всё, что зафиксируется после, имеет sync_xid не меньше границы'''
+    return f"{_snapshot_xmin(cur)}.0"
+
+
+def _changes_since(cur, schema, since):
+    '''Изменённые и удалённые диагностики после курсора, по возрастанию версии.
+    Версия выдаётся при изменении, а видна после фиксации, поэтому граница курсора — транзакция (sync_xid),
+    а не версия: изменения незавершённых транзакций придут в следующий раз, уже полученные могут прийти повторно'''
+    parts = [int(part) for part in since.split('.')]
+    if len(parts) == 1:
+        # Старый курсор — только версия
+        floor, after_version, next_floor = 0, parts[0], None
+    else:
+        floor, after_version = parts[0], parts[1]
+        next_floor = parts[2] if len(parts) == 3 else None
+    # Граница берётся до выборки; при постраничной выдаче — самая ранняя из границ всех страниц
+    xmin = _snapshot_xmin(cur)
+    next_floor = xmin if next_floor is None else min(next_floor, xmin)
+
+    cur.execute(
+        f"SELECT sync_version, id, false FROM {schema}.diagnostics "
+        f"WHERE sync_xid >= %s::text::xid8 AND sync_version > %s "
+        f"UNION ALL "
+        f"SELECT sync_version, diagnostic_id, true FROM {schema}.diagnostics_tombstones "
+        f"WHERE sync_xid >= %s::text::xid8 AND sync_version > %s "
+        f"ORDER BY 1 LIMIT %s",
+        (floor, after_version, floor, after_version, SYNC_PAGE_SIZE + 1)
+    )
+    changes = cur.fetchall()
+    has_more = len(changes) > SYNC_PAGE_SIZE
+    changes = changes[:SYNC_PAGE_SIZE]
+
+    changed_ids = [row[1] for row in changes if not row[2]]
+    deleted_ids = [row[1] for row in changes if row[2]]
+
+    items = []
+    if changed_ids:
+        # Незавершённые диагностики в список не попадают, но курсор их проходит
+        cur.execute(
+            f"SELECT {DIAGNOSTIC_COLUMNS} "
+            f"FROM {schema}.diagnostics WHERE id = ANY(%s) AND completed = true",
+            (changed_ids,)
+        )
+        items = [_row_to_diagnostic(row) for row in cur.fetchall()]
+
+    return {
+        'items': items,
+        'deleted': deleted_ids,
+        'cursor': f"{floor}.{changes[-1][0]}.{next_floor}" if has_more else f"{next_floor}.0",
+        'hasMore': has_more
+    }
+
+
+def normalize_car_number(value: str) -> str:
+    '''Госномер в нормализованном виде: верхний регистр, латиница, без пробелов и дефисов'''
+    return re.sub(r'[\s-]', '', value.upper().translate(CAR_NUMBER_LOOKALIKES))
+
+
+def _car_history(cur, schema, car_number):
+    '''История диагностик автомобиля с перечнем неисправностей; при отсутствии точного совпадения — поиск по части номера'''
+    normalized = normalize_car_number(car_number)
+    columns = (
+        f"SELECT {DIAGNOSTIC_COLUMNS} "
+        f"FROM {schema}.diagnostics "
+    )
+    cur.execute(
+        columns + "WHERE car_number_norm = %s AND completed = true ORDER BY created_at DESC LIMIT %s",
+        (normalized, HISTORY_LIMIT)
+    )
+    rows = cur.fetchall()
+    exact = bool(rows)
+
+    if not rows and len(normalized) >= FUZZY_MIN_LENGTH:
+        # % и _ из запроса ищутся как обычные символы, а не как шаблон LIKE
+        escaped = re.sub(r'([%_\\])', r'\\\1', normalized)
+        cur.execute(
+            columns + "WHERE car_number_norm LIKE %s ESCAPE '\\' AND completed = true "
+            "ORDER BY similarity(car_number_norm, %s) DESC, created_at DESC LIMIT %s",
+            (f"%{escaped}%", normalized, HISTORY_LIMIT)
+        )
+        rows = cur.fetchall()
+
+    defects = {}
+    # Ответы читаем только для диагностик, где по счётчику есть неисправности
+    defective_ids = [row[0] for row in rows if row[7]]
+    if defective_ids:
+        cur.execute(
+            f"SELECT a.diagnostic_id, d.diagnostic_type, a.question_number, a.question_text, a.sub_answers "
+            f"FROM {schema}.checklist_answers a JOIN {schema}.diagnostics d ON d.id = a.diagnostic_id "
+            f"WHERE a.diagnostic_id = ANY(%s) AND a.answer_code = 'bad' "
+            f"ORDER BY a.diagnostic_id, a.question_number",
+            (defective_ids,)
+        )
+        for diagnostic_id, diagnostic_type, question_number, question_text, sub_answers in cur.fetchall():
+            main = (sub_answers or {}).get('main')
+            codes = main if isinstance(main, list) else ([main] if main else [])
+            defects.setdefault(diagnostic_id, []).append({
+                'questionNumber': question_number,
+                'question': question_title(diagnostic_type, question_number, question_text),
+                'codes': codes
+            })
+
+    return {
+        'query': car_number,
+        'normalized': normalized,
+        'exact': exact,
+        'carNumbers': sorted({row[2] for row in rows}),
+        'diagnostics': [
+            dict(_row_to_diagnostic(row), defects=defects.get(row[0], []))
+            for row in rows
+        ]
+    }
+
+
+def _subtract_defect_stats(cur, schema, diagnostic_id):
+    '''Убирает дефекты удаляемой диагностики из агрегата defect_stats'''
+    cur.execute(
+        f"UPDATE {schema}.defect_stats s SET defect_count = s.defect_count - v.defect_count "
+        f"FROM {schema}.diagnostic_defects(%s) v "
+        f"WHERE s.week_start = v.week_start AND s.mechanic_id = v.mechanic_id "
+        f"AND s.question_number = v.question_number AND s.defect_code = v.defect_code "
+        f"AND EXISTS (SELECT 1 FROM {schema}.diagnostics d WHERE d.id = %s AND d.stats_counted)",
+        (diagnostic_id, diagnostic_id)
+    )
+    if cur.rowcount:
+        cur.execute(f"DELETE FROM {schema}.defect_stats WHERE defect_count <= 0")
+
+
+def _defect_stats(cur, schema, query_params):
+    '''Статистика дефектов из агрегата: по неделям и механикам, плюс самые частые пункты за период'''
+    conditions = ["TRUE"]
+    params = []
+    if query_params.get('from'):
+        conditions.append("s.week_start >= date_trunc('week', %s::date)::date")
+        params.append(datetime.strptime(query_params['from'], '%Y-%m-%d').date())
+    if query_params.get('to'):
+        conditions.append("s.week_start <= %s")
+        params.append(datetime.strptime(query_params['to'], '%Y-%m-%d').date())
+    if query_params.get('mechanicId'):
+        conditions.append("s.mechanic_id = %s")
+        params.append(int(query_params['mechanicId']))
+    where = ' AND '.join(conditions)
+
+    cur.execute(
+        f"SELECT s.week_start, s.mechanic_id, m.name, s.question_number, s.defect_code, s.defect_count "
+        f"FROM {schema}.defect_stats s "
+        f"LEFT JOIN {schema}.mechanics m ON m.id = s.mechanic_id "
+        f"WHERE {where} "
+        f"ORDER BY s.week_start DESC, s.defect_count DESC",
+        params
+    )
+    items = [
+        {
+            'weekStart': row[0].isoformat(),
+            'mechanicId': row[1] or None,
+            'mechanic': row[2],
+            'questionNumber': row[3],
+            'defectCode': row[4],
+            'count': row[5]
+        }
+        for row in cur.fetchall()
+    ]
+
+    cur.execute(
+        f"SELECT s.question_number, SUM(s.defect_count) AS total "
+        f"FROM {schema}.defect_stats s WHERE {where} "
+        f"GROUP BY s.question_number ORDER BY total DESC LIMIT 20",
+        params
+    )
+    top_questions = [{'questionNumber': row[0], 'count': int(row[1])} for row in cur.fetchall()]
+
+    return {'items': items, 'topQuestions': top_questions}
+
+
+def _export_rows(conn, schema, date_from, date_to, diagnostic_type):
+    '''Строки выгрузки из именованного (серверного) курсора: в памяти только текущая порция'''
+    conditions = ["d.completed = true"]
+    params = []
+    if date_from:
+        conditions.append("d.created_at >= %s")
+        params.append(date_from)
+    if date_to:
+        conditions.append("d.created_at < %s")
+        params.append(date_to + timedelta(days=1))
+    if diagnostic_type:
+        conditions.append("d.diagnostic_type = %s")
+        params.append(diagnostic_type)
+
+    cur = conn.cursor(name='diagnostics_export')
+    cur.itersize = EXPORT_FETCH_SIZE
+    try:
+        cur.execute(
+            f"SELECT d.id, d.created_at, d.mechanic, d.car_number, d.mileage, d.diagnostic_type, "
+            f"a.question_number, a.question_text, a.answer_type, a.answer_code, a.answer_value, a.answer_note, "
+            f"a.sub_answers, COALESCE(array_length(a.photo_urls, 1), 0) "
+            f"FROM {schema}.diagnostics d "
+            f"LEFT JOIN {schema}.checklist_answers a ON a.diagnostic_id = d.id "
+            f"WHERE {' AND '.join(conditions)} "
+            f"ORDER BY d.created_at, d.id, a.question_number",
+            params
+        )
+        for row in cur:
+            question_number = row[6]
+            has_answer = question_number is not None
+            yield [
+                row[0],
+                row[1].strftime('%Y-%m-%d %H:%M'),
+                row[2],
+                row[3],
+                row[4],
+                row[5],
+                question_number,
+                question_title(row[5], question_number, row[7]) if has_answer else None,
+                row[8],
+                answer_label(row[5], question_number, row[9], row[11], row[10]) if has_answer else None,
+                json.dumps(row[12], ensure_ascii=False) if row[12] is not None else None,
+                row[13],
+            ]
+    finally:
+        cur.close()
+
+
+def _export_diagnostics(conn, schema, export_format, date_from, date_to, diagnostic_type):
+    '''Пишет выгрузку построчно во временный файл и загружает его в S3'''
+    rows_written = 0
+    with tempfile.NamedTemporaryFile(suffix=f'.{export_format}', delete=False) as tmp:
+        tmp_path = tmp.name
+
+    try:
+        rows = _export_rows(conn, schema, date_from, date_to, diagnostic_type)
+        if export_format == 'csv':
+            # utf-8-sig — чтобы Excel правильно открыл кириллицу
+            with open(tmp_path, 'w', newline='', encoding='utf-8-sig') as f:
+                writer = csv.writer(f, delimiter=';')
+                writer.writerow(EXPORT_COLUMNS)
+                for row in rows:
+                    writer.writerow(row)
+                    rows_written += 1
+            content_type = 'text/csv'
+        else:
+            from openpyxl import Workbook
+            workbook = Workbook(write_only=True)
+            sheet = workbook.create_sheet('Диагностики')
+            sheet.append(EXPORT_COLUMNS)
+            for row in rows:
+                sheet.append(row)
+                rows_written += 1
+            workbook.save(tmp_path)
+            content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+        file_size = os.path.getsize(tmp_path)
+        timestamp = datetime.now(ZoneInfo('Asia/Krasnoyarsk')).strftime('%Y%m%d_%H%M%S')
+        s3_key = f"exports/diagnostics_{timestamp}_{uuid.uuid4().hex}.{export_format}"
+
+        s3 = boto3.client('s3',
+            endpoint_url='https://bucket.poehali.dev',
+            aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+            aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
+        )
+        # upload_file читает файл частями и при необходимости использует multipart-загрузку
+        s3.upload_file(tmp_path, 'files', s3_key, ExtraArgs={'ContentType': content_type})
+        # Данные только для администратора: не публичная ссылка CDN, а подписанная на короткий срок
+        url = s3.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': 'files', 'Key': s3_key},
+            ExpiresIn=EXPORT_URL_TTL
+        )
+    finally:
+        os.remove(tmp_path)
+
+    print(f"[export] {rows_written} rows, {file_size} bytes -> {s3_key}")
+
+    return {
+        'url': url,
+        'expiresIn': EXPORT_URL_TTL,
+        'format': export_format,
+        'rows': rows_written,
+        'size': file_size
+    }
@@ -1,11 +1,20 @@
 import json
 import os
 import gc
-import psycopg2
+import hashlib
+import html
+import multiprocessing
+import re
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+import psycopg2
 from zoneinfo import ZoneInfo
 from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.styles import ParagraphStyle
 from reportlab.lib.units import mm
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, PageBreak, Frame, PageTemplate, BaseDocTemplate, NextPageTemplate, KeepTogether
 from reportlab.lib.utils import ImageReader
@@ -17,6 +26,154 @@ import boto3
 from io import BytesIO
 import urllib.request
 from PIL import Image as PILImage
+from answer_catalog import answer_label, question_title
+from checklist_data import get_checklist_questions_full
+from session_token import require_admin
+
+FIRST_PAGE_BACKGROUND_URL = 'https://cdn.poehali.dev/projects/4bb6cea8-8d41-426a-b677-f4304502c188/bucket/1b9feaf1-b2e2-44e2-9d52-53bb62a5a421.png'
+OTHER_PAGES_BACKGROUND_URL = 'https://cdn.poehali.dev/projects/4bb6cea8-8d41-426a-b677-f4304502c188/bucket/e0986711-d405-44d1-a66b-83e4a1ba096d.png'
+# Кэш фонов в JPEG на время жизни контейнера
+FIRST_PAGE_BACKGROUND_PATH = '/tmp/hevsr_first_page.jpg'
+OTHER_PAGES_BACKGROUND_PATH = '/tmp/hevsr_background.jpg'
+FOOTER_COLOR = colors.HexColor('#666666')
+FONT_NAME = 'DejaVu'
+# Версия оформления отчёта: входит в отпечаток, при изменении вёрстки увеличить — готовые PDF перестроятся
+REPORT_TEMPLATE_VERSION = 3
+FONT_PATH = '/tmp/DejaVuSans.ttf'
+FONT_URL = 'https://cdn.jsdelivr.net/npm/dejavu-fonts-ttf@2.37.3/ttf/DejaVuSans.ttf'
+
+# Пакетная выгрузка отчётов: задача в maintenance_jobs, рендер в пуле процессов, результат — ZIP в S3
+BATCH_JOB_TYPE = 'report_batch'
+BATCH_WORKERS = min(4, os.cpu_count() or 1)
+# Отчётов за один заход пула; контрольная точка сохраняется после каждого
+BATCH_SLICE = BATCH_WORKERS * 2
+BATCH_MAX_REPORTS = 2000
+# Архив ни на что в БД не ссылается: ключ случайный, доступ — по подписанной ссылке,
+# старые архивы удаляет очистка хранилища (storage-cleanup, EXPORT_RETENTION)
+BATCH_EXPORT_PREFIX = 'exports/reports/'
+# Срок действия подписанной ссылки на архив, секунды
+BATCH_ZIP_URL_TTL = 15 * 60
+ZIP_PART_SIZE = 8 * 1024 * 1024
+ZIP_READ_CHUNK = 1024 * 1024
+# Сколько секунд работаем в одном вызове, если платформа не сообщает оставшееся время
+CHUNK_TIME_BUDGET = 20
+# Запас до таймаута функции: пачка рендера или сборка архива должны успеть завершиться
+TIMEOUT_RESERVE_MS = 60000
+# Пространство advisory-блокировок задач обслуживания (как в storage-cleanup; второй ключ — id задачи)
+JOB_LOCK_NAMESPACE = 7301
+
+# Оформление быстрого просмотра отчёта (format=html) в цветах PDF
+REPORT_HTML_STYLE = (
+    'body{font-family:"DejaVu Sans",Arial,sans-serif;max-width:820px;margin:24px auto;padding:0 16px;color:#000}'
+    'h1{color:#1E5BA8;text-align:center;font-size:24px}h2{color:#1E5BA8;font-size:18px;margin-top:24px}'
+    '.info{font-size:15px;line-height:1.6}.item{font-size:14px;margin:8px 0 12px 10px}'
+    '.photos{display:flex;flex-wrap:wrap;gap:8px;margin-top:6px}figure{margin:0}'
+    'img{width:160px;height:120px;object-fit:cover;border-radius:4px}'
+    'figcaption{font-size:12px;color:#555;max-width:160px}'
+)
+
+# Ответы акта приёмки, при которых фото вопроса в отчёт не выводятся
+PRIEMKA_NO_PHOTO_CODES = ('not_applicable', 'no_extra', 'complete')
+
+BATCH_EMPTY_PROGRESS = {
+    'total': 0,
+    'rendered': 0,
+    'cached': 0,
+    'failed': 0,
+    'zipFiles': 0,
+    'zipSize': 0,
+}
+
+# Стили отчёта создаются один раз при импорте; шрифт по имени подставляется при отрисовке
+TITLE_STYLE = ParagraphStyle(
+    'Title',
+    fontName=FONT_NAME,
+    fontSize=18,
+    alignment=TA_CENTER,
+    spaceAfter=10,
+    textColor=colors.HexColor('#1E5BA8'),
+    fontWeight='bold'
+)
+INFO_STYLE = ParagraphStyle(
+    'Info',
+    fontName=FONT_NAME,
+    fontSize=12,
+    alignment=TA_LEFT,
+    spaceAfter=4,
+    textColor=colors.black
+)
+SECTION_STYLE = ParagraphStyle(
+    'Section',
+    fontName=FONT_NAME,
+    fontSize=14,
+    alignment=TA_LEFT,
+    spaceAfter=6,
+    textColor=colors.HexColor('#1E5BA8'),
+    fontWeight='bold'
+)
+ITEM_STYLE = ParagraphStyle(
+    'Item',
+    fontName=FONT_NAME,
+    fontSize=11,
+    alignment=TA_LEFT,
+    spaceAfter=3,
+    textColor=colors.black,
+    leftIndent=10
+)
+CAPTION_STYLE = ParagraphStyle(
+    'Caption',
+    fontName=FONT_NAME,
+    fontSize=9,
+    alignment=TA_LEFT,
+    spaceAfter=2,
+    textColor=colors.HexColor('#555555'),
+    leftIndent=10
+)
+
+# Коды неисправностей, которых уже нет в справочнике, но которые встречаются в старых диагностиках
+LEGACY_DEFECT_LABELS = {
+    'worn': 'Изношена',
+    'cracked': 'Треснута',
+    'front-left': 'Передняя левая',
+    'front-right': 'Передняя правая',
+    'rear-left': 'Задняя левая',
+    'rear-right': 'Задняя правая',
+    'akb': 'АКБ',
+    'engine': 'Двигатель',
+    'brake': 'Тормоза',
+    'tread': 'Протектор',
+}
+
+
+def _option_tree(options):
+    """{код варианта: (подпись, подпункты)} по вариантам ответа из справочника"""
+    return {option['value']: (option['label'], _option_tree(option.get('subOptions', []))) for option in options}
+
+
+def _collect_labels(tree, labels):
+    for value, (label, children) in tree.items():
+        labels.setdefault(value, label)
+        _collect_labels(children, labels)
+    return labels
+
+
+# Подпункты ответа «Неисправно» по номеру вопроса 5-ти минутки — из checklist_data.py
+DEFECT_OPTIONS = {
+    question['id']: _option_tree(next((o for o in question['options'] if o['value'] == 'bad'), {}).get('subOptions', []))
+    for question in get_checklist_questions_full()
+}
+
+
+def _fallback_labels():
+    '''Каждый вопрос обходится по своему дереву: одинаковые коды ('bad') у разных вопросов не затирают подпункты друг друга'''
+    labels = dict(LEGACY_DEFECT_LABELS)
+    for question in get_checklist_questions_full():
+        _collect_labels(_option_tree(question['options']), labels)
+    return labels
+
+
+# Подпись по одному коду для строк, чьи подпункты не совпадают со справочником вопроса
+DEFECT_LABELS = _fallback_labels()
 
 
 def compress_photo(photo_data, max_dimension=1200, quality=60):
@@ -35,8 +192,892 @@ def compress_photo(photo_data, max_dimension=1200, quality=60):
     buf.close()
     return compressed
 
+def parse_defects(question_num, sub_answers):
+    """Подписи выбранных подпунктов неисправности: «узел» или «узел: проблема»"""
+    if not sub_answers:
+        return []
+    
+    options = DEFECT_OPTIONS.get(question_num, {})
+    
+    def label(value, tree):
+        if value in tree:
+            return tree[value][0]
+        return DEFECT_LABELS.get(value, value)
+    
+    defects = []
+    main = sub_answers.get('main')
+    
+    if isinstance(main, str):
+        defects.append(label(main, options))
+    elif isinstance(main, list):
+        for item in main:
+            sub_key = f'main-{item}'
+            if sub_key in sub_answers:
+                children = options[item][1] if item in options else {}
+                defects.append(f'{label(item, options)}: {label(sub_answers[sub_key], children)}')
+            else:
+                defects.append(label(item, options))
+    
+    return defects
+
+def report_fingerprint(diagnostic_data, with_photos, checklist_rows, photo_rows):
+    """SHA-256 всего, что попадает в отчёт: шапка, ответы, фото и версия шаблона"""
+    payload = {
+        'template': REPORT_TEMPLATE_VERSION,
+        'withPhotos': with_photos,
+        'header': [diagnostic_data['mechanic'], diagnostic_data['carNumber'], diagnostic_data['mileage'],
+                   diagnostic_data['diagnosticType'], diagnostic_data['createdAt'].isoformat()],
+        'answers': checklist_rows,
+        'photos': photo_rows
+    }
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def register_font():
+    """Шрифт с кириллицей: скачивается и регистрируется один раз на контейнер"""
+    if FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return
+    if not os.path.exists(FONT_PATH):
+        urllib.request.urlretrieve(FONT_URL, FONT_PATH)
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+def load_background(url, path):
+    """Фон страницы в JPEG (прозрачные области — белые, как лист): в PDF он заметно компактнее PNG.
+    Файл кэшируется по path на время жизни контейнера"""
+    if not os.path.exists(path):
+        with urllib.request.urlopen(url, timeout=30) as response:
+            source = PILImage.open(BytesIO(response.read()))
+            background = PILImage.new('RGB', source.size, 'white')
+            background.paste(source, mask=source.convert('RGBA').getchannel('A'))
+        background.save(path, format='JPEG', quality=85, optimize=True)
+        background.close()
+    return path
+
+def report_columns(with_photos):
+    """Столбцы диагностики для варианта отчёта: ссылка, размер, отпечаток"""
+    if with_photos:
+        return 'report_with_photos_url', 'report_with_photos_size', 'report_with_photos_fingerprint'
+    return 'report_url', 'report_size', 'report_fingerprint'
+
+def load_report_data(cur, schema, diagnostic_id, with_photos, all_photos=False):
+    """Данные отчёта без рендера: шапка, ответы с подписями, фото по вопросам, исправные и неисправные узлы.
+    Общие для PDF и быстрого просмотра (format=json|html). None — диагностика не найдена или не завершена"""
+    url_column, _, fingerprint_column = report_columns(with_photos)
+    cur.execute(
+        f"SELECT id, mechanic, car_number, mileage, diagnostic_type, created_at, {url_column}, {fingerprint_column} "
+        f"FROM {schema}.diagnostics WHERE id = %s AND completed = true",
+        (diagnostic_id,)
+    )
+    row = cur.fetchone()
+    
+    if not row:
+        return None
+    
+    diagnostic_data = {
+        'id': row[0],
+        'mechanic': row[1],
+        'carNumber': row[2],
+        'mileage': row[3],
+        'diagnosticType': row[4],
+        'createdAt': row[5]
+    }
+    previous_url, previous_fingerprint = row[6], row[7]
+    is_priemka = diagnostic_data['diagnosticType'] == 'priemka'
+    
+    cur.execute(
+        f"SELECT question_number, question_text, answer_code, answer_value, answer_note, sub_answers FROM {schema}.checklist_answers "
+        f"WHERE diagnostic_id = %s ORDER BY question_number",
+        (diagnostic_id,)
+    )
+    # Подписи вопросов и ответов — из справочника по кодам; у старых строк без кода код восстанавливается по подписи
+    legacy_codes = {'Исправно': 'ok', 'Неисправно': 'bad', 'Не предусмотрено': 'not_applicable', 'Замечаний нет': 'complete', 'Доп. фото нет': 'no_extra', 'Доп. Фото нет': 'no_extra'}
+    diagnostic_type = diagnostic_data['diagnosticType']
+    checklist_rows = []
+    for question_num, question_text, answer_code, answer_value, answer_note, sub_answers in cur.fetchall():
+        label = answer_label(diagnostic_type, question_num, answer_code, answer_note, answer_value)
+        if not answer_code:
+            answer_code = 'photo' if label.startswith('Фото прикреплено') else legacy_codes.get(label)
+        checklist_rows.append((
+            question_num,
+            question_title(diagnostic_type, question_num, question_text),
+            answer_code,
+            label,
+            sub_answers
+        ))
+    
+    # Фото нужны отчёту с фото и акту приёмки (в нём фото есть всегда), просмотру — всегда
+    photos_by_question = {}
+    photo_rows = []
+    if with_photos or is_priemka or all_photos:
+        cur.execute(
+            f"SELECT question_index, photo_url, caption FROM {schema}.diagnostic_photos "
+            f"WHERE diagnostic_id = %s ORDER BY question_index, created_at, id",
+            (diagnostic_id,)
+        )
+        photo_rows = cur.fetchall()
+        for question_idx, photo_url, caption in photo_rows:
+            if question_idx not in photos_by_question:
+                photos_by_question[question_idx] = []
+            photos_by_question[question_idx].append({'url': photo_url, 'caption': caption})
+    
+    working_items = []
+    broken_items = []
+    
+    for question_num, question, answer_code, answer, sub_answers in checklist_rows:
+        if answer_code == 'ok':
+            working_items.append(question)
+        elif answer_code == 'bad':
+            defect_details = parse_defects(question_num, sub_answers)
+            if defect_details:
+                broken_items.append((question_num, f'{question}: {", ".join(defect_details)}'))
+            else:
+                broken_items.append((question_num, question))
+    
+    return {
+        'diagnostic': diagnostic_data,
+        'previousUrl': previous_url,
+        'previousFingerprint': previous_fingerprint,
+        'isPriemka': is_priemka,
+        'checklistRows': checklist_rows,
+        'photoRows': photo_rows,
+        'photosByQuestion': photos_by_question,
+        'workingItems': working_items,
+        'brokenItems': broken_items
+    }
+
+def _local_created_at(created_at):
+    krasnoyarsk_tz = ZoneInfo('Asia/Krasnoyarsk')
+    if created_at.tzinfo is None:
+        return created_at.replace(tzinfo=krasnoyarsk_tz)
+    return created_at.astimezone(krasnoyarsk_tz)
+
+def _thumbnail_urls(cur, schema, photo_urls):
+    """Миниатюры фото, загруженных через upload-photo: рядом с нормализованным <имя>.jpg лежит <имя>.thumb.jpg.
+    У фото из бота миниатюр нет — для них в просмотре используется само фото"""
+    if not photo_urls:
+        return {}
+    bucket_prefix = f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/"
+    cur.execute(
+        f"SELECT object_key, photo_url FROM {schema}.photo_uploads WHERE photo_url = ANY(%s)",
+        (list(photo_urls),)
+    )
+    thumbs = {}
+    for object_key, photo_url in cur.fetchall():
+        # Производные построены, если ссылка ведёт не на сам оригинал
+        if photo_url != bucket_prefix + object_key and photo_url.endswith('.jpg'):
+            thumbs[photo_url] = photo_url[:-len('.jpg')] + '.thumb.jpg'
+    return thumbs
+
+def build_report_view(cur, schema, diagnostic_id, with_photos):
+    """Сводка отчёта без рендера PDF: те же разделы и подписи, фото — ссылками с миниатюрами.
+    pdfUrl — уже построенный и актуальный PDF (иначе null)"""
+    data = load_report_data(cur, schema, diagnostic_id, with_photos, all_photos=True)
+    if not data:
+        return None
+    diagnostic_data = data['diagnostic']
+    photos_by_question = data['photosByQuestion']
+    
+    pdf_photo_rows = data['photoRows'] if with_photos or data['isPriemka'] else []
+    fingerprint = report_fingerprint(diagnostic_data, with_photos, data['checklistRows'], pdf_photo_rows)
+    pdf_url = data['previousUrl'] if data['previousUrl'] and data['previousFingerprint'] == fingerprint else None
+    
+    thumbs = _thumbnail_urls(cur, schema, {row[1] for row in data['photoRows']})
+    
+    def photos(question_index):
+        return [
+            {'url': photo['url'], 'thumbUrl': thumbs.get(photo['url'], photo['url']), 'caption': photo['caption']}
+            for photo in photos_by_question.get(question_index, [])
+        ]
+    
+    view = {
+        'id': diagnostic_data['id'],
+        'diagnosticType': diagnostic_data['diagnosticType'],
+        'title': 'Акт приемки автомобиля' if data['isPriemka'] else 'Отчет по осмотру автомобиля',
+        'mechanic': diagnostic_data['mechanic'],
+        'carNumber': diagnostic_data['carNumber'],
+        'mileage': diagnostic_data['mileage'],
+        'createdAt': _local_created_at(diagnostic_data['createdAt']).isoformat(),
+        'pdfUrl': pdf_url,
+        'withPhotos': with_photos
+    }
+    if data['isPriemka']:
+        view['items'] = [
+            {
+                'questionNumber': question_num,
+                'question': question_text,
+                'answer': answer_value if answer_value and answer_code != 'photo' else None,
+                'photos': photos(question_num - 1) if answer_code not in PRIEMKA_NO_PHOTO_CODES else []
+            }
+            for question_num, question_text, answer_code, answer_value, _ in data['checklistRows']
+        ]
+    else:
+        view['workingItems'] = data['workingItems']
+        view['brokenItems'] = [
+            {'questionNumber': question_num, 'text': text, 'photos': photos(question_num - 1)}
+            for question_num, text in data['brokenItems']
+        ]
+    return view
+
+def render_report_html(view):
+    """Простая HTML-страница по сводке отчёта: без внешних ресурсов, кроме самих фото"""
+    esc = html.escape
+    
+    def photos_html(photos):
+        if not photos:
+            return ''
+        cells = ''.join(
+            f'<figure><a href="{esc(photo["url"])}" target="_blank"><img src="{esc(photo["thumbUrl"])}" loading="lazy" alt=""></a>'
+            + (f'<figcaption>Комментарий: {esc(photo["caption"])}</figcaption>' if photo['caption'] else '')
+            + '</figure>'
+            for photo in photos
+        )
+        return f'<div class="photos">{cells}</div>'
+    
+    created_at = datetime.fromisoformat(view['createdAt'])
+    mileage = f"{view['mileage']:,}".replace(',', ' ') if view['mileage'] is not None else '—'
+    parts = [
+        f'<h1>{esc(view["title"])}</h1>',
+        '<p class="info">'
+        f'<b>Дата:</b> {created_at.strftime("%d.%m.%Y %H:%M")}<br>'
+        f'<b>Механик:</b> {esc(view["mechanic"] or "")}<br>'
+        f'<b>Гос.номер:</b> {esc(view["carNumber"] or "")}<br>'
+        f'<b>Пробег:</b> {mileage} км</p>'
+    ]
+    if view.get('pdfUrl'):
+        parts.append(f'<p><a href="{esc(view["pdfUrl"])}" target="_blank">Открыть PDF</a></p>')
+    
+    if 'items' in view:
+        parts.append('<h2>Фотофиксация автомобиля</h2>')
+        for item in view['items']:
+            answer = f'<div>{esc(item["answer"])}</div>' if item['answer'] else ''
+            parts.append(f'<div class="item"><b>{esc(item["question"])}</b>{answer}{photos_html(item["photos"])}</div>')
+    else:
+        if view['workingItems']:
+            parts.append('<h2>Проверенные исправные узлы и детали автомобиля</h2><ul>')
+            parts.extend(f'<li>{esc(item)}</li>' for item in view['workingItems'])
+            parts.append('</ul>')
+        if view['brokenItems']:
+            parts.append('<h2>Обнаруженные неисправности:</h2>')
+            for item in view['brokenItems']:
+                parts.append(f'<div class="item">• {esc(item["text"])}{photos_html(item["photos"])}</div>')
+    
+    return (
+        '<!DOCTYPE html><html lang="ru"><head><meta charset="utf-8">'
+        '<meta name="viewport" content="width=device-width, initial-scale=1">'
+        f'<title>{esc(view["title"])} {esc(view["carNumber"] or "")}</title>'
+        f'<style>{REPORT_HTML_STYLE}</style></head><body>'
+        + ''.join(parts)
+        + '</body></html>'
+    )
+
+def build_report(conn, cur, schema, diagnostic_id, with_photos):
+    """Строит PDF отчёта диагностики и сохраняет ссылку в БД; неизменившийся отчёт берётся из кэша.
+    Возвращает (url, взят из кэша) или None, если диагностика не найдена или не завершена"""
+    url_column, size_column, fingerprint_column = report_columns(with_photos)
+    data = load_report_data(cur, schema, diagnostic_id, with_photos)
+    if not data:
+        return None
+    diagnostic_data = data['diagnostic']
+    previous_url = data['previousUrl']
+    is_priemka = data['isPriemka']
+    checklist_rows = data['checklistRows']
+    photos_by_question = data['photosByQuestion']
+    working_items = data['workingItems']
+    broken_items = data['brokenItems']
+    
+    fingerprint = report_fingerprint(diagnostic_data, with_photos, checklist_rows, data['photoRows'])
+    if previous_url and data['previousFingerprint'] == fingerprint:
+        print(f"[REPORT] Diagnostic {diagnostic_id}: report is up to date, {previous_url}")
+        return previous_url, True
+    
+    register_font()
+    
+    first_page_bg_path = load_background(FIRST_PAGE_BACKGROUND_URL, FIRST_PAGE_BACKGROUND_PATH)
+    other_pages_bg_path = load_background(OTHER_PAGES_BACKGROUND_URL, OTHER_PAGES_BACKGROUND_PATH)
+    
+    pdf_buffer = BytesIO()
+    
+    page_width, page_height = A4
+    
+    krasnoyarsk_tz = ZoneInfo('Asia/Krasnoyarsk')
+    created_at_raw = diagnostic_data['createdAt']
+    if created_at_raw.tzinfo is None:
+        created_at_local = created_at_raw.replace(tzinfo=krasnoyarsk_tz)
+    else:
+        created_at_local = created_at_raw.astimezone(krasnoyarsk_tz)
+    footer_date = created_at_local.strftime('%d.%m.%Y')
+    footer_time = created_at_local.strftime('%H:%M')
+    
+    footer_text = f"Отчет по осмотру автомобиля гос.номер: {diagnostic_data['carNumber']}, пробег: {diagnostic_data['mileage']} км, {footer_date}, {footer_time}"
+    
+    def page_background(form_name, background_path):
+        # Фон и постоянная часть колонтитула объявляются один раз как PDF-форма (XObject):
+        # следующие страницы только ссылаются на неё, заново рисуется лишь номер страницы
+        def draw(canvas, doc):
+            if not canvas.hasForm(form_name):
+                canvas.beginForm(form_name)
+                canvas.drawImage(background_path, 0, 0, width=page_width, height=page_height, preserveAspectRatio=False)
+                canvas.setFont(FONT_NAME, 8)
+                canvas.setFillColor(FOOTER_COLOR)
+                canvas.drawString(20*mm, 10*mm, footer_text)
+                canvas.endForm()
+            
+            canvas.saveState()
+            canvas.doForm(form_name)
+            canvas.setFont(FONT_NAME, 8)
+            canvas.setFillColor(FOOTER_COLOR)
+            canvas.drawRightString(page_width - 20*mm, 10*mm, f"Стр. {doc.page}")
+            canvas.restoreState()
+        return draw
+    
+    add_first_page_background = page_background('first_page_background', first_page_bg_path)
+    add_other_pages_background = page_background('other_pages_background', other_pages_bg_path)
+    
+    doc = BaseDocTemplate(pdf_buffer, pagesize=A4)
+    
+    first_page_frame = Frame(20*mm, 15*mm, page_width - 40*mm, page_height - 30*mm, 
+                            id='first', topPadding=70*mm)
+    other_pages_frame = Frame(20*mm, 15*mm, page_width - 40*mm, page_height - 30*mm, 
+                             id='normal', topPadding=50*mm)
+    
+    first_template = PageTemplate(id='first_page', frames=[first_page_frame], onPage=add_first_page_background)
+    other_template = PageTemplate(id='other_pages', frames=[other_pages_frame], onPage=add_other_pages_background)
+    doc.addPageTemplates([first_template, other_template])
+    
+    story = []
+    story.append(Spacer(1, 5*mm))
+    # Фото, которые не удалось скачать: такой отчёт неполный и не кэшируется по отпечатку
+    failed_photos = 0
+    
+    report_title = 'Акт приемки автомобиля' if diagnostic_data.get('diagnosticType') == 'priemka' else 'Отчет по осмотру автомобиля'
+    story.append(Paragraph(report_title, TITLE_STYLE))
+    story.append(Spacer(1, 8*mm))
+    
+    story.append(Paragraph(f'<b>Дата:</b> {created_at_local.strftime("%d.%m.%Y %H:%M")}', INFO_STYLE))
+    story.append(Paragraph(f'<b>Механик:</b> {diagnostic_data["mechanic"]}', INFO_STYLE))
+    story.append(Paragraph(f'<b>Гос.номер:</b> {diagnostic_data["carNumber"]}', INFO_STYLE))
+    story.append(Paragraph(f'<b>Пробег:</b> {diagnostic_data["mileage"]:,} км'.replace(',', ' '), INFO_STYLE))
+    story.append(Spacer(1, 8*mm))
+    
+    if is_priemka:
+        story.append(NextPageTemplate('other_pages'))
+        story.append(PageBreak())
+        
+        priemka_photos_by_q = photos_by_question
+        
+        is_first_priemka_block = True
+        for question_num, question_text, answer_code, answer_value, sub_answers in checklist_rows:
+            block = []
+            if is_first_priemka_block:
+                block.append(Paragraph('Фотофиксация автомобиля', SECTION_STYLE))
+                block.append(Spacer(1, 4*mm))
+                is_first_priemka_block = False
+            block.append(Paragraph(f'<b>{question_text}</b>', ITEM_STYLE))
+            
+            if answer_value and answer_code != 'photo':
+                block.append(Paragraph(f'  {answer_value}', ITEM_STYLE))
+            
+            q_index = question_num - 1
+            if q_index in priemka_photos_by_q and answer_code not in PRIEMKA_NO_PHOTO_CODES:
+                for photo_item in priemka_photos_by_q.pop(q_index):
+                    photo_url = photo_item['url']
+                    photo_caption = photo_item.get('caption')
+                    try:
+                        photo_resp = urllib.request.urlopen(photo_url)
+                        raw_data = photo_resp.read()
+                        photo_resp.close()
+                        photo_data = compress_photo(raw_data)
+                        del raw_data
+                        img_reader = ImageReader(BytesIO(photo_data))
+                        iw, ih = img_reader.getSize()
+                        max_w = 130*mm
+                        max_h = 180*mm
+                        scale = min(max_w / iw, max_h / ih)
+                        img = Image(BytesIO(photo_data), width=iw*scale, height=ih*scale)
+                        del photo_data
+                        block.append(Spacer(1, 2*mm))
+                        block.append(img)
+                        if photo_caption:
+                            block.append(Spacer(1, 1*mm))
+                            block.append(Paragraph(f'<i>Комментарий: {photo_caption}</i>', CAPTION_STYLE))
+                        gc.collect()
+                    except Exception as e:
+                        print(f"[WARNING] Could not load priemka photo {photo_url}: {str(e)}")
+                        failed_photos += 1
+            
+            block.append(Spacer(1, 4*mm))
+            story.append(KeepTogether(block))
+    else:
+        if working_items:
+            story.append(Paragraph('Проверенные исправные узлы и детали автомобиля', SECTION_STYLE))
+            for item in working_items:
+                story.append(Paragraph(f'• {item}', ITEM_STYLE))
+            story.append(Spacer(1, 6*mm))
+        
+        story.append(NextPageTemplate('other_pages'))
+        
+        if broken_items:
+            story.append(Paragraph('Обнаруженные неисправности:', SECTION_STYLE))
+            
+            for question_num, item in broken_items:
+                block = []
+                block.append(Paragraph(f'• {item}', ITEM_STYLE))
+                
+                photo_key = question_num - 1
+                if with_photos and photo_key in photos_by_question:
+                    block.append(Spacer(1, 2*mm))
+                    for photo_item in photos_by_question[photo_key]:
+                        photo_url = photo_item['url'] if isinstance(photo_item, dict) else photo_item
+                        photo_caption = photo_item.get('caption') if isinstance(photo_item, dict) else None
+                        try:
+                            photo_response = urllib.request.urlopen(photo_url)
+                            raw_data = photo_response.read()
+                            photo_response.close()
+                            photo_data = compress_photo(raw_data)
+                            del raw_data
+                            img_reader = ImageReader(BytesIO(photo_data))
+                            iw, ih = img_reader.getSize()
+                            max_w = 130*mm
+                            max_h = 180*mm
+                            scale = min(max_w / iw, max_h / ih)
+                            img = Image(BytesIO(photo_data), width=iw*scale, height=ih*scale)
+                            del photo_data
+                            block.append(Spacer(1, 2*mm))
+                            block.append(img)
+                            if photo_caption:
+                                block.append(Spacer(1, 1*mm))
+                                block.append(Paragraph(f'<i>Комментарий: {photo_caption}</i>', CAPTION_STYLE))
+                            gc.collect()
+                        except Exception as e:
+                            print(f"[WARNING] Could not load photo {photo_url}: {str(e)}")
+                            failed_photos += 1
+                
+                block.append(Spacer(1, 4*mm))
+                story.append(KeepTogether(block))
+            
+            story.append(Spacer(1, 8*mm))
+    
+    doc.build(story)
+    
+    pdf_content = pdf_buffer.getvalue()
+    pdf_buffer.close()
+    
+    s3 = boto3.client('s3',
+        endpoint_url='https://bucket.poehali.dev',
+        aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+        aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
+    )
+    
+    # Ключ зависит от отпечатка: одинаковые отчёты, построенные параллельно, пишутся в один объект
+    photo_suffix = '_with_photos' if with_photos else ''
+    file_key = f"reports/diagnostic_{diagnostic_id}{photo_suffix}_{fingerprint[:16]}.pdf"
+    s3.put_object(
+        Bucket='files',
+        Key=file_key,
+        Body=pdf_content,
+        ContentType='application/pdf'
+    )
+    
+    cdn_url = f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{file_key}"
+    
+    # Без отпечатка следующий запрос построит отчёт заново, а не отдаст PDF без части фото
+    if failed_photos:
+        print(f"[WARNING] Diagnostic {diagnostic_id}: {failed_photos} photo(s) missing, report is not cached")
+    cur.execute(
+        f"UPDATE {schema}.diagnostics SET {url_column} = %s, {size_column} = %s, {fingerprint_column} = %s WHERE id = %s",
+        (cdn_url, len(pdf_content), None if failed_photos else fingerprint, diagnostic_id)
+    )
+    conn.commit()
+    
+    # Устаревший PDF больше ни на что не ссылается — удаляем сразу, не дожидаясь очистки хранилища
+    bucket_prefix = f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/"
+    if previous_url and previous_url != cdn_url and previous_url.startswith(bucket_prefix + 'reports/'):
+        try:
+            s3.delete_object(Bucket='files', Key=previous_url[len(bucket_prefix):])
+        except Exception as e:
+            print(f"[WARNING] Could not delete superseded report {previous_url}: {str(e)}")
+    
+    return cdn_url, False
+
+class S3MultipartWriter:
+    """Файловый объект только для записи: данные уходят в S3 частями multipart-загрузки по мере накопления,
+    поэтому архив любого размера не держится в памяти целиком"""
+    
+    def __init__(self, s3, key, content_type):
+        self.s3 = s3
+        self.key = key
+        self.upload_id = s3.create_multipart_upload(Bucket='files', Key=key, ContentType=content_type)['UploadId']
+        self.parts = []
+        self.buffer = bytearray()
+        self.position = 0
+    
+    def write(self, data):
+        self.buffer += data
+        self.position += len(data)
+        while len(self.buffer) >= ZIP_PART_SIZE:
+            self._upload_part(bytes(self.buffer[:ZIP_PART_SIZE]))
+            del self.buffer[:ZIP_PART_SIZE]
+        return len(data)
+    
+    def tell(self):
+        return self.position
+    
+    def flush(self):
+        pass
+    
+    def _upload_part(self, data):
+        number = len(self.parts) + 1
+        response = self.s3.upload_part(Bucket='files', Key=self.key, UploadId=self.upload_id, PartNumber=number, Body=data)
+        self.parts.append({'PartNumber': number, 'ETag': response['ETag']})
+    
+    def complete(self):
+        if self.buffer or not self.parts:
+            self._upload_part(bytes(self.buffer))
+            self.buffer.clear()
+        self.s3.complete_multipart_upload(
+            Bucket='files', Key=self.key, UploadId=self.upload_id, MultipartUpload={'Parts': self.parts}
+        )
+    
+    def abort(self):
+        self.s3.abort_multipart_upload(Bucket='files', Key=self.key, UploadId=self.upload_id)
+
+def _render_batch_report(diagnostic_id, with_photos):
+    """Отчёт одной диагностики в процессе пула: у процесса своё подключение к БД"""
+    try:
+        conn = psycopg2.connect(os.environ.get('DATABASE_URL'))
+    except Exception as e:
+        return diagnostic_id, None, str(e)
+    try:
+        cur = conn.cursor()
+        result = build_report(conn, cur, os.environ.get('MAIN_DB_SCHEMA'), diagnostic_id, with_photos)
+        cur.close()
+        if not result:
+            return diagnostic_id, None, 'Диагностика не найдена или не завершена'
+        return diagnostic_id, result[1], None
+    except Exception as e:
+        conn.rollback()
+        return diagnostic_id, None, str(e)
+    finally:
+        conn.close()
+
+def _process_pool():
+    """Пул процессов для рендера; там, где платформа не даёт создавать процессы, отчёты строятся по очереди"""
+    try:
+        # spawn: дочерние процессы не наследуют подключение к БД и клиент S3 родителя
+        return ProcessPoolExecutor(max_workers=BATCH_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    except (OSError, NotImplementedError) as e:
+        print(f"[batch] Process pool unavailable, rendering sequentially: {e}")
+        return None
+
+def _has_time_left(context, started):
+    get_remaining = getattr(context, 'get_remaining_time_in_millis', None)
+    if callable(get_remaining):
+        try:
+            return get_remaining() > TIMEOUT_RESERVE_MS
+        except Exception:
+            pass
+    return time.monotonic() - started < CHUNK_TIME_BUDGET
+
+def _run_batch_chunk(conn, cur, schema, job, context):
+    """Рендерит отчёты пачками по BATCH_SLICE, пока есть время, сохраняя контрольную точку после пачки;
+    когда все отчёты готовы, собирает ZIP"""
+    started = time.monotonic()
+    job['error'] = None
+    checkpoint = job['checkpoint']
+    progress = job['progress']
+    ids = checkpoint['ids']
+    with_photos = checkpoint['withPhotos']
+    
+    if checkpoint['next'] < len(ids):
+        executor = _process_pool()
+        try:
+            while checkpoint['next'] < len(ids):
+                if not _has_time_left(context, started):
+                    print(f"[batch] Job {job['id']}: time budget exhausted, will resume from checkpoint")
+                    return
+                
+                batch = ids[checkpoint['next']:checkpoint['next'] + BATCH_SLICE]
+                flags = [with_photos] * len(batch)
+                if executor:
+                    try:
+                        results = list(executor.map(_render_batch_report, batch, flags))
+                    except BrokenProcessPool as e:
+                        print(f"[batch] Job {job['id']}: process pool broken, rendering sequentially: {e}")
+                        executor = None
+                        results = list(map(_render_batch_report, batch, flags))
+                else:
+                    results = list(map(_render_batch_report, batch, flags))
+                
+                for diagnostic_id, cached, error in results:
+                    if error:
+                        progress['failed'] += 1
+                        checkpoint['failedIds'].append(diagnostic_id)
+                        print(f"[batch] Job {job['id']}: report for diagnostic {diagnostic_id} failed: {error}")
+                    elif cached:
+                        progress['cached'] += 1
+                    else:
+                        progress['rendered'] += 1
+                checkpoint['next'] += len(batch)
+                
+                _save_job(cur, schema, job)
+                conn.commit()
+        finally:
+            if executor:
+                executor.shutdown()
+    
+    # Сборка архива — одна multipart-загрузка, поэтому начинаем её только с запасом времени
+    if not _has_time_left(context, started):
+        print(f"[batch] Job {job['id']}: reports ready, archive will be built on the next call")
+        return
+    
+    _write_batch_zip(cur, schema, job)
+    job['status'] = 'done'
+    _save_job(cur, schema, job)
+    conn.commit()
+    print(f"[batch] Job {job['id']} done: {json.dumps(progress)}")
+
+def _write_batch_zip(cur, schema, job):
+    """Потоково переписывает готовые PDF из S3 в один ZIP: каждый файл читается частями и сразу уходит в архив"""
+    checkpoint = job['checkpoint']
+    progress = job['progress']
+    url_column = 'report_with_photos_url' if checkpoint['withPhotos'] else 'report_url'
+    bucket_prefix = f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/"
+    failed = set(checkpoint['failedIds'])
+    cur.execute(
+        f"SELECT id, car_number, created_at, {url_column} FROM {schema}.diagnostics "
+        f"WHERE id = ANY(%s) ORDER BY created_at, id",
+        ([diagnostic_id for diagnostic_id in checkpoint['ids'] if diagnostic_id not in failed],)
+    )
+    reports = [row for row in cur.fetchall() if row[3] and row[3].startswith(bucket_prefix)]
+    
+    s3 = boto3.client('s3',
+        endpoint_url='https://bucket.poehali.dev',
+        aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+        aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
+    )
+    zip_key = f"{BATCH_EXPORT_PREFIX}report_batch_{job['id']}_{uuid.uuid4().hex}.zip"
+    writer = S3MultipartWriter(s3, zip_key, 'application/zip')
+    try:
+        # PDF уже сжат — файлы кладутся в архив без повторного сжатия
+        with zipfile.ZipFile(writer, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for diagnostic_id, car_number, created_at, report_url in reports:
+                car = re.sub(r'[^0-9A-Za-zА-Яа-яЁё-]', '', car_number or '')
+                entry = zipfile.ZipInfo(f"{created_at.strftime('%Y-%m-%d')}_{car}_{diagnostic_id}.pdf", created_at.timetuple()[:6])
+                body = s3.get_object(Bucket='files', Key=report_url[len(bucket_prefix):])['Body']
+                with archive.open(entry, 'w') as target:
+                    for chunk in body.iter_chunks(ZIP_READ_CHUNK):
+                        target.write(chunk)
+                body.close()
+        writer.complete()
+    except Exception:
+        writer.abort()
+        raise
+    
+    progress['zipFiles'] = len(reports)
+    progress['zipSize'] = writer.position
+    checkpoint['zipKey'] = zip_key
+
+BATCH_JOB_COLUMNS = 'id, status, checkpoint, progress, error, created_at, updated_at, finished_at'
+
+def _row_to_batch_job(row):
+    return {
+        'id': row[0],
+        'status': row[1],
+        'checkpoint': row[2] or {},
+        'progress': {**BATCH_EMPTY_PROGRESS, **(row[3] or {})},
+        'error': row[4],
+        'createdAt': row[5],
+        'updatedAt': row[6],
+        'finishedAt': row[7],
+    }
+
+def _load_batch_job(cur, schema, job_id=None):
+    if job_id:
+        cur.execute(
+            f"SELECT {BATCH_JOB_COLUMNS} FROM {schema}.maintenance_jobs WHERE id = %s AND job_type = %s",
+            (int(job_id), BATCH_JOB_TYPE)
+        )
+    else:
+        cur.execute(
+            f"SELECT {BATCH_JOB_COLUMNS} FROM {schema}.maintenance_jobs WHERE job_type = %s ORDER BY id DESC LIMIT 1",
+            (BATCH_JOB_TYPE,)
+        )
+    row = cur.fetchone()
+    return _row_to_batch_job(row) if row else None
+
+def _save_job(cur, schema, job):
+    cur.execute(
+        f"UPDATE {schema}.maintenance_jobs SET status = %s, checkpoint = %s::jsonb, progress = %s::jsonb, "
+        f"error = %s, updated_at = CURRENT_TIMESTAMP, "
+        f"finished_at = CASE WHEN %s <> 'running' THEN CURRENT_TIMESTAMP ELSE finished_at END "
+        f"WHERE id = %s RETURNING updated_at, finished_at",
+        (job['status'], json.dumps(job['checkpoint']), json.dumps(job['progress']),
+         job.get('error'), job['status'], job['id'])
+    )
+    job['updatedAt'], job['finishedAt'] = cur.fetchone()
+
+def _presigned_zip_url(zip_key):
+    """Подписанная ссылка на скачивание архива; выдаётся заново при каждом запросе прогресса"""
+    s3 = boto3.client('s3',
+        endpoint_url='https://bucket.poehali.dev',
+        aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+        aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
+    )
+    return s3.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': 'files', 'Key': zip_key},
+        ExpiresIn=BATCH_ZIP_URL_TTL
+    )
+
+def _batch_job_response(job):
+    progress = job['progress']
+    checkpoint = job['checkpoint']
+    return {
+        'jobId': job['id'],
+        'jobType': BATCH_JOB_TYPE,
+        'status': job['status'],
+        'done': job['status'] == 'done',
+        'filter': checkpoint.get('filter'),
+        'withPhotos': checkpoint.get('withPhotos'),
+        'total': progress['total'],
+        'processed': checkpoint.get('next', 0),
+        'rendered': progress['rendered'],
+        'cached': progress['cached'],
+        'failed': progress['failed'],
+        'failedIds': checkpoint.get('failedIds', []),
+        'zipFiles': progress['zipFiles'],
+        'zipSize': progress['zipSize'],
+        'zipUrl': _presigned_zip_url(checkpoint['zipKey']) if checkpoint.get('zipKey') else None,
+        'zipUrlExpiresIn': BATCH_ZIP_URL_TTL if checkpoint.get('zipKey') else None,
+        'error': job.get('error'),
+        'createdAt': job['createdAt'].isoformat() if job.get('createdAt') else None,
+        'updatedAt': job['updatedAt'].isoformat() if job.get('updatedAt') else None,
+        'finishedAt': job['finishedAt'].isoformat() if job.get('finishedAt') else None,
+    }
+
+def _json_response(status, payload):
+    return {
+        'statusCode': status,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps(payload),
+        'isBase64Encoded': False
+    }
+
+def _parse_batch_filter(body):
+    """Фильтр пакета из тела запроса: период обязателен, механик и тип — по желанию"""
+    try:
+        date_from = datetime.strptime(body.get('dateFrom') or '', '%Y-%m-%d').date()
+        date_to = datetime.strptime(body.get('dateTo') or '', '%Y-%m-%d').date()
+    except ValueError:
+        return None, 'dateFrom и dateTo обязательны в формате ГГГГ-ММ-ДД'
+    if date_to < date_from:
+        return None, 'dateTo раньше dateFrom'
+    diagnostic_type = body.get('diagnosticType') or None
+    if diagnostic_type and diagnostic_type not in ('5min', 'priemka'):
+        return None, 'Неизвестный тип диагностики'
+    return {
+        'dateFrom': date_from.isoformat(),
+        'dateTo': date_to.isoformat(),
+        'mechanic': body.get('mechanic') or None,
+        'diagnosticType': diagnostic_type
+    }, None
+
+def handle_batch(event, context):
+    """Пакетная выгрузка отчётов за период в один ZIP: POST запускает или продолжает задачу, GET — прогресс"""
+    unauthorized = require_admin(event)
+    if unauthorized:
+        return unauthorized
+    
+    is_get = event.get('httpMethod') == 'GET'
+    if is_get:
+        body = {}
+        job_id = (event.get('queryStringParameters', {}) or {}).get('jobId')
+    else:
+        try:
+            body = json.loads(event.get('body') or '{}')
+        except ValueError:
+            return _json_response(400, {'error': 'Некорректное тело запроса'})
+        if not isinstance(body, dict):
+            return _json_response(400, {'error': 'Некорректное тело запроса'})
+        job_id = body.get('jobId')
+    if job_id is not None and job_id != '' and not str(job_id).isdigit():
+        return _json_response(400, {'error': 'Некорректный jobId'})
+    
+    schema = os.environ.get('MAIN_DB_SCHEMA')
+    conn = psycopg2.connect(os.environ.get('DATABASE_URL'))
+    cur = conn.cursor()
+    try:
+        if is_get:
+            job = _load_batch_job(cur, schema, job_id)
+            if not job:
+                return _json_response(404, {'error': 'Задача не найдена'})
+            return _json_response(200, _batch_job_response(job))
+        
+        if job_id:
+            job = _load_batch_job(cur, schema, job_id)
+            if not job:
+                return _json_response(404, {'error': 'Задача не найдена'})
+        else:
+            batch_filter, error = _parse_batch_filter(body)
+            if error:
+                return _json_response(400, {'error': error})
+            conditions = ["completed = true", "created_at >= %s", "created_at < %s::date + 1"]
+            params = [batch_filter['dateFrom'], batch_filter['dateTo']]
+            if batch_filter['mechanic']:
+                conditions.append("mechanic = %s")
+                params.append(batch_filter['mechanic'])
+            if batch_filter['diagnosticType']:
+                conditions.append("diagnostic_type = %s")
+                params.append(batch_filter['diagnosticType'])
+            cur.execute(
+                f"SELECT id FROM {schema}.diagnostics WHERE {' AND '.join(conditions)} ORDER BY created_at, id",
+                params
+            )
+            # Набор диагностик фиксируется при создании задачи, чтобы продолжения работали с тем же списком
+            ids = [row[0] for row in cur.fetchall()]
+            if not ids:
+                return _json_response(404, {'error': 'За период нет завершённых диагностик'})
+            if len(ids) > BATCH_MAX_REPORTS:
+                return _json_response(400, {'error': f'В одном архиве не больше {BATCH_MAX_REPORTS} отчётов, найдено {len(ids)}'})
+            
+            checkpoint = {
+                'filter': batch_filter,
+                'withPhotos': bool(body.get('withPhotos')),
+                'ids': ids,
+                'next': 0,
+                'failedIds': []
+            }
+            cur.execute(
+                f"INSERT INTO {schema}.maintenance_jobs (job_type, dry_run, checkpoint, progress) "
+                f"VALUES (%s, false, %s::jsonb, %s::jsonb) RETURNING {BATCH_JOB_COLUMNS}",
+                (BATCH_JOB_TYPE, json.dumps(checkpoint), json.dumps({**BATCH_EMPTY_PROGRESS, 'total': len(ids)}))
+            )
+            job = _row_to_batch_job(cur.fetchone())
+            conn.commit()
+        
+        if job['status'] == 'running':
+            cur.execute("SELECT pg_try_advisory_lock(%s, %s)", (JOB_LOCK_NAMESPACE, job['id']))
+            if not cur.fetchone()[0]:
+                print(f"[batch] Job {job['id']} is being processed by another invocation")
+            else:
+                try:
+                    _run_batch_chunk(conn, cur, schema, job, context)
+                except Exception as e:
+                    conn.rollback()
+                    print(f"[batch] Job {job['id']} chunk failed: {e}")
+                    job['error'] = str(e)
+                    _save_job(cur, schema, job)
+                    conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+    
+    return _json_response(200, _batch_job_response(job))
+
 def handler(event: dict, context) -> dict:
-    '''API для генерации PDF отчёта по диагностике автомобиля'''
+    '''API для генерации PDF отчёта по диагностике автомобиля; пакетная выгрузка отчётов за период в ZIP (POST, jobId)'''
     
     method = event.get('httpMethod', 'GET')
     
@@ -45,13 +1086,20 @@ def handler(event: dict, context) -> dict:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
+    query_params = event.get('queryStringParameters', {}) or {}
+    if method == 'POST' or (method == 'GET' and 'jobId' in query_params):
+        try:
+            return handle_batch(event, context)
+        except Exception as e:
+            return _json_response(500, {'error': str(e)})
+    
     if method != 'GET':
         return {
             'statusCode': 405,
@@ -63,9 +1111,20 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
     
-    query_params = event.get('queryStringParameters', {}) or {}
     diagnostic_id = query_params.get('id')
     with_photos = query_params.get('with_photos', 'false').lower() == 'true'
+    output_format = query_params.get('format', 'pdf')
+    
+    if output_format not in ('pdf', 'json', 'html'):
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'format: pdf, json или html'}),
+            'isBase64Encoded': False
+        }
     
     if not diagnostic_id:
         return {
@@ -85,13 +1144,40 @@ def handler(event: dict, context) -> dict:
         conn = psycopg2.connect(db_url)
         cur = conn.cursor()
         
-        cur.execute(
-            f"SELECT id, mechanic, car_number, mileage, diagnostic_type, created_at "
-            f"FROM {schema}.diagnostics WHERE id = {diagnostic_id} AND completed = true"
-        )
-        row = cur.fetchone()
+        if output_format != 'pdf':
+            view = build_report_view(cur, schema, diagnostic_id, with_photos)
+            if not view:
+                return {
+                    'statusCode': 404,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Диагностика не найдена или не завершена'}),
+                    'isBase64Encoded': False
+                }
+            if output_format == 'html':
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'text/html; charset=utf-8',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': render_report_html(view),
+                    'isBase64Encoded': False
+                }
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps(view, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
         
-        if not row:
+        result = build_report(conn, cur, schema, diagnostic_id, with_photos)
+        if not result:
             return {
                 'statusCode': 404,
                 'headers': {
@@ -101,442 +1187,7 @@ def handler(event: dict, context) -> dict:
                 'body': json.dumps({'error': 'Диагностика не найдена или не завершена'}),
                 'isBase64Encoded': False
             }
-        
-        diagnostic_data = {
-            'id': row[0],
-            'mechanic': row[1],
-            'carNumber': row[2],
-            'mileage': row[3],
-            'diagnosticType': row[4],
-            'createdAt': row[5]
-        }
-        
-        cur.execute(
-            f"SELECT question_number, question_text, answer_value, sub_answers FROM {schema}.checklist_answers "
-            f"WHERE diagnostic_id = {diagnostic_id} ORDER BY question_number"
-        )
-        checklist_rows = cur.fetchall()
-        
-        photos_by_question = {}
-        if with_photos:
-            cur.execute(
-                f"SELECT question_index, photo_url, caption FROM {schema}.diagnostic_photos "
-                f"WHERE diagnostic_id = {diagnostic_id} ORDER BY question_index, created_at"
-            )
-            photo_rows = cur.fetchall()
-            for row in photo_rows:
-                question_idx = row[0]
-                photo_url = row[1]
-                caption = row[2] if len(row) > 2 else None
-                if question_idx not in photos_by_question:
-                    photos_by_question[question_idx] = []
-                photos_by_question[question_idx].append({'url': photo_url, 'caption': caption})
-        
-        defect_labels = {
-            'chips': 'Сколы',
-            'cracks': 'Трещины',
-            'discharged': 'Разряжена',
-            'missing': 'Отсутствует',
-            'damaged': 'Повреждена',
-            'smearing': 'Мажет',
-            'worn': 'Изношена',
-            'cracked': 'Треснута',
-            'left': 'Слева',
-            'right': 'Справа',
-            'center': 'По центру',
-            'front-left': 'Передняя левая',
-            'front-right': 'Передняя правая',
-            'rear-left': 'Задняя левая',
-            'rear-right': 'Задняя правая',
-            'srs': 'SRS',
-            'abs': 'ABS',
-            'akb': 'АКБ',
-            'check_engine': 'Check Engine',
-            'hybrid': 'Hybrid System / IMA',
-            'engine': 'Двигатель',
-            'battery': 'АКБ',
-            'oil': 'Масло',
-            'brake': 'Тормоза',
-            'right_mirror': 'Правое зеркало',
-            'left_mirror': 'Левое зеркало',
-            'right_main': 'Справа основной',
-            'left_main': 'Слева основной',
-            'right_wing': 'Справа крыло',
-            'left_wing': 'Слева крыло',
-            'pressure': 'Давление',
-            'bulges_cuts': 'Грыжи/порезы',
-            'valve_cracks': 'Вентиль трещины',
-            'missing_nut': 'Отсутствует гайка колеса',
-            'tread': 'Протектор',
-            'timing_belt': 'Ремень ГРМ',
-            'alternator_belt': 'Ремень генератора',
-            'power_steering_belt': 'Ремень ГУР',
-            'ac_belt': 'Ремень кондиционера',
-            'pump_belt': 'Ремень помпы',
-            'peeling': 'Отслоения',
-            'below': 'Ниже уровня',
-            '0-25': '0-25%',
-            '25-50': '25-50%',
-            '50-75': '50-75%',
-            '75-100': '75-100%',
-            'above': 'Выше уровня',
-            'fresh': 'Свежее',
-            'working': 'Рабочее',
-            'particles': 'С механическими примесями',
-            'water': 'Примеси воды / антифриза',
-            'burnt': 'Горелое',
-            'level': 'Уровень',
-            'red': 'Красный',
-            'green': 'Зеленый',
-            'blue': 'Синий',
-            'yellow': 'Желтый',
-            'clear': 'Бесцветный',
-            'clean': 'Чистая',
-            'cloudy': 'Мутная',
-            'less_25': 'Менее -25°С',
-            '25_35': '-25 - 35°С',
-            '35_45': '-35 - 45°С',
-            'more_45': 'Более -45°С',
-            'less_180': 'Менее 180°С',
-            'more_180': 'Более 180°С',
-            'need_disassembly': 'Требуется дополнительный разбор',
-            'present': 'Присутствует',
-            'frozen': 'Замерзла',
-            'noise': 'Посторонний шум',
-            'long_start': 'Длительный запуск',
-            'jamming': 'Заклинивание',
-            'uneven': 'Неровная работа',
-            'jolts': 'Пинки / Толчки',
-            'valve_cover': 'Течь клапанной крышки',
-            'turbo': 'Течь турбокомпрессора',
-            'oil_cooler': 'Течь охладителя масла',
-            'brake_fluid': 'Течь тормозной жидкости',
-            'coolant': 'Течь антифриза',
-            'dirty': 'Загрязнен',
-            'moisture': 'Попадание влаги',
-            'other_photo': 'Другое (см. фото)',
-        }
-        
-        def parse_defects(sub_answers):
-            if not sub_answers:
-                return []
-            
-            defects = []
-            main = sub_answers.get('main')
-            
-            if isinstance(main, str):
-                defects.append(defect_labels.get(main, main))
-            elif isinstance(main, list):
-                for item in main:
-                    sub_key = f'main-{item}'
-                    if sub_key in sub_answers:
-                        sub_value = sub_answers[sub_key]
-                        location = defect_labels.get(item, item)
-                        problem = defect_labels.get(sub_value, sub_value)
-                        defects.append(f'{location}: {problem}')
-                    else:
-                        defects.append(defect_labels.get(item, item))
-            
-            return defects
-        
-        working_items = []
-        broken_items = []
-        
-        for question_num, question, answer, sub_answers in checklist_rows:
-            if answer == 'Исправно':
-                working_items.append(question)
-            elif answer == 'Неисправно':
-                defect_details = parse_defects(sub_answers)
-                if defect_details:
-                    broken_items.append((question_num, f'{question}: {", ".join(defect_details)}'))
-                else:
-                    broken_items.append((question_num, question))
-        
-        font_path = '/tmp/DejaVuSans.ttf'
-        
-        if not os.path.exists(font_path):
-            font_url = 'https://cdn.jsdelivr.net/npm/dejavu-fonts-ttf@2.37.3/ttf/DejaVuSans.ttf'
-            urllib.request.urlretrieve(font_url, font_path)
-        
-        pdfmetrics.registerFont(TTFont('DejaVu', font_path))
-        font_name = 'DejaVu'
-        
-        first_page_bg_path = '/tmp/hevsr_first_page.png'
-        if not os.path.exists(first_page_bg_path):
-            first_page_url = 'https://cdn.poehali.dev/projects/4bb6cea8-8d41-426a-b677-f4304502c188/bucket/1b9feaf1-b2e2-44e2-9d52-53bb62a5a421.png'
-            urllib.request.urlretrieve(first_page_url, first_page_bg_path)
-        
-        other_pages_bg_path = '/tmp/hevsr_background.png'
-        if not os.path.exists(other_pages_bg_path):
-            other_pages_url = 'https://cdn.poehali.dev/projects/4bb6cea8-8d41-426a-b677-f4304502c188/bucket/e0986711-d405-44d1-a66b-83e4a1ba096d.png'
-            urllib.request.urlretrieve(other_pages_url, other_pages_bg_path)
-        
-        pdf_buffer = BytesIO()
-        
-        page_width, page_height = A4
-        
-        krasnoyarsk_tz = ZoneInfo('Asia/Krasnoyarsk')
-        created_at_raw = diagnostic_data['createdAt']
-        if created_at_raw.tzinfo is None:
-            created_at_local = created_at_raw.replace(tzinfo=krasnoyarsk_tz)
-        else:
-            created_at_local = created_at_raw.astimezone(krasnoyarsk_tz)
-        footer_date = created_at_local.strftime('%d.%m.%Y')
-        footer_time = created_at_local.strftime('%H:%M')
-        
-        def add_first_page_background(canvas, doc):
-            canvas.saveState()
-            canvas.drawImage(first_page_bg_path, 0, 0, 
-                           width=page_width, height=page_height, preserveAspectRatio=False, mask='auto')
-            
-            canvas.setFont(font_name, 8)
-            canvas.setFillColor(colors.HexColor('#666666'))
-            
-            footer_text = f"Отчет по осмотру автомобиля гос.номер: {diagnostic_data['carNumber']}, пробег: {diagnostic_data['mileage']} км, {footer_date}, {footer_time}"
-            canvas.drawString(20*mm, 10*mm, footer_text)
-            
-            page_number = f"Стр. {doc.page}"
-            canvas.drawRightString(page_width - 20*mm, 10*mm, page_number)
-            
-            canvas.restoreState()
-        
-        def add_other_pages_background(canvas, doc):
-            canvas.saveState()
-            canvas.drawImage(other_pages_bg_path, 0, 0, 
-                           width=page_width, height=page_height, preserveAspectRatio=False, mask='auto')
-            
-            canvas.setFont(font_name, 8)
-            canvas.setFillColor(colors.HexColor('#666666'))
-            
-            footer_text = f"Отчет по осмотру автомобиля гос.номер: {diagnostic_data['carNumber']}, пробег: {diagnostic_data['mileage']} км, {footer_date}, {footer_time}"
-            canvas.drawString(20*mm, 10*mm, footer_text)
-            
-            page_number = f"Стр. {doc.page}"
-            canvas.drawRightString(page_width - 20*mm, 10*mm, page_number)
-            
-            canvas.restoreState()
-        
-        doc = BaseDocTemplate(pdf_buffer, pagesize=A4)
-        
-        first_page_frame = Frame(20*mm, 15*mm, page_width - 40*mm, page_height - 30*mm, 
-                                id='first', topPadding=70*mm)
-        other_pages_frame = Frame(20*mm, 15*mm, page_width - 40*mm, page_height - 30*mm, 
-                                 id='normal', topPadding=50*mm)
-        
-        first_template = PageTemplate(id='first_page', frames=[first_page_frame], onPage=add_first_page_background)
-        other_template = PageTemplate(id='other_pages', frames=[other_pages_frame], onPage=add_other_pages_background)
-        doc.addPageTemplates([first_template, other_template])
-        
-        story = []
-        styles = getSampleStyleSheet()
-        
-        story.append(Spacer(1, 5*mm))
-        
-        title_style = ParagraphStyle(
-            'Title',
-            fontName=font_name,
-            fontSize=18,
-            alignment=TA_CENTER,
-            spaceAfter=10,
-            textColor=colors.HexColor('#1E5BA8'),
-            fontWeight='bold'
-        )
-        
-        report_title = 'Акт приемки автомобиля' if diagnostic_data.get('diagnosticType') == 'priemka' else 'Отчет по осмотру автомобиля'
-        story.append(Paragraph(report_title, title_style))
-        story.append(Spacer(1, 8*mm))
-        
-        info_style = ParagraphStyle(
-            'Info',
-            fontName=font_name,
-            fontSize=12,
-            alignment=TA_LEFT,
-            spaceAfter=4,
-            textColor=colors.black
-        )
-        
-        story.append(Paragraph(f'<b>Дата:</b> {created_at_local.strftime("%d.%m.%Y %H:%M")}', info_style))
-        story.append(Paragraph(f'<b>Механик:</b> {diagnostic_data["mechanic"]}', info_style))
-        story.append(Paragraph(f'<b>Гос.номер:</b> {diagnostic_data["carNumber"]}', info_style))
-        story.append(Paragraph(f'<b>Пробег:</b> {diagnostic_data["mileage"]:,} км'.replace(',', ' '), info_style))
-        story.append(Spacer(1, 8*mm))
-        
-        section_style = ParagraphStyle(
-            'Section',
-            fontName=font_name,
-            fontSize=14,
-            alignment=TA_LEFT,
-            spaceAfter=6,
-            textColor=colors.HexColor('#1E5BA8'),
-            fontWeight='bold'
-        )
-        
-        item_style = ParagraphStyle(
-            'Item',
-            fontName=font_name,
-            fontSize=11,
-            alignment=TA_LEFT,
-            spaceAfter=3,
-            textColor=colors.black,
-            leftIndent=10
-        )
-        
-        is_priemka = diagnostic_data.get('diagnosticType') == 'priemka'
-        
-        if is_priemka:
-            story.append(NextPageTemplate('other_pages'))
-            story.append(PageBreak())
-            
-            priemka_photos_by_q = {}
-            cur.execute(
-                f"SELECT question_index, photo_url, caption FROM {schema}.diagnostic_photos "
-                f"WHERE diagnostic_id = {diagnostic_id} ORDER BY question_index, created_at"
-            )
-            priemka_photo_rows = cur.fetchall()
-            for row in priemka_photo_rows:
-                q_idx = row[0]
-                p_url = row[1]
-                p_caption = row[2] if len(row) > 2 else None
-                if q_idx not in priemka_photos_by_q:
-                    priemka_photos_by_q[q_idx] = []
-                priemka_photos_by_q[q_idx].append({'url': p_url, 'caption': p_caption})
-            
-            is_first_priemka_block = True
-            for question_num, question_text, answer_value, sub_answers in checklist_rows:
-                block = []
-                if is_first_priemka_block:
-                    block.append(Paragraph('Фотофиксация автомобиля', section_style))
-                    block.append(Spacer(1, 4*mm))
-                    is_first_priemka_block = False
-                block.append(Paragraph(f'<b>{question_text}</b>', item_style))
-                
-                if answer_value and not answer_value.startswith('Фото прикреплено'):
-                    block.append(Paragraph(f'  {answer_value}', item_style))
-                
-                caption_style = ParagraphStyle(
-                    'Caption',
-                    fontName=font_name,
-                    fontSize=9,
-                    alignment=TA_LEFT,
-                    spaceAfter=2,
-                    textColor=colors.HexColor('#555555'),
-                    leftIndent=10
-                )
-                
-                q_index = question_num - 1
-                if q_index in priemka_photos_by_q and answer_value not in ('Не предусмотрено', 'Доп. фото нет', 'Замечаний нет', 'Доп. Фото нет'):
-                    for photo_item in priemka_photos_by_q.pop(q_index):
-                        photo_url = photo_item['url']
-                        photo_caption = photo_item.get('caption')
-                        try:
-                            photo_resp = urllib.request.urlopen(photo_url)
-                            raw_data = photo_resp.read()
-                            photo_resp.close()
-                            photo_data = compress_photo(raw_data)
-                            del raw_data
-                            img_reader = ImageReader(BytesIO(photo_data))
-                            iw, ih = img_reader.getSize()
-                            max_w = 130*mm
-                            max_h = 180*mm
-                            scale = min(max_w / iw, max_h / ih)
-                            img = Image(BytesIO(photo_data), width=iw*scale, height=ih*scale)
-                            del photo_data
-                            block.append(Spacer(1, 2*mm))
-                            block.append(img)
-                            if photo_caption:
-                                block.append(Spacer(1, 1*mm))
-                                block.append(Paragraph(f'<i>Комментарий: {photo_caption}</i>', caption_style))
-                            gc.collect()
-                        except Exception as e:
-                            print(f"[WARNING] Could not load priemka photo {photo_url}: {str(e)}")
-                
-                block.append(Spacer(1, 4*mm))
-                story.append(KeepTogether(block))
-        else:
-            if working_items:
-                story.append(Paragraph('Проверенные исправные узлы и детали автомобиля', section_style))
-                for item in working_items:
-                    story.append(Paragraph(f'• {item}', item_style))
-                story.append(Spacer(1, 6*mm))
-            
-            story.append(NextPageTemplate('other_pages'))
-            
-            if broken_items:
-                story.append(Paragraph('Обнаруженные неисправности:', section_style))
-                
-                caption_style = ParagraphStyle(
-                    'PhotoCaption',
-                    fontName=font_name,
-                    fontSize=9,
-                    alignment=TA_LEFT,
-                    spaceAfter=2,
-                    textColor=colors.HexColor('#555555'),
-                    leftIndent=10
-                )
-                
-                for question_num, item in broken_items:
-                    block = []
-                    block.append(Paragraph(f'• {item}', item_style))
-                    
-                    photo_key = question_num - 1
-                    if with_photos and photo_key in photos_by_question:
-                        block.append(Spacer(1, 2*mm))
-                        for photo_item in photos_by_question[photo_key]:
-                            photo_url = photo_item['url'] if isinstance(photo_item, dict) else photo_item
-                            photo_caption = photo_item.get('caption') if isinstance(photo_item, dict) else None
-                            try:
-                                photo_response = urllib.request.urlopen(photo_url)
-                                raw_data = photo_response.read()
-                                photo_response.close()
-                                photo_data = compress_photo(raw_data)
-                                del raw_data
-                                img_reader = ImageReader(BytesIO(photo_data))
-                                iw, ih = img_reader.getSize()
-                                max_w = 130*mm
-                                max_h = 180*mm
-                                scale = min(max_w / iw, max_h / ih)
-                                img = Image(BytesIO(photo_data), width=iw*scale, height=ih*scale)
-                                del photo_data
-                                block.append(Spacer(1, 2*mm))
-                                block.append(img)
-                                if photo_caption:
-                                    block.append(Spacer(1, 1*mm))
-                                    block.append(Paragraph(f'<i>Комментарий: {photo_caption}</i>', caption_style))
-                                gc.collect()
-                            except Exception as e:
-                                print(f"[WARNING] Could not load photo {photo_url}: {str(e)}")
-                    
-                    block.append(Spacer(1, 4*mm))
-                    story.append(KeepTogether(block))
-                
-                story.append(Spacer(1, 8*mm))
-        
-        doc.build(story)
-        
-        pdf_content = pdf_buffer.getvalue()
-        pdf_buffer.close()
-        
-        s3 = boto3.client('s3',
-            endpoint_url='https://bucket.poehali.dev',
-            aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
-            aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
-        )
-        
-        now_krasnoyarsk = datetime.now(krasnoyarsk_tz)
-        photo_suffix = '_with_photos' if with_photos else ''
-        file_key = f"reports/diagnostic_{diagnostic_id}{photo_suffix}_{now_krasnoyarsk.strftime('%Y%m%d_%H%M%S')}.pdf"
-        s3.put_object(
-            Bucket='files',
-            Key=file_key,
-            Body=pdf_content,
-            ContentType='application/pdf'
-        )
-        
-        cdn_url = f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{file_key}"
-        
-        url_column = 'report_with_photos_url' if with_photos else 'report_url'
-        cur.execute(f"UPDATE {schema}.diagnostics SET {url_column} = '{cdn_url}' WHERE id = {diagnostic_id}")
-        conn.commit()
+        pdf_url, cached = result
         
         return {
             'statusCode': 200,
@@ -545,8 +1196,9 @@ def handler(event: dict, context) -> dict:
                 'Access-Control-Allow-Origin': '*'
             },
             'body': json.dumps({
-                'pdfUrl': cdn_url,
-                'message': 'PDF отчёт успешно сгенерирован'
+                'pdfUrl': pdf_url,
+                'cached': cached,
+                'message': 'PDF отчёт актуален' if cached else 'PDF отчёт успешно сгенерирован'
             }),
             'isBase64Encoded': False
         }
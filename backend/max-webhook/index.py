@@ -1,25 +1,55 @@
 import json
 import os
+import re
+import threading
+import time
 import requests
 import psycopg2
 from psycopg2 import pool
 import boto3
 import base64
+import hashlib
+import tempfile
+import uuid
+from boto3.s3.transfer import TransferConfig
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from io import BytesIO
 from checklist_data import get_checklist_questions_full
 from priemka_data import get_priemka_questions
-
-# Connection pool для оптимизации работы с БД
+from answer_catalog import question_title
+from photo_hash import find_similar, photo_dhash
+
+# Кириллические буквы госномера, совпадающие по написанию с латинскими (как в normalize_car_number в БД)
+CAR_NUMBER_LOOKALIKES = str.maketrans('АВЕКМНОРСТУХ', 'ABEKMHOPCTYX')
+# Время жизни результата поиска прошлого осмотра в кэше
+PREVIOUS_DEFECTS_TTL = 300
+# Сколько ждём фоновую предзагрузку перед тем, как запросить БД самим
+PREVIOUS_DEFECTS_WAIT = 1.5
+PREVIOUS_DEFECTS_MAX_LINES = 15
+# На сколько месяцев вперёд держим готовые секции таблиц диагностик
+PARTITION_MONTHS_AHEAD = 2
+# Потоковая передача фото из MAX в S3: части по 5 МБ (минимум S3) загружаются, пока скачиваются следующие
+PHOTO_TRANSFER_CONFIG = TransferConfig(multipart_threshold=5 * 1024 * 1024, multipart_chunksize=5 * 1024 * 1024, max_concurrency=4)
+# Копия фото для dHash держится в памяти до этого размера, дальше — во временном файле
+PHOTO_SPOOL_MAX_SIZE = 1024 * 1024
+
+# Connection pool для оптимизации работы с БД (потокобезопасный: им пользуется фоновая предзагрузка)
 _db_pool = None
+# Прошлые осмотры по нормализованному госномеру: номер -> (expires_at, результат)
+_previous_defects_cache = {}
+# Незавершённые фоновые предзагрузки: номер -> поток
+_previous_defects_pending = {}
+_previous_defects_lock = threading.Lock()
+# Месяц (год, месяц), для которого секции уже проверены этим контейнером
+_partitions_checked_month = None
 
 def get_db_pool():
     '''Получение connection pool (singleton)'''
     global _db_pool
     if _db_pool is None:
         db_url = os.environ.get('DATABASE_URL')
-        _db_pool = pool.SimpleConnectionPool(1, 5, db_url)
+        _db_pool = pool.ThreadedConnectionPool(1, 5, db_url)
     return _db_pool
 
 
@@ -310,6 +340,7 @@ def handle_message(update: dict):
             send_message(sender_id, response_text)
         elif len(clean_number) >= 5:
             session['car_number'] = clean_number
+            prefetch_previous_defects(clean_number)
             diagnostic_type = session.get('diagnostic_type', '')
             if diagnostic_type == 'priemka':
                 diagnostic_id = save_diagnostic(session)
@@ -323,6 +354,7 @@ def handle_message(update: dict):
                     save_session(str(sender_id), session)
                     response_text = f'\u2705 \u0413\u043e\u0441\u043d\u043e\u043c\u0435\u0440 {clean_number} \u043f\u0440\u0438\u043d\u044f\u0442! \u041d\u0430\u0447\u0438\u043d\u0430\u0435\u043c \u041f\u0440\u0438\u0435\u043c\u043a\u0443.'
                     send_message(sender_id, response_text)
+                    send_previous_defects(sender_id, clean_number)
                     send_priemka_question(sender_id, session)
                 else:
                     response_text = '\u274c \u041e\u0448\u0438\u0431\u043a\u0430 \u043f\u0440\u0438 \u0441\u043e\u0445\u0440\u0430\u043d\u0435\u043d\u0438\u0438 \u0434\u0438\u0430\u0433\u043d\u043e\u0441\u0442\u0438\u043a\u0438. \u041f\u043e\u043f\u0440\u043e\u0431\u0443\u0439\u0442\u0435 \u0441\u043d\u043e\u0432\u0430 /start'
@@ -356,6 +388,7 @@ def handle_message(update: dict):
                     save_session(str(sender_id), session)
                     response_text = f'\u2705 \u041f\u0440\u043e\u0431\u0435\u0433 {int(mileage_str):,} \u043a\u043c \u043f\u0440\u0438\u043d\u044f\u0442! \u041d\u0430\u0447\u0438\u043d\u0430\u0435\u043c 5-\u0442\u0438 \u043c\u0438\u043d\u0443\u0442\u043a\u0443.'.replace(',', ' ')
                     send_message(sender_id, response_text)
+                    send_previous_defects(sender_id, session.get('car_number', ''))
                     send_checklist_question(sender_id, session)
                 else:
                     response_text = '\u274c \u041e\u0448\u0438\u0431\u043a\u0430 \u043f\u0440\u0438 \u0441\u043e\u0445\u0440\u0430\u043d\u0435\u043d\u0438\u0438 \u0434\u0438\u0430\u0433\u043d\u043e\u0441\u0442\u0438\u043a\u0438. \u041f\u043e\u043f\u0440\u043e\u0431\u0443\u0439\u0442\u0435 \u0441\u043d\u043e\u0432\u0430 /start'
@@ -570,9 +603,10 @@ def handle_callback(update: dict):
                     
                     cur.execute(
                         f"DELETE FROM {schema}.checklist_answers "
-                        f"WHERE diagnostic_id = %s AND question_number = %s",
+                        f"WHERE diagnostic_id = %s AND question_number = %s RETURNING answer_code",
                         (diagnostic_id, prev_question_number)
                     )
+                    deleted_codes = [row[0] for row in cur.fetchall()]
                     
                     questions = get_checklist_questions()
                     prev_index = next((i for i, q in enumerate(questions) if q['id'] == prev_question_number), 0)
@@ -582,6 +616,12 @@ def handle_callback(update: dict):
                         f"WHERE diagnostic_id = %s AND question_index = %s",
                         (diagnostic_id, prev_index)
                     )
+                    adjust_diagnostic_counters(
+                        cur, diagnostic_id,
+                        photos=-cur.rowcount,
+                        answers=-len(deleted_codes),
+                        defects=-deleted_codes.count('bad')
+                    )
                     prev_conn.commit()
                     
                     session['question_index'] = prev_index
@@ -698,8 +738,145 @@ def handle_phone_auth(sender_id: str, session: dict, contact_attachment: dict):
             get_db_pool().putconn(conn)
 
 
+def adjust_diagnostic_counters(cur, diagnostic_id: int, photos: int = 0, answers: int = 0, defects: int = 0):
+    '''Изменяет счётчики фото, ответов и дефектов диагностики в транзакции, которая пишет сами записи'''
+    schema = os.environ.get('MAIN_DB_SCHEMA')
+    cur.execute(
+        f"UPDATE {schema}.diagnostics SET "
+        f"photo_count = GREATEST(photo_count + %s, 0), "
+        f"answer_count = GREATEST(answer_count + %s, 0), "
+        f"defect_count = GREATEST(defect_count + %s, 0) "
+        f"WHERE id = %s",
+        (photos, answers, defects, diagnostic_id)
+    )
+
+
+def normalize_car_number(value: str) -> str:
+    '''Госномер в нормализованном виде: верхний регистр, латиница, без пробелов и дефисов'''
+    return re.sub(r'[\s-]', '', value.upper().translate(CAR_NUMBER_LOOKALIKES))
+
+
+def load_previous_defects(car_number_norm: str):
+    '''Последняя завершённая 5-ти минутка автомобиля и найденные в ней неисправности (None, если их не было).
+    Приёмка неисправностей не фиксирует и прошлый осмотр не заслоняет'''
+    conn = None
+    try:
+        schema = os.environ.get('MAIN_DB_SCHEMA')
+        conn = get_db_pool().getconn()
+        cur = conn.cursor()
+        cur.execute(
+            f"SELECT id, mechanic, created_at FROM {schema}.diagnostics "
+            f"WHERE car_number_norm = %s AND completed = true AND diagnostic_type = '5min' "
+            f"ORDER BY created_at DESC LIMIT 1",
+            (car_number_norm,)
+        )
+        row = cur.fetchone()
+        if not row:
+            cur.close()
+            return None
+        cur.execute(
+            f"SELECT question_number, question_text, sub_answers FROM {schema}.checklist_answers "
+            f"WHERE diagnostic_id = %s AND answer_code = 'bad' ORDER BY question_number",
+            (row[0],)
+        )
+        defects = cur.fetchall()
+        cur.close()
+        return {'id': row[0], 'mechanic': row[1], 'created_at': row[2], 'defects': defects}
+    finally:
+        if conn:
+            get_db_pool().putconn(conn)
+
+
+def _store_previous_defects(car_number_norm: str):
+    try:
+        result = load_previous_defects(car_number_norm)
+        with _previous_defects_lock:
+            _previous_defects_cache[car_number_norm] = (time.monotonic() + PREVIOUS_DEFECTS_TTL, result)
+    except Exception as e:
+        print(f"[ERROR] Failed to load previous defects for {car_number_norm}: {str(e)}")
+    finally:
+        with _previous_defects_lock:
+            _previous_defects_pending.pop(car_number_norm, None)
+
+
+def prefetch_previous_defects(car_number: str):
+    '''Запускает поиск прошлого осмотра в фоне, пока механик вводит следующие данные'''
+    car_number_norm = normalize_car_number(car_number)
+    with _previous_defects_lock:
+        cached = _previous_defects_cache.get(car_number_norm)
+        if (cached and cached[0] > time.monotonic()) or car_number_norm in _previous_defects_pending:
+            return
+        thread = threading.Thread(target=_store_previous_defects, args=(car_number_norm,), daemon=True)
+        _previous_defects_pending[car_number_norm] = thread
+    thread.start()
+
+
+def get_previous_defects(car_number: str):
+    '''Результат предзагрузки; если её не было (другой экземпляр функции) — запрос к БД'''
+    car_number_norm = normalize_car_number(car_number)
+    with _previous_defects_lock:
+        thread = _previous_defects_pending.get(car_number_norm)
+    if thread:
+        thread.join(PREVIOUS_DEFECTS_WAIT)
+    with _previous_defects_lock:
+        cached = _previous_defects_cache.get(car_number_norm)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    _store_previous_defects(car_number_norm)
+    with _previous_defects_lock:
+        cached = _previous_defects_cache.get(car_number_norm)
+    return cached[1] if cached else None
+
+
+def describe_defect(question_number: int, sub_answers) -> str:
+    '''Подписи выбранных подпунктов неисправности по структуре чек-листа'''
+    main = (sub_answers or {}).get('main')
+    if not main:
+        return ''
+    question = next((q for q in get_checklist_questions() if q['id'] == question_number), None)
+    bad_option = next((o for o in question['options'] if o['value'] == 'bad'), None) if question else None
+    sub_options = {so['value']: so for so in (bad_option or {}).get('subOptions', [])}
+
+    parts = []
+    for value in (main if isinstance(main, list) else [main]):
+        sub_option = sub_options.get(value, {})
+        label = sub_option.get('label', value)
+        nested_value = sub_answers.get(f'main-{value}')
+        if nested_value:
+            nested = next((n for n in sub_option.get('subOptions', []) if n['value'] == nested_value), None)
+            label = f"{label}: {nested['label'] if nested else nested_value}"
+        parts.append(label)
+    return ', '.join(parts)
+
+
+def send_previous_defects(sender_id: str, car_number: str):
+    '''Показывает неисправности, найденные на прошлом осмотре этого автомобиля'''
+    try:
+        previous = get_previous_defects(car_number)
+    except Exception as e:
+        print(f"[ERROR] Failed to get previous defects: {str(e)}")
+        return
+    if not previous or not previous['defects']:
+        return
+
+    lines = []
+    for question_number, question_text, sub_answers in previous['defects'][:PREVIOUS_DEFECTS_MAX_LINES]:
+        details = describe_defect(question_number, sub_answers)
+        lines.append(f"• {question_title('5min', question_number, question_text)}" + (f" — {details}" if details else ''))
+    hidden = len(previous['defects']) - PREVIOUS_DEFECTS_MAX_LINES
+    if hidden > 0:
+        lines.append(f"…и ещё {hidden}")
+
+    date_str = previous['created_at'].strftime('%d.%m.%Y')
+    response_text = (
+        f"🕘 Прошлый осмотр {date_str} ({previous['mechanic']}), неисправностей: {len(previous['defects'])}\n\n"
+        + '\n'.join(lines)
+    )
+    send_message(sender_id, response_text)
+
+
 def mark_diagnostic_completed(diagnostic_id: int):
-    '''Помечает диагностику как завершённую'''
+    '''Помечает диагностику как завершённую и добавляет её дефекты в агрегат defect_stats'''
     conn = None
     try:
         schema = os.environ.get('MAIN_DB_SCHEMA')
@@ -707,11 +884,29 @@ def mark_diagnostic_completed(diagnostic_id: int):
         conn = db_pool.getconn()
         cur = conn.cursor()
         cur.execute(
-            f"UPDATE {schema}.diagnostics SET completed = true, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
+            f"SELECT stats_counted FROM {schema}.diagnostics WHERE id = %s FOR UPDATE",
             (diagnostic_id,)
         )
+        row = cur.fetchone()
+        cur.execute(
+            f"UPDATE {schema}.diagnostics SET completed = true, stats_counted = true, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
+            (diagnostic_id,)
+        )
+        # Повторное завершение не должно учитывать дефекты дважды
+        if row and not row[0]:
+            cur.execute(
+                f"INSERT INTO {schema}.defect_stats AS s (week_start, mechanic_id, question_number, defect_code, defect_count) "
+                f"SELECT week_start, mechanic_id, question_number, defect_code, defect_count "
+                f"FROM {schema}.diagnostic_defects(%s) "
+                f"ON CONFLICT (week_start, mechanic_id, question_number, defect_code) "
+                f"DO UPDATE SET defect_count = s.defect_count + EXCLUDED.defect_count",
+                (diagnostic_id,)
+            )
         conn.commit()
         cur.close()
+        # Завершённый осмотр становится «прошлым» для своего автомобиля
+        with _previous_defects_lock:
+            _previous_defects_cache.clear()
         print(f"[SUCCESS] Diagnostic {diagnostic_id} marked as completed")
     except Exception as e:
         print(f"[ERROR] Failed to mark diagnostic completed: {str(e)}")
@@ -741,6 +936,29 @@ def update_diagnostic_mileage(diagnostic_id: int, mileage: int):
             get_db_pool().putconn(conn)
 
 
+def ensure_partitions(conn, now):
+    '''Создание месячных секций диагностик на ближайшие месяцы (раз в месяц на контейнер)'''
+    global _partitions_checked_month
+    month = (now.year, now.month)
+    if _partitions_checked_month == month:
+        return
+    schema = os.environ.get('MAIN_DB_SCHEMA')
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT {schema}.ensure_diagnostics_partitions(%s)", (PARTITION_MONTHS_AHEAD,))
+        created = cur.fetchone()[0]
+        conn.commit()
+        _partitions_checked_month = month
+        if created:
+            print(f"[INFO] Created {created} diagnostics partitions")
+    except Exception as e:
+        # Строки без своей секции попадают в секцию по умолчанию, сохранение диагностики не прерываем
+        conn.rollback()
+        print(f"[WARNING] Failed to ensure diagnostics partitions: {str(e)}")
+    finally:
+        cur.close()
+
+
 def save_diagnostic(session: dict) -> int:
     '''Сохранение диагностики в PostgreSQL'''
     conn = None
@@ -758,6 +976,7 @@ def save_diagnostic(session: dict) -> int:
         
         krasnoyarsk_tz = ZoneInfo('Asia/Krasnoyarsk')
         now = datetime.now(krasnoyarsk_tz)
+        ensure_partitions(conn, now)
         
         if mechanic_id:
             cur.execute(
@@ -1083,7 +1302,7 @@ def handle_text_answer(sender_id: str, session: dict, user_text: str):
         return
     
     # Сохраняем текстовый ответ
-    success = save_checklist_answer(session['diagnostic_id'], question_id, f'Иное: {user_text}')
+    success = save_checklist_answer(session['diagnostic_id'], question_id, 'other', user_text)
     
     if not success:
         response_text = '⚠️ Ошибка при сохранении ответа. Попробуйте ещё раз.'
@@ -1104,6 +1323,91 @@ def handle_text_answer(sender_id: str, session: dict, user_text: str):
     send_checklist_question(sender_id, session)
 
 
+class _TeeReader:
+    '''Поток фото из MAX для upload_fileobj: по пути считает SHA-256 и размер и копирует байты
+    во временный файл (для dHash), не держа весь файл в памяти'''
+
+    def __init__(self, raw, spool):
+        self._raw = raw
+        self._spool = spool
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size=-1):
+        chunk = self._raw.read(size)
+        if chunk:
+            self.digest.update(chunk)
+            self._spool.write(chunk)
+            self.size += len(chunk)
+        return chunk
+
+
+def store_diagnostic_photo(diagnostic_id: int, question_index: int, file_key: str, photo_response, caption: str = None):
+    '''Сохраняет фото диагностики в S3 и БД с проверкой повторов внутри диагностики.
+    Ответ MAX (requests с stream=True) передаётся в S3 по частям: скачивание и загрузка идут одновременно.
+    Тот же файл (SHA-256) повторно не хранится: к тому же вопросу — не записывается вовсе,
+    к другому вопросу — записывается со ссылкой на уже загруженный объект. Похожее фото (dHash)
+    сохраняется с отметкой similar_photo_id. Возвращает (url, повтор к тому же вопросу, индекс вопроса похожего фото)'''
+    schema = os.environ.get('MAIN_DB_SCHEMA')
+    s3 = boto3.client('s3',
+        endpoint_url='https://bucket.poehali.dev',
+        aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+        aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
+    )
+    with photo_response, tempfile.SpooledTemporaryFile(max_size=PHOTO_SPOOL_MAX_SIZE) as spool:
+        photo_response.raw.decode_content = True
+        reader = _TeeReader(photo_response.raw, spool)
+        s3.upload_fileobj(reader, 'files', file_key, ExtraArgs={'ContentType': 'image/jpeg'}, Config=PHOTO_TRANSFER_CONFIG)
+        spool.seek(0)
+        phash = photo_dhash(spool)
+    digest = reader.digest.hexdigest()
+    file_size = reader.size
+    uploaded_url = f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{file_key}"
+    print(f"[DEBUG] Streamed photo to S3: {file_key}, {file_size} bytes")
+
+    db_pool = get_db_pool()
+    photo_conn = db_pool.getconn()
+    try:
+        cur = photo_conn.cursor()
+        # Блокировка строки диагностики: одновременные повторы одного фото не пройдут проверку оба
+        cur.execute(f"SELECT id FROM {schema}.diagnostics WHERE id = %s FOR UPDATE", (diagnostic_id,))
+        cur.execute(
+            f"SELECT id, question_index, photo_url, sha256, phash FROM {schema}.diagnostic_photos "
+            f"WHERE diagnostic_id = %s ORDER BY id",
+            (diagnostic_id,)
+        )
+        existing = cur.fetchall()
+
+        same = next((row for row in existing if row[3] == digest and row[1] == question_index), None)
+        shared = same or next((row for row in existing if row[3] == digest), None)
+        if shared and shared[2] != uploaded_url:
+            # Объект загружен до проверки (ради потоковой передачи) — повтор удаляем,
+            # но не тот объект, на который уже ссылается найденная запись
+            delete_s3_file(file_key)
+        if same:
+            photo_conn.commit()
+            print(f"[INFO] Duplicate photo for diagnostic {diagnostic_id}, question_index {question_index}")
+            return same[2], True, None
+
+        cdn_url = shared[2] if shared else uploaded_url
+
+        similar_id = None if shared else find_similar(phash, [(row[0], row[4]) for row in existing])
+        cur.execute(
+            f"INSERT INTO {schema}.diagnostic_photos "
+            f"(diagnostic_id, question_index, photo_url, caption, file_size, sha256, phash, similar_photo_id, diagnostic_created_at) "
+            f"VALUES (%s, %s, %s, %s, %s, %s, %s, %s, (SELECT created_at FROM {schema}.diagnostics WHERE id = %s))",
+            (diagnostic_id, question_index, cdn_url, caption or None, file_size, digest, phash, similar_id, diagnostic_id)
+        )
+        adjust_diagnostic_counters(cur, diagnostic_id, photos=1)
+        photo_conn.commit()
+        cur.close()
+    finally:
+        db_pool.putconn(photo_conn)
+
+    similar_question = next((row[1] for row in existing if row[0] == similar_id), None) if similar_id else None
+    return cdn_url, False, similar_question
+
+
 def handle_photo_upload(sender_id: str, session: dict, attachments: list, caption: str = ''):
     '''Обработка загрузки фото дефекта'''
     try:
@@ -1123,9 +1427,10 @@ def handle_photo_upload(sender_id: str, session: dict, attachments: list, captio
         
         # Скачиваем фото
         print(f"[DEBUG] Downloading photo from: {photo_url}")
-        photo_response = requests.get(photo_url, timeout=15)
+        photo_response = requests.get(photo_url, timeout=15, stream=True)
         
         if photo_response.status_code != 200:
+            photo_response.close()
             response_text = '⚠️ Не удалось загрузить фото. Попробуйте ещё раз.'
             buttons = [[{'type': 'callback', 'text': '⏭ Пропустить фото', 'payload': 'skip_photo'}]]
             send_message(sender_id, response_text, buttons)
@@ -1137,46 +1442,23 @@ def handle_photo_upload(sender_id: str, session: dict, attachments: list, captio
         krasnoyarsk_tz = ZoneInfo('Asia/Krasnoyarsk')
         now = datetime.now(krasnoyarsk_tz)
         
-        file_key = f"diagnostics/{diagnostic_id}/question_{question_index + 1}_{now.strftime('%Y%m%d_%H%M%S')}.jpg"
+        file_key = f"diagnostics/{diagnostic_id}/question_{question_index + 1}_{now.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.jpg"
         
-        s3 = boto3.client('s3',
-            endpoint_url='https://bucket.poehali.dev',
-            aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
-            aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
+        # Сохраняем фото в S3 и базу данных (повторы внутри диагностики не дублируются)
+        _, duplicate, similar_question = store_diagnostic_photo(
+            diagnostic_id, question_index, file_key, photo_response, caption
         )
         
-        s3.put_object(
-            Bucket='files',
-            Key=file_key,
-            Body=photo_response.content,
-            ContentType='image/jpeg'
-        )
-        
-        cdn_url = f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{file_key}"
-        
-        # Сохраняем фото в базу данных
-        schema = os.environ.get('MAIN_DB_SCHEMA')
-        db_pool = get_db_pool()
-        photo_conn = db_pool.getconn()
-        try:
-            cur = photo_conn.cursor()
-            cur.execute(
-                f"INSERT INTO {schema}.diagnostic_photos (diagnostic_id, question_index, photo_url, caption) "
-                f"VALUES (%s, %s, %s, %s)",
-                (diagnostic_id, question_index, cdn_url, caption if caption else None)
-            )
-            photo_conn.commit()
-            cur.close()
-        finally:
-            db_pool.putconn(photo_conn)
-        
         session['waiting_for_photo'] = False
         session.pop('photo_required', None)
         
         session['question_index'] += 1
         save_session(str(sender_id), session)
         
-        response_text = '✅ Фото дефекта сохранено!\n\nПродолжаем диагностику.'
+        response_text = '✅ Это фото уже сохранено.' if duplicate else '✅ Фото дефекта сохранено!'
+        if similar_question is not None:
+            response_text += f'\nℹ️ Похожее фото уже отправлено к вопросу {similar_question + 1}.'
+        response_text += '\n\nПродолжаем диагностику.'
         send_message(sender_id, response_text)
         
         send_checklist_question(sender_id, session)
@@ -1336,13 +1618,13 @@ def handle_nested_sub_answer(sender_id: str, session: dict, payload: str):
     finish_sub_questions(sender_id, session)
 
 
-def save_checklist_answer(diagnostic_id: int, question_number: int, answer_value: str) -> bool:
+def save_checklist_answer(diagnostic_id: int, question_number: int, answer_value: str, answer_note: str = None) -> bool:
     '''Сохранение ответа на вопрос чек-листа в БД (без подпунктов)'''
-    return save_checklist_answer_with_subs(diagnostic_id, question_number, answer_value, None)
+    return save_checklist_answer_with_subs(diagnostic_id, question_number, answer_value, None, answer_note)
 
 
-def save_checklist_answer_with_subs(diagnostic_id: int, question_number: int, answer_value: str, sub_answers: dict) -> bool:
-    '''Сохранение ответа на вопрос чек-листа в БД с подпунктами'''
+def save_checklist_answer_with_subs(diagnostic_id: int, question_number: int, answer_value: str, sub_answers: dict, answer_note: str = None) -> bool:
+    '''Сохранение ответа на вопрос чек-листа в БД с подпунктами: код ответа, подписи берутся из справочника при чтении'''
     conn = None
     try:
         schema = os.environ.get('MAIN_DB_SCHEMA')
@@ -1357,44 +1639,29 @@ def save_checklist_answer_with_subs(diagnostic_id: int, question_number: int, an
             print(f"[ERROR] Question {question_number} not found")
             return False
         
-        question_text = question['title']
-        
-        # Определяем значение ответа для answer_value
-        if answer_value == 'ok':
-            answer_val = 'Исправно'
-        elif answer_value == 'bad':
-            answer_val = 'Неисправно'
-        elif answer_value == 'na':
-            answer_val = 'Не предусмотрено'
-        elif answer_value == 'no_leaks':
-            answer_val = 'Нет течей'
-        elif answer_value == 'has_leaks':
-            answer_val = 'Есть течи'
-        elif answer_value == 'complete':
-            answer_val = 'Завершить, замечаний нет'
-        elif answer_value == 'add_notes':
-            answer_val = 'Добавить замечания'
-        elif answer_value == 'need_disassembly':
-            answer_val = 'Требуется дополнительный разбор'
-        else:
-            # Найдем label в опциях
-            option = next((opt for opt in question['options'] if opt['value'] == answer_value), None)
-            answer_val = option['label'] if option else answer_value
+        # Повторный ответ на тот же вопрос заменяет предыдущий; счётчики учитывают прежний код ответа
+        cur.execute(
+            f"SELECT answer_code FROM {schema}.checklist_answers "
+            f"WHERE diagnostic_id = %s AND question_number = %s FOR UPDATE",
+            (diagnostic_id, question_number)
+        )
+        previous = cur.fetchone()
         
-        # Формируем SQL с sub_answers
-        if sub_answers:
-            sub_answers_json = json.dumps(sub_answers, ensure_ascii=False)
-            cur.execute(
-                f"INSERT INTO {schema}.checklist_answers (diagnostic_id, question_number, question_text, answer_type, answer_value, sub_answers) "
-                f"VALUES (%s, %s, %s, 'single', %s, %s::jsonb)",
-                (diagnostic_id, question_number, question_text, answer_val, sub_answers_json)
-            )
-        else:
-            cur.execute(
-                f"INSERT INTO {schema}.checklist_answers (diagnostic_id, question_number, question_text, answer_type, answer_value) "
-                f"VALUES (%s, %s, %s, 'single', %s)",
-                (diagnostic_id, question_number, question_text, answer_val)
-            )
+        sub_answers_json = json.dumps(sub_answers, ensure_ascii=False) if sub_answers else None
+        cur.execute(
+            f"INSERT INTO {schema}.checklist_answers "
+            f"(diagnostic_id, question_number, answer_type, answer_code, answer_note, sub_answers, diagnostic_created_at) "
+            f"VALUES (%s, %s, 'single', %s, %s, %s::jsonb, (SELECT created_at FROM {schema}.diagnostics WHERE id = %s)) "
+            f"ON CONFLICT (diagnostic_id, question_number, diagnostic_created_at) DO UPDATE SET "
+            f"answer_code = EXCLUDED.answer_code, answer_note = EXCLUDED.answer_note, sub_answers = EXCLUDED.sub_answers",
+            (diagnostic_id, question_number, answer_value, answer_note, sub_answers_json, diagnostic_id)
+        )
+        was_defect = bool(previous) and previous[0] == 'bad'
+        adjust_diagnostic_counters(
+            cur, diagnostic_id,
+            answers=0 if previous else 1,
+            defects=(answer_value == 'bad') - was_defect
+        )
         
         conn.commit()
         cur.close()
@@ -1420,17 +1687,18 @@ def finish_checklist(sender_id: str, session: dict):
     
     conn = None
     try:
-        # Проверяем наличие фото в БД
+        # Наличие фото — по счётчику диагностики, без подсчёта строк diagnostic_photos
         schema = os.environ.get('MAIN_DB_SCHEMA')
         db_pool = get_db_pool()
         conn = db_pool.getconn()
         cur = conn.cursor()
         
         cur.execute(
-            f"SELECT COUNT(*) FROM {schema}.diagnostic_photos WHERE diagnostic_id = %s",
+            f"SELECT photo_count FROM {schema}.diagnostics WHERE id = %s",
             (diagnostic_id,)
         )
-        photo_count = cur.fetchone()[0]
+        row = cur.fetchone()
+        photo_count = row[0] if row else 0
         cur.close()
         
         has_photos = photo_count > 0
@@ -1532,7 +1800,7 @@ def send_priemka_question(sender_id: str, session: dict):
         return
 
     if question['id'] == 10 and session.get('skip_rear_right_door'):
-        save_priemka_answer(session.get('diagnostic_id'), 10, question['title'], 'Не предусмотрено', None)
+        save_priemka_answer(session.get('diagnostic_id'), 10, 'not_applicable', None, None)
         session['question_index'] += 1
         save_session(str(sender_id), session)
         send_priemka_question(sender_id, session)
@@ -1608,8 +1876,9 @@ def handle_priemka_photo(sender_id: str, session: dict, attachments: list, capti
             send_message(sender_id, response_text, buttons)
             return
 
-        photo_response = requests.get(photo_url, timeout=15)
+        photo_response = requests.get(photo_url, timeout=15, stream=True)
         if photo_response.status_code != 200:
+            photo_response.close()
             response_text = '⚠️ Не удалось загрузить фото. Попробуйте ещё раз.'
             send_message(sender_id, response_text)
             return
@@ -1621,44 +1890,27 @@ def handle_priemka_photo(sender_id: str, session: dict, attachments: list, capti
 
         krasnoyarsk_tz = ZoneInfo('Asia/Krasnoyarsk')
         now = datetime.now(krasnoyarsk_tz)
-        file_key = f"diagnostics/{diagnostic_id}/priemka_q{question_index + 1}_{now.strftime('%Y%m%d_%H%M%S')}.jpg"
+        file_key = f"diagnostics/{diagnostic_id}/priemka_q{question_index + 1}_{now.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.jpg"
 
-        s3 = boto3.client('s3',
-            endpoint_url='https://bucket.poehali.dev',
-            aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
-            aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
+        cdn_url, duplicate, similar_question = store_diagnostic_photo(
+            diagnostic_id, question_index, file_key, photo_response, caption
         )
-        s3.put_object(Bucket='files', Key=file_key, Body=photo_response.content, ContentType='image/jpeg')
-        cdn_url = f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{file_key}"
 
-        schema = os.environ.get('MAIN_DB_SCHEMA')
-        db_pool = get_db_pool()
-        photo_conn = db_pool.getconn()
-        try:
-            cur = photo_conn.cursor()
-            cur.execute(
-                f"INSERT INTO {schema}.diagnostic_photos (diagnostic_id, question_index, photo_url, caption) "
-                f"VALUES (%s, %s, %s, %s)",
-                (diagnostic_id, question_index, cdn_url, caption if caption else None)
-            )
-            photo_conn.commit()
-            cur.close()
-        finally:
-            db_pool.putconn(photo_conn)
-
-        answer_text = f'Фото прикреплено. Комментарий: {caption}' if caption else 'Фото прикреплено'
-        if question:
-            save_priemka_answer(diagnostic_id, question['id'], question['title'], answer_text, cdn_url)
-
-        session['waiting_for_photo'] = False
+        # Повтор того же фото к этому вопросу в ответ не добавляем и не считаем
+        if question and not duplicate:
+            save_priemka_answer(diagnostic_id, question['id'], 'photo', caption or None, cdn_url)
 
-        extra_count = session.get('priemka_extra_photos', 0) + 1
+        extra_count = session.get('priemka_extra_photos', 0) + (0 if duplicate else 1)
         session['priemka_extra_photos'] = extra_count
         session['waiting_for_photo'] = True
         save_session(str(sender_id), session)
 
         payload_action = 'no_extra' if question and question['id'] == 21 else 'next_step'
-        response_text = f'✅ Фото сохранено! (фото: {extra_count})\n\nМожете прикрепить ещё фото или нажмите "Далее".'
+        saved_text = '✅ Это фото уже сохранено.' if duplicate else '✅ Фото сохранено!'
+        response_text = f'{saved_text} (фото: {extra_count})'
+        if similar_question is not None:
+            response_text += f'\nℹ️ Похожее фото уже отправлено к вопросу {similar_question + 1}.'
+        response_text += '\n\nМожете прикрепить ещё фото или нажмите "Далее".'
         buttons = [
             [{'type': 'callback', 'text': '➡️ Далее', 'payload': f"priemka_answer:{question['id']}:{payload_action}"}]
         ]
@@ -1699,7 +1951,7 @@ def handle_priemka_callback(sender_id: str, session: dict, payload: str):
         return
 
     if answer_value == 'complete':
-        save_priemka_answer(diagnostic_id, question_id, question['title'], 'Замечаний нет', None)
+        save_priemka_answer(diagnostic_id, question_id, 'complete', None, None)
         session['question_index'] += 1
         session['waiting_for_photo'] = False
         session['waiting_for_text'] = False
@@ -1716,7 +1968,7 @@ def handle_priemka_callback(sender_id: str, session: dict, payload: str):
         return
 
     if answer_value == 'not_applicable':
-        save_priemka_answer(diagnostic_id, question_id, question['title'], 'Не предусмотрено', None)
+        save_priemka_answer(diagnostic_id, question_id, 'not_applicable', None, None)
         if question_id == 6:
             session['skip_rear_right_door'] = True
         session['question_index'] += 1
@@ -1734,8 +1986,7 @@ def handle_priemka_callback(sender_id: str, session: dict, payload: str):
         send_priemka_question(sender_id, session)
         return
 
-    opt_label = next((o['label'] for o in question.get('options', []) if o['value'] == answer_value), answer_value)
-    save_priemka_answer(diagnostic_id, question_id, question['title'], opt_label, None)
+    save_priemka_answer(diagnostic_id, question_id, answer_value, None, None)
     session['question_index'] += 1
     session['waiting_for_photo'] = False
     save_session(str(sender_id), session)
@@ -1755,7 +2006,7 @@ def handle_priemka_text(sender_id: str, session: dict, user_text: str):
     if not question:
         return
 
-    save_priemka_answer(diagnostic_id, question_id, question['title'], f'Замечания: {user_text}', None)
+    save_priemka_answer(diagnostic_id, question_id, 'add_notes', user_text, None)
 
     session['waiting_for_text'] = False
     session.pop('waiting_for_text_question_id', None)
@@ -1795,8 +2046,8 @@ def handle_priemka_back(sender_id: str, session: dict):
     send_priemka_question(sender_id, session)
 
 
-def save_priemka_answer(diagnostic_id: int, question_number: int, question_text: str, answer_value: str, photo_url: str):
-    '''Сохраняет ответ Приемки в checklist_answers'''
+def save_priemka_answer(diagnostic_id: int, question_number: int, answer_code: str, answer_note: str, photo_url: str):
+    '''Сохраняет ответ Приемки в checklist_answers: код ответа и свободный текст (комментарий, замечания)'''
     conn = None
     try:
         schema = os.environ.get('MAIN_DB_SCHEMA')
@@ -1804,18 +2055,23 @@ def save_priemka_answer(diagnostic_id: int, question_number: int, question_text:
         conn = db_pool.getconn()
         cur = conn.cursor()
 
-        if photo_url:
-            cur.execute(
-                f"INSERT INTO {schema}.checklist_answers (diagnostic_id, question_number, question_text, answer_type, answer_value, photo_urls) "
-                f"VALUES (%s, %s, %s, 'priemka', %s, ARRAY[%s])",
-                (diagnostic_id, question_number, question_text, answer_value, photo_url)
-            )
-        else:
-            cur.execute(
-                f"INSERT INTO {schema}.checklist_answers (diagnostic_id, question_number, question_text, answer_type, answer_value) "
-                f"VALUES (%s, %s, %s, 'priemka', %s)",
-                (diagnostic_id, question_number, question_text, answer_value)
-            )
+        # Несколько фото к одному вопросу копятся в photo_urls одной строки
+        cur.execute(
+            f"INSERT INTO {schema}.checklist_answers AS a "
+            f"(diagnostic_id, question_number, answer_type, answer_code, answer_note, photo_urls, diagnostic_created_at) "
+            f"VALUES (%s, %s, 'priemka', %s, %s, %s, (SELECT created_at FROM {schema}.diagnostics WHERE id = %s)) "
+            f"ON CONFLICT (diagnostic_id, question_number, diagnostic_created_at) DO UPDATE SET "
+            f"answer_code = EXCLUDED.answer_code, "
+            f"answer_note = CASE WHEN EXCLUDED.answer_code = 'photo' AND a.answer_code = 'photo' "
+            f"THEN NULLIF(concat_ws('; ', a.answer_note, EXCLUDED.answer_note), '') ELSE EXCLUDED.answer_note END, "
+            f"photo_urls = CASE WHEN EXCLUDED.answer_code = 'photo' AND a.answer_code = 'photo' "
+            f"THEN array_cat(a.photo_urls, EXCLUDED.photo_urls) ELSE EXCLUDED.photo_urls END "
+            f"RETURNING (xmax = 0)",
+            (diagnostic_id, question_number, answer_code, answer_note, [photo_url] if photo_url else None, diagnostic_id)
+        )
+        inserted = cur.fetchone()[0]
+        if inserted:
+            adjust_diagnostic_counters(cur, diagnostic_id, answers=1)
 
         conn.commit()
         cur.close()
@@ -1859,8 +2115,12 @@ def delete_diagnostic_photos(diagnostic_id: int, question_index: int):
         db_pool = get_db_pool()
         conn = db_pool.getconn()
         cur = conn.cursor()
+        # Объект, на который ссылается фото другого вопроса (повтор того же файла), в S3 оставляем
         cur.execute(
-            f"SELECT photo_url FROM {schema}.diagnostic_photos WHERE diagnostic_id = %s AND question_index = %s",
+            f"SELECT DISTINCT p.photo_url FROM {schema}.diagnostic_photos p "
+            f"WHERE p.diagnostic_id = %s AND p.question_index = %s AND NOT EXISTS ("
+            f"SELECT 1 FROM {schema}.diagnostic_photos o "
+            f"WHERE o.diagnostic_id = p.diagnostic_id AND o.question_index <> p.question_index AND o.photo_url = p.photo_url)",
             (diagnostic_id, question_index)
         )
         rows = cur.fetchall()
@@ -1872,6 +2132,7 @@ def delete_diagnostic_photos(diagnostic_id: int, question_index: int):
             f"DELETE FROM {schema}.diagnostic_photos WHERE diagnostic_id = %s AND question_index = %s",
             (diagnostic_id, question_index)
         )
+        adjust_diagnostic_counters(cur, diagnostic_id, photos=-cur.rowcount)
         conn.commit()
         cur.close()
         print(f"[SUCCESS] Deleted photos for diagnostic {diagnostic_id}, question_index {question_index}")
@@ -1894,6 +2155,7 @@ def delete_priemka_answer(diagnostic_id: int, question_number: int):
             f"DELETE FROM {schema}.checklist_answers WHERE diagnostic_id = %s AND question_number = %s",
             (diagnostic_id, question_number)
         )
+        adjust_diagnostic_counters(cur, diagnostic_id, answers=-cur.rowcount)
         conn.commit()
         cur.close()
     except Exception as e:
@@ -1,13 +1,150 @@
 import json
 import os
-import psycopg2
+import time
+import hashlib
+import hmac
+import secrets
+from psycopg2 import pool
+
+from session_token import require_admin
+
+PIN_HASH_ITERATIONS = 100000
+# Время жизни записи о механике в кэше; ограничивает устаревание на других экземплярах функции
+MECHANIC_CACHE_TTL = 60
+
+# Connection pool для оптимизации работы с БД
+_db_pool = None
+# Кэш механиков по номеру телефона: phone -> (expires_at, mechanic)
+_mechanic_cache = {}
+
+
+def get_db_pool():
+    '''Получение connection pool (singleton)'''
+    global _db_pool
+    if _db_pool is None:
+        db_url = os.environ.get('DATABASE_URL')
+        _db_pool = pool.SimpleConnectionPool(1, 3, db_url)
+    return _db_pool
+
+
+def reset_db_pool():
+    '''Сброс connection pool при ошибках соединения'''
+    global _db_pool
+    if _db_pool:
+        try:
+            _db_pool.closeall()
+        except Exception:
+            pass
+    _db_pool = None
+
+
+def hash_pin(pin_code: str) -> str:
+    '''Солёный хеш пин-кода в формате pbkdf2_sha256$итерации$соль$хеш'''
+    salt = secrets.token_hex(16)
+    digest = hashlib.pbkdf2_hmac('sha256', pin_code.encode(), bytes.fromhex(salt), PIN_HASH_ITERATIONS)
+    return f'pbkdf2_sha256${PIN_HASH_ITERATIONS}${salt}${digest.hex()}'
+
+
+def verify_pin(pin_code: str, pin_hash: str) -> bool:
+    '''Проверка пин-кода по хешу за постоянное время'''
+    try:
+        algorithm, iterations, salt, expected = pin_hash.split('$')
+    except ValueError:
+        return False
+    if algorithm != 'pbkdf2_sha256':
+        return False
+    digest = hashlib.pbkdf2_hmac('sha256', pin_code.encode(), bytes.fromhex(salt), int(iterations))
+    return hmac.compare_digest(digest.hex(), expected)
+
+
+def load_mechanic(phone: str, use_cache: bool = True):
+    '''Механик по номеру телефона из кэша или из БД'''
+    now = time.monotonic()
+    if use_cache:
+        cached = _mechanic_cache.get(phone)
+        if cached and cached[0] > now:
+            return cached[1]
+
+    for attempt in range(2):
+        conn = None
+        try:
+            schema = os.environ.get('MAIN_DB_SCHEMA')
+            conn = get_db_pool().getconn()
+            cur = conn.cursor()
+            cur.execute(
+                f"SELECT id, name, is_active, pin_hash, pin_code FROM {schema}.mechanics WHERE phone = %s",
+                (phone,)
+            )
+            row = cur.fetchone()
+            cur.close()
+            break
+        except Exception as e:
+            print(f"[ERROR] Failed to load mechanic (attempt {attempt + 1}): {str(e)}")
+            if conn:
+                try:
+                    get_db_pool().putconn(conn, close=True)
+                except Exception:
+                    pass
+                conn = None
+            reset_db_pool()
+            if attempt == 1:
+                raise
+        finally:
+            if conn:
+                get_db_pool().putconn(conn)
+
+    if not row:
+        _mechanic_cache.pop(phone, None)
+        return None
+
+    mechanic = {
+        'id': row[0],
+        'name': row[1],
+        'is_active': row[2],
+        'pin_hash': row[3],
+        'pin_code': row[4],
+    }
+    _mechanic_cache[phone] = (now + MECHANIC_CACHE_TTL, mechanic)
+    return mechanic
+
+
+def upgrade_legacy_pin(mechanic: dict, pin_code: str):
+    '''Заменяет открытый пин-код хешем после успешного входа'''
+    conn = None
+    try:
+        schema = os.environ.get('MAIN_DB_SCHEMA')
+        conn = get_db_pool().getconn()
+        cur = conn.cursor()
+        pin_hash = hash_pin(pin_code)
+        cur.execute(
+            f"UPDATE {schema}.mechanics SET pin_hash = %s, pin_code = NULL WHERE id = %s AND pin_hash IS NULL",
+            (pin_hash, mechanic['id'])
+        )
+        conn.commit()
+        cur.close()
+        mechanic['pin_hash'] = pin_hash
+        mechanic['pin_code'] = None
+    except Exception as e:
+        print(f"[ERROR] Failed to upgrade legacy pin for mechanic {mechanic['id']}: {str(e)}")
+    finally:
+        if conn:
+            get_db_pool().putconn(conn)
+
+
+def check_pin(mechanic: dict, pin_code: str) -> bool:
+    if mechanic['pin_hash']:
+        return verify_pin(pin_code, mechanic['pin_hash'])
+    if mechanic['pin_code'] and hmac.compare_digest(mechanic['pin_code'], pin_code):
+        upgrade_legacy_pin(mechanic, pin_code)
+        return True
+    return False
 
 
 def handler(event: dict, context) -> dict:
     '''API для авторизации механиков по номеру телефона и пин-коду'''
-    
+
     method = event.get('httpMethod', 'POST')
-    
+
     if method == 'OPTIONS':
         return {
             'statusCode': 200,
@@ -19,7 +156,7 @@ def handler(event: dict, context) -> dict:
             'body': '',
             'isBase64Encoded': False
         }
-    
+
     if method != 'POST':
         return {
             'statusCode': 405,
@@ -27,12 +164,26 @@ def handler(event: dict, context) -> dict:
             'body': json.dumps({'error': 'Method not allowed'}),
             'isBase64Encoded': False
         }
-    
+
     try:
         body = json.loads(event.get('body', '{}'))
+
+        # Сброс кэша после изменений в списке механиков (вызывается функцией mechanics с токеном администратора)
+        if body.get('action') == 'invalidate':
+            unauthorized = require_admin(event)
+            if unauthorized:
+                return unauthorized
+            _mechanic_cache.clear()
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'success': True}),
+                'isBase64Encoded': False
+            }
+
         phone = body.get('phone', '').strip()
         pin_code = body.get('pin_code', '').strip()
-        
+
         if not phone or not pin_code:
             return {
                 'statusCode': 400,
@@ -40,56 +191,46 @@ def handler(event: dict, context) -> dict:
                 'body': json.dumps({'error': 'Номер телефона и пин-код обязательны'}),
                 'isBase64Encoded': False
             }
-        
+
         # Нормализуем номер телефона
         clean_phone = phone.replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
-        
-        # Проверяем учётные данные
-        db_url = os.environ.get('DATABASE_URL')
-        schema = os.environ.get('MAIN_DB_SCHEMA')
-        conn = psycopg2.connect(db_url)
-        cur = conn.cursor()
-        
-        cur.execute(
-            f"SELECT id, name, is_active FROM {schema}.mechanics "
-            f"WHERE phone = '{clean_phone}' AND pin_code = '{pin_code}'"
-        )
-        mechanic = cur.fetchone()
-        
-        cur.close()
-        conn.close()
-        
-        if not mechanic:
+
+        # Проверяем учётные данные; при неудаче по кэшу перечитываем запись — пин-код мог измениться
+        mechanic = load_mechanic(clean_phone)
+        authorized = bool(mechanic) and check_pin(mechanic, pin_code)
+        if mechanic and not authorized:
+            mechanic = load_mechanic(clean_phone, use_cache=False)
+            authorized = bool(mechanic) and check_pin(mechanic, pin_code)
+
+        if not authorized:
             return {
                 'statusCode': 401,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                 'body': json.dumps({'error': 'Неверный номер телефона или пин-код'}),
                 'isBase64Encoded': False
             }
-        
-        mechanic_id, mechanic_name, is_active = mechanic
-        
-        if not is_active:
+
+        if not mechanic['is_active']:
             return {
                 'statusCode': 403,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                 'body': json.dumps({'error': 'Аккаунт деактивирован'}),
                 'isBase64Encoded': False
             }
-        
+
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({
                 'success': True,
                 'mechanic': {
-                    'id': mechanic_id,
-                    'name': mechanic_name
+                    'id': mechanic['id'],
+                    'name': mechanic['name']
                 }
             }),
             'isBase64Encoded': False
         }
-    
+
     except Exception as e:
         print(f"[ERROR] Auth failed: {str(e)}")
         return {
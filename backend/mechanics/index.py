@@ -1,7 +1,57 @@
 import json
 import os
+import hashlib
+import secrets
+import urllib.request
 import psycopg2
 
+from session_token import TOKEN_HEADER, issue_token, require_admin
+
+MECHANIC_AUTH_URL = 'https://functions.poehali.dev/b75c9b1a-314a-4add-aa18-6661d2618427'
+# Срок жизни токена, которым подписан запрос сброса кэша mechanic-auth
+INVALIDATE_TOKEN_TTL = 60
+PIN_HASH_ITERATIONS = 100000
+
+
+def hash_pin(pin_code: str) -> str:
+    '''Солёный хеш пин-кода (формат совпадает с mechanic-auth)'''
+    salt = secrets.token_hex(16)
+    digest = hashlib.pbkdf2_hmac('sha256', pin_code.encode(), bytes.fromhex(salt), PIN_HASH_ITERATIONS)
+    return f'pbkdf2_sha256${PIN_HASH_ITERATIONS}${salt}${digest.hex()}'
+
+
+def hash_legacy_pins(cur, schema: str) -> tuple:
+    '''Разовый перевод оставшихся открытых pin_code в pin_hash (механики, ни разу не входившие после V0015).
+    Если хеш уже есть, открытый пин-код просто очищается. Возвращает (захешировано, очищено)'''
+    cur.execute(
+        f"SELECT id, pin_code FROM {schema}.mechanics "
+        f"WHERE pin_code IS NOT NULL AND pin_hash IS NULL FOR UPDATE"
+    )
+    rows = cur.fetchall()
+    for mechanic_id, pin_code in rows:
+        cur.execute(
+            f"UPDATE {schema}.mechanics SET pin_hash = %s, pin_code = NULL WHERE id = %s",
+            (hash_pin(pin_code), mechanic_id)
+        )
+    cur.execute(f"UPDATE {schema}.mechanics SET pin_code = NULL WHERE pin_code IS NOT NULL AND pin_hash IS NOT NULL")
+    return len(rows), cur.rowcount
+
+
+def invalidate_auth_cache():
+    '''Сбрасывает кэш механиков в mechanic-auth после изменений (best effort).
+    Запрос подписан короткоживущим токеном администратора: неподписанный сброс mechanic-auth отклоняет'''
+    try:
+        request = urllib.request.Request(
+            MECHANIC_AUTH_URL,
+            data=json.dumps({'action': 'invalidate'}).encode(),
+            headers={'Content-Type': 'application/json', TOKEN_HEADER: issue_token('mechanics', ttl=INVALIDATE_TOKEN_TTL)},
+            method='POST'
+        )
+        urllib.request.urlopen(request, timeout=3).close()
+    except Exception as e:
+        print(f"[WARNING] Failed to invalidate mechanic-auth cache: {str(e)}")
+
+
 def handler(event: dict, context) -> dict:
     '''API для управления списком механиков'''
     
@@ -13,12 +63,18 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
+    # Список механиков нужен формам приёмки, изменять его может только администратор
+    if method != 'GET':
+        unauthorized = require_admin(event)
+        if unauthorized:
+            return unauthorized
+    
     db_url = os.environ.get('DATABASE_URL')
     schema = os.environ.get('MAIN_DB_SCHEMA')
     
@@ -28,7 +84,7 @@ def handler(event: dict, context) -> dict:
         
         if method == 'GET':
             cur.execute(
-                f"SELECT id, name, phone, pin_code, is_active, created_at FROM {schema}.mechanics ORDER BY name"
+                f"SELECT id, name, phone, is_active, created_at FROM {schema}.mechanics ORDER BY name"
             )
             rows = cur.fetchall()
             
@@ -37,9 +93,8 @@ def handler(event: dict, context) -> dict:
                     'id': row[0],
                     'name': row[1],
                     'phone': row[2],
-                    'pinCode': row[3],
-                    'isActive': row[4],
-                    'createdAt': row[5].isoformat() if row[5] else None
+                    'isActive': row[3],
+                    'createdAt': row[4].isoformat() if row[4] else None
                 }
                 for row in rows
             ]
@@ -56,6 +111,22 @@ def handler(event: dict, context) -> dict:
         
         elif method == 'POST':
             body = json.loads(event.get('body', '{}'))
+
+            if body.get('action') == 'hash_legacy_pins':
+                hashed, cleared = hash_legacy_pins(cur, schema)
+                conn.commit()
+                invalidate_auth_cache()
+
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'hashed': hashed, 'cleared': cleared}),
+                    'isBase64Encoded': False
+                }
+
             name = body.get('name', '').strip()
             phone = body.get('phone', '').strip()
             pin_code = body.get('pinCode', '').strip()
@@ -86,11 +157,13 @@ def handler(event: dict, context) -> dict:
             clean_phone = phone.replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
             
             cur.execute(
-                f"INSERT INTO {schema}.mechanics (name, phone, pin_code) "
-                f"VALUES ('{name}', '{clean_phone}', '{pin_code}') RETURNING id, created_at"
+                f"INSERT INTO {schema}.mechanics (name, phone, pin_hash) "
+                f"VALUES (%s, %s, %s) RETURNING id, created_at",
+                (name, clean_phone, hash_pin(pin_code))
             )
             result = cur.fetchone()
             conn.commit()
+            invalidate_auth_cache()
             
             return {
                 'statusCode': 201,
@@ -130,11 +203,14 @@ def handler(event: dict, context) -> dict:
             
             # Формируем список обновлений
             updates = []
+            params = []
             if name:
-                updates.append(f"name = '{name}'")
+                updates.append("name = %s")
+                params.append(name)
             if phone:
                 clean_phone = phone.replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
-                updates.append(f"phone = '{clean_phone}'")
+                updates.append("phone = %s")
+                params.append(clean_phone)
             if pin_code:
                 if len(pin_code) != 4 or not pin_code.isdigit():
                     return {
@@ -146,15 +222,18 @@ def handler(event: dict, context) -> dict:
                         'body': json.dumps({'error': 'Пин-код должен состоять из 4 цифр'}),
                         'isBase64Encoded': False
                     }
-                updates.append(f"pin_code = '{pin_code}'")
+                updates.append("pin_hash = %s, pin_code = NULL")
+                params.append(hash_pin(pin_code))
             
-            updates.append(f"is_active = {is_active}")
+            updates.append("is_active = %s")
+            params.append(bool(is_active))
             updates.append("updated_at = CURRENT_TIMESTAMP")
             
             if updates:
-                update_sql = f"UPDATE {schema}.mechanics SET {', '.join(updates)} WHERE id = {mechanic_id}"
-                cur.execute(update_sql)
+                update_sql = f"UPDATE {schema}.mechanics SET {', '.join(updates)} WHERE id = %s"
+                cur.execute(update_sql, (*params, mechanic_id))
                 conn.commit()
+                invalidate_auth_cache()
             
             return {
                 'statusCode': 200,
@@ -181,8 +260,9 @@ def handler(event: dict, context) -> dict:
                     'isBase64Encoded': False
                 }
             
-            cur.execute(f"DELETE FROM {schema}.mechanics WHERE id = {mechanic_id}")
+            cur.execute(f"DELETE FROM {schema}.mechanics WHERE id = %s", (mechanic_id,))
             conn.commit()
+            invalidate_auth_cache()
             
             return {
                 'statusCode': 200,
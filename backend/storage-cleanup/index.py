@@ -1,25 +1,83 @@
+import gzip
 import json
 import os
+import time
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+from zoneinfo import ZoneInfo
 import boto3
 import psycopg2
 
+from session_token import require_admin
+
+JOB_TYPE = 'storage_cleanup'
+ARCHIVE_JOB_TYPE = 'archive'
+JOB_TYPES = (JOB_TYPE, ARCHIVE_JOB_TYPE)
+SCAN_PREFIXES = ('diagnostics/', 'reports/', 'exports/')
+# Выгрузки (CSV/XLSX диагностик, ZIP отчётов) в БД не записываются и отдаются по подписанным ссылкам
+# на минуты: по префиксу exports/ удаляются все объекты старше этого срока
+EXPORT_PREFIX = 'exports/'
+EXPORT_RETENTION = timedelta(days=1)
+PAGE_SIZE = 1000
+# Свежие объекты не трогаем: файл мог попасть в S3 раньше, чем запись о нём в БД
+UPLOAD_GRACE_PERIOD = timedelta(hours=1)
+# Сколько секунд работаем в одном вызове, если платформа не сообщает оставшееся время
+CHUNK_TIME_BUDGET = 20
+# Запас до таймаута функции, после которого прекращаем брать новые страницы
+TIMEOUT_RESERVE_MS = 10000
+# Производные загрузок upload-photo: оригинал <имя>.orig.<расш> и миниатюра <имя>.thumb.jpg
+# считаются известными, если в БД есть ссылка на нормализованное фото <имя>.jpg
+PHOTO_VARIANT_PATTERN = r'\.(orig\.[a-z0-9]+|thumb\.jpg)$'
+# Пространство advisory-блокировок задач обслуживания (второй ключ — id задачи)
+JOB_LOCK_NAMESPACE = 7301
+# После стольких порций подряд, завершившихся ошибкой, задача получает статус failed и больше не продолжается
+MAX_FAILED_CHUNKS = 3
+
+EMPTY_PROGRESS = {
+    'scannedFiles': 0,
+    'orphanFiles': 0,
+    'orphanSize': 0,
+    'orphanDbRecords': 0,
+    'deletedFiles': 0,
+    'deletedDbRecords': 0,
+}
+
+# Архив: диагностики старше заданного возраста переносятся в S3 пачками по ARCHIVE_BATCH_SIZE
+ARCHIVE_PREFIX = 'archive/diagnostics/'
+ARCHIVE_BATCH_SIZE = 200
+ARCHIVE_AFTER_DAYS = 365
+# Не даём случайно отправить в архив свежие диагностики
+ARCHIVE_MIN_DAYS = 90
+
+ARCHIVE_EMPTY_PROGRESS = {
+    'candidates': 0,
+    'archivedDiagnostics': 0,
+    'archivedAnswers': 0,
+    'archivedPhotos': 0,
+    'archiveFiles': 0,
+    'archiveSize': 0,
+    'droppedPartitions': 0,
+}
+
 
 def handler(event: dict, context) -> dict:
-    '''Очистка хранилища: удаляет файлы осиротевших диагностик через проверку по известным URL и перебор дат'''
+    '''Задачи обслуживания порциями с продолжением в следующем вызове, прогресс через GET: очистка хранилища (обход S3 с continuation token) и архивирование старых диагностик (jobType=archive)'''
+
+    method = event.get('httpMethod', 'GET')
 
-    if event.get('httpMethod') == 'OPTIONS':
+    if method == 'OPTIONS':
         return {
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token'
             },
             'body': '',
             'isBase64Encoded': False
         }
 
-    if event.get('httpMethod') != 'POST':
+    if method not in ('GET', 'POST'):
         return {
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -27,131 +85,561 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
 
-    body = json.loads(event.get('body', '{}'))
-    dry_run = body.get('dryRun', True)
+    unauthorized = require_admin(event)
+    if unauthorized:
+        return unauthorized
 
     db_url = os.environ.get('DATABASE_URL')
     schema = os.environ.get('MAIN_DB_SCHEMA')
-    aws_key = os.environ.get('AWS_ACCESS_KEY_ID')
-    cdn_prefix = f"https://cdn.poehali.dev/projects/{aws_key}/bucket/"
 
     conn = psycopg2.connect(db_url)
     cur = conn.cursor()
 
-    cur.execute(f"SELECT id FROM {schema}.diagnostics")
-    existing_ids = set(row[0] for row in cur.fetchall())
+    try:
+        if method == 'GET':
+            query_params = event.get('queryStringParameters', {}) or {}
+            job_type = query_params.get('jobType', JOB_TYPE)
+            if job_type not in JOB_TYPES:
+                return _bad_request('Неизвестный тип задачи')
+            if not _valid_job_id(query_params.get('jobId')):
+                return _bad_request('Некорректный jobId')
+            job = _load_job(cur, schema, job_type, query_params.get('jobId'))
+            if not job:
+                return {
+                    'statusCode': 404,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Задача не найдена'}),
+                    'isBase64Encoded': False
+                }
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps(_job_response(job)),
+                'isBase64Encoded': False
+            }
+
+        body = json.loads(event.get('body', '{}'))
+        dry_run = body.get('dryRun', True)
+        job_type = body.get('jobType', JOB_TYPE)
+        if job_type not in JOB_TYPES:
+            return _bad_request('Неизвестный тип задачи')
+        if not _valid_job_id(body.get('jobId')):
+            return _bad_request('Некорректный jobId')
 
-    cur.execute(f"SELECT last_value FROM {schema}.diagnostics_id_seq")
-    max_id = cur.fetchone()[0]
+        job = None
+        if body.get('jobId'):
+            job = _load_job(cur, schema, job_type, body['jobId'])
+        elif not body.get('restart'):
+            job = _find_running_job(cur, schema, job_type, dry_run)
+        if not job:
+            checkpoint = {}
+            if job_type == ARCHIVE_JOB_TYPE:
+                try:
+                    older_than_days = int(body.get('olderThanDays', ARCHIVE_AFTER_DAYS))
+                except (TypeError, ValueError):
+                    return _bad_request('olderThanDays должно быть числом')
+                if older_than_days < ARCHIVE_MIN_DAYS:
+                    return _bad_request(f'Архивировать можно диагностики старше {ARCHIVE_MIN_DAYS} дней')
+                # Граница фиксируется при создании задачи, чтобы продолжения работали с тем же набором
+                now_krsk = datetime.now(ZoneInfo('Asia/Krasnoyarsk')).replace(tzinfo=None)
+                checkpoint['cutoff'] = (now_krsk - timedelta(days=older_than_days)).isoformat(timespec='seconds')
+            job = _create_job(cur, schema, job_type, dry_run, checkpoint)
+            conn.commit()
 
-    deleted_ids = set(range(1, max_id + 1)) - existing_ids
-    print(f"[cleanup] existing: {len(existing_ids)} IDs, max_id: {max_id}, deleted_ids: {len(deleted_ids)} IDs to check")
+        if job['status'] == 'running':
+            cur.execute("SELECT pg_try_advisory_lock(%s, %s)", (JOB_LOCK_NAMESPACE, job['id']))
+            if not cur.fetchone()[0]:
+                print(f"[cleanup] Job {job['id']} is being processed by another invocation")
+            else:
+                run_chunk = _run_archive_chunk if job['jobType'] == ARCHIVE_JOB_TYPE else _run_chunk
+                # Счётчик ошибок подряд сбрасывается первой же успешной порцией
+                failed_chunks = job['checkpoint'].pop('failedChunks', 0)
+                try:
+                    run_chunk(conn, cur, schema, job, context)
+                except Exception as e:
+                    conn.rollback()
+                    print(f"[{job['jobType']}] Job {job['id']} chunk failed: {e}")
+                    job['error'] = str(e)
+                    job['checkpoint']['failedChunks'] = failed_chunks + 1
+                    if failed_chunks + 1 >= MAX_FAILED_CHUNKS:
+                        job['status'] = 'failed'
+                        print(f"[{job['jobType']}] Job {job['id']} failed after {MAX_FAILED_CHUNKS} chunks in a row")
+                    _save_job(cur, schema, job)
+                    conn.commit()
+    finally:
+        cur.close()
+        conn.close()
 
-    s3 = boto3.client('s3',
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps(_job_response(job)),
+        'isBase64Encoded': False
+    }
+
+
+def _bad_request(message):
+    return {
+        'statusCode': 400,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'error': message}),
+        'isBase64Encoded': False
+    }
+
+
+def _valid_job_id(job_id):
+    '''jobId не передан или состоит из цифр'''
+    return not job_id or str(job_id).isdigit()
+
+
+def _s3_client():
+    return boto3.client('s3',
         endpoint_url='https://bucket.poehali.dev',
         aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
         aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
     )
 
-    orphan_keys = []
-    orphan_size = 0
-
-    cur.execute(f"SELECT diagnostic_id, photo_url FROM {schema}.diagnostic_photos")
-    for row in cur.fetchall():
-        diag_id = row[0]
-        url = row[1]
-        if diag_id not in existing_ids and url and url.startswith(cdn_prefix):
-            key = url[len(cdn_prefix):]
-            size = _check_s3_key(s3, key)
-            if size is not None:
-                orphan_keys.append(key)
-                orphan_size += size
-                print(f"[cleanup] ORPHAN photo from DB: {key} ({size} bytes)")
-
-    if deleted_ids:
-        ids_list = list(deleted_ids)
-        cur.execute(f"SELECT id, report_url, report_with_photos_url FROM {schema}.diagnostics WHERE id IN ({','.join(str(i) for i in ids_list)})")
+
+def _run_chunk(conn, cur, schema, job, context):
+    '''Обрабатывает страницы листинга, пока есть время, сохраняя контрольную точку после каждой страницы'''
+    aws_key = os.environ.get('AWS_ACCESS_KEY_ID')
+    cdn_prefix = f"https://cdn.poehali.dev/projects/{aws_key}/bucket/"
+
+    s3 = _s3_client()
+
+    started = time.monotonic()
+    job['error'] = None
+    known_count = _create_known_keys_table(cur, schema, cdn_prefix)
+    conn.commit()
+    print(f"[cleanup] Job {job['id']}: known keys in DB: {known_count}")
+
+    grace_border = datetime.now(timezone.utc) - UPLOAD_GRACE_PERIOD
+    export_border = datetime.now(timezone.utc) - EXPORT_RETENTION
+    checkpoint = job['checkpoint']
+    progress = job['progress']
+    dry_run = job['dryRun']
+
+    while checkpoint.get('prefixIndex', 0) < len(SCAN_PREFIXES):
+        if not _has_time_left(context, started):
+            print(f"[cleanup] Job {job['id']}: time budget exhausted, will resume from checkpoint")
+            return
+
+        prefix = SCAN_PREFIXES[checkpoint.get('prefixIndex', 0)]
+        list_kwargs = {'Bucket': 'files', 'Prefix': prefix, 'MaxKeys': PAGE_SIZE}
+        if checkpoint.get('continuationToken'):
+            list_kwargs['ContinuationToken'] = checkpoint['continuationToken']
+        page = s3.list_objects_v2(**list_kwargs)
+
+        contents = page.get('Contents', [])
+        progress['scannedFiles'] += len(contents)
+        if prefix == EXPORT_PREFIX:
+            # Устаревшие выгрузки считаются осиротевшими файлами
+            orphans = [(obj['Key'], obj.get('Size', 0)) for obj in contents if obj['LastModified'] < export_border]
+        else:
+            candidates = [obj for obj in contents if obj['LastModified'] < grace_border]
+            orphans = _find_unknown_keys(cur, candidates) if candidates else []
+
+        if orphans:
+            progress['orphanFiles'] += len(orphans)
+            progress['orphanSize'] += sum(size for _, size in orphans)
+            print(f"[cleanup] Job {job['id']}: {len(orphans)} orphan files in page under {prefix}")
+            if not dry_run:
+                progress['deletedFiles'] += _delete_objects(s3, [key for key, _ in orphans])
+
+        if page.get('IsTruncated'):
+            checkpoint['continuationToken'] = page['NextContinuationToken']
+        else:
+            checkpoint['prefixIndex'] = checkpoint.get('prefixIndex', 0) + 1
+            checkpoint.pop('continuationToken', None)
+
+        _save_job(cur, schema, job)
+        conn.commit()
+
+    progress['orphanDbRecords'] = _count_orphan_db_records(cur, schema)
+    if not dry_run:
+        for table in ('diagnostic_photos', 'checklist_answers'):
+            cur.execute(
+                f"DELETE FROM {schema}.{table} t "
+                f"WHERE NOT EXISTS (SELECT 1 FROM {schema}.diagnostics d WHERE d.id = t.diagnostic_id)"
+            )
+            progress['deletedDbRecords'] += cur.rowcount
+
+    job['status'] = 'done'
+    _save_job(cur, schema, job)
+    conn.commit()
+    print(f"[cleanup] Job {job['id']} done: {json.dumps(progress)}")
+
+
+def _run_archive_chunk(conn, cur, schema, job, context):
+    '''Переносит диагностики старше границы в архив S3 пачками, пока есть время: пачка — отдельный файл и транзакция'''
+    started = time.monotonic()
+    job['error'] = None
+    checkpoint = job['checkpoint']
+    progress = job['progress']
+    cutoff = datetime.fromisoformat(checkpoint['cutoff'])
+
+    if job['dryRun']:
+        cur.execute(f"SELECT COUNT(*) FROM {schema}.diagnostics WHERE created_at < %s", (cutoff,))
+        progress['candidates'] = cur.fetchone()[0]
+        job['status'] = 'done'
+        _save_job(cur, schema, job)
+        conn.commit()
+        print(f"[archive] Job {job['id']} dry run: {progress['candidates']} diagnostics before {checkpoint['cutoff']}")
+        return
+
+    s3 = _s3_client()
+    while True:
+        if not _has_time_left(context, started):
+            print(f"[archive] Job {job['id']}: time budget exhausted, will resume from checkpoint")
+            return
+
+        cur.execute(
+            f"SELECT id FROM {schema}.diagnostics WHERE created_at < %s ORDER BY created_at, id LIMIT %s",
+            (cutoff, ARCHIVE_BATCH_SIZE)
+        )
+        ids = [row[0] for row in cur.fetchall()]
+        if not ids:
+            break
+
+        records = _load_archive_records(cur, schema, ids, cutoff)
+        checkpoint['batch'] = checkpoint.get('batch', 0) + 1
+        month = records[0]['diagnostic']['created_at'].strftime('%Y-%m')
+        archive_key = f"{ARCHIVE_PREFIX}{month}/{job['id']}_{checkpoint['batch']:05d}.jsonl.gz"
+        data, entries = _pack_archive(records)
+        # Файл пишется до удаления строк: при сбое транзакции данные остаются в таблицах
+        s3.put_object(Bucket='files', Key=archive_key, Body=data, ContentType='application/gzip')
+
+        cur.executemany(
+            f"INSERT INTO {schema}.archived_diagnostics "
+            f"(diagnostic_id, created_at, mechanic, car_number, car_number_norm, diagnostic_type, "
+            f"archive_key, byte_offset, byte_length, object_urls) "
+            f"VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s) "
+            f"ON CONFLICT (diagnostic_id) DO UPDATE SET archive_key = EXCLUDED.archive_key, "
+            f"byte_offset = EXCLUDED.byte_offset, byte_length = EXCLUDED.byte_length, "
+            f"object_urls = EXCLUDED.object_urls, archived_at = CURRENT_TIMESTAMP",
+            [
+                (
+                    record['diagnostic']['id'], record['diagnostic']['created_at'],
+                    record['diagnostic'].get('mechanic'), record['diagnostic'].get('car_number'),
+                    record['diagnostic'].get('car_number_norm'), record['diagnostic'].get('diagnostic_type'),
+                    archive_key, offset, length, _record_object_urls(record)
+                )
+                for record, offset, length in entries
+            ]
+        )
+        # Агрегат дефектов (defect_stats) не уменьшаем: архивные диагностики остаются в статистике
+        for table, id_column, key_column in ARCHIVE_TABLES:
+            cur.execute(
+                f"DELETE FROM {schema}.{table} WHERE {id_column} = ANY(%s) AND {key_column} < %s",
+                (ids, cutoff)
+            )
+
+        progress['archivedDiagnostics'] += len(records)
+        progress['archivedAnswers'] += sum(len(record['answers']) for record in records)
+        progress['archivedPhotos'] += sum(len(record['photos']) for record in records)
+        progress['archiveFiles'] += 1
+        progress['archiveSize'] += len(data)
+        _save_job(cur, schema, job)
+        conn.commit()
+        print(f"[archive] Job {job['id']}: {len(records)} diagnostics -> {archive_key} ({len(data)} bytes)")
+
+    progress['droppedPartitions'] += _drop_archived_partitions(conn, cur, schema, cutoff)
+    job['status'] = 'done'
+    _save_job(cur, schema, job)
+    conn.commit()
+    print(f"[archive] Job {job['id']} done: {json.dumps(progress)}")
+
+
+# Таблицы, из которых удаляются архивированные строки: (таблица, столбец id диагностики, ключ секционирования)
+ARCHIVE_TABLES = (
+    ('diagnostic_photos', 'diagnostic_id', 'diagnostic_created_at'),
+    ('checklist_answers', 'diagnostic_id', 'diagnostic_created_at'),
+    ('diagnostics', 'id', 'created_at'),
+)
+
+
+def _load_archive_records(cur, schema, ids, cutoff):
+    '''Диагностики пачки с ответами и фото; строки — словари по именам столбцов, чтобы архив повторял схему'''
+    def fetch(query):
+        cur.execute(query, (ids, cutoff))
+        columns = [column.name for column in cur.description]
+        return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+    diagnostics = fetch(
+        f"SELECT * FROM {schema}.diagnostics WHERE id = ANY(%s) AND created_at < %s ORDER BY created_at, id"
+    )
+    answers = fetch(
+        f"SELECT * FROM {schema}.checklist_answers WHERE diagnostic_id = ANY(%s) AND diagnostic_created_at < %s "
+        f"ORDER BY diagnostic_id, question_number"
+    )
+    photos = fetch(
+        f"SELECT * FROM {schema}.diagnostic_photos WHERE diagnostic_id = ANY(%s) AND diagnostic_created_at < %s "
+        f"ORDER BY diagnostic_id, question_index, created_at"
+    )
+
+    records = {row['id']: {'diagnostic': row, 'answers': [], 'photos': []} for row in diagnostics}
+    for row in answers:
+        records[row['diagnostic_id']]['answers'].append(row)
+    for row in photos:
+        records[row['diagnostic_id']]['photos'].append(row)
+    return list(records.values())
+
+
+def _json_default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def _pack_archive(records):
+    '''JSONL.gz, где каждая запись — отдельный gzip-член: файл читается целиком как обычный .jsonl.gz,
+    а одна запись — Range-запросом по смещению и длине'''
+    buffer = BytesIO()
+    entries = []
+    for record in records:
+        line = json.dumps(record, ensure_ascii=False, default=_json_default) + '\n'
+        member = gzip.compress(line.encode('utf-8'))
+        entries.append((record, buffer.tell(), len(member)))
+        buffer.write(member)
+    return buffer.getvalue(), entries
+
+
+def _record_object_urls(record):
+    '''Фото и отчёты архивной диагностики — остаются в S3 и учитываются очисткой как известные'''
+    urls = [record['diagnostic'].get('report_url'), record['diagnostic'].get('report_with_photos_url')]
+    urls.extend(photo['photo_url'] for photo in record['photos'])
+    for answer in record['answers']:
+        urls.extend(answer.get('photo_urls') or [])
+    return sorted({url for url in urls if url})
+
+
+def _drop_archived_partitions(conn, cur, schema, cutoff):
+    '''Отсоединяет и удаляет опустевшие месячные секции, целиком лежащие до границы архива'''
+    cur.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = %s::regclass AND c.relname ~ '^diagnostics_[0-9]{4}_[0-9]{2}$' ORDER BY c.relname",
+        (f"{schema}.diagnostics",)
+    )
+    dropped = 0
+    for (partition,) in cur.fetchall():
+        suffix = partition[len('diagnostics'):]
+        month = datetime.strptime(suffix, '_%Y_%m')
+        month_end = (month + timedelta(days=32)).replace(day=1)
+        if month_end > cutoff:
+            continue
+
+        cur.execute(
+            "SELECT name FROM unnest(%s::text[]) AS name WHERE to_regclass(name) IS NOT NULL",
+            ([f"{schema}.{table}{suffix}" for table, _, _ in ARCHIVE_TABLES],)
+        )
+        existing = [row[0] for row in cur.fetchall()]
+        cur.execute(" UNION ALL ".join(f"(SELECT 1 FROM {name} LIMIT 1)" for name in existing))
+        if cur.fetchone():
+            continue
+
+        cur.execute(f"SELECT {schema}.detach_diagnostics_month(%s)", (month.date(),))
+        for name in cur.fetchone()[0]:
+            cur.execute(f"DROP TABLE {schema}.{name}")
+        # Отсоединение блокирует родительские таблицы — фиксируем каждый месяц отдельно
+        conn.commit()
+        dropped += 1
+        print(f"[archive] Dropped empty partitions for {month.strftime('%Y-%m')}")
+    return dropped
+
+
+def _has_time_left(context, started):
+    get_remaining = getattr(context, 'get_remaining_time_in_millis', None)
+    if callable(get_remaining):
+        try:
+            return get_remaining() > TIMEOUT_RESERVE_MS
+        except Exception:
+            pass
+    return time.monotonic() - started < CHUNK_TIME_BUDGET
+
+
+def _row_to_job(row):
+    empty_progress = ARCHIVE_EMPTY_PROGRESS if row[9] == ARCHIVE_JOB_TYPE else EMPTY_PROGRESS
+    return {
+        'id': row[0],
+        'status': row[1],
+        'dryRun': row[2],
+        'checkpoint': row[3] or {},
+        'progress': {**empty_progress, **(row[4] or {})},
+        'error': row[5],
+        'createdAt': row[6],
+        'updatedAt': row[7],
+        'finishedAt': row[8],
+        'jobType': row[9],
+    }
+
+
+JOB_COLUMNS = 'id, status, dry_run, checkpoint, progress, error, created_at, updated_at, finished_at, job_type'
+
+
+def _load_job(cur, schema, job_type, job_id=None):
+    if job_id:
+        cur.execute(
+            f"SELECT {JOB_COLUMNS} FROM {schema}.maintenance_jobs WHERE id = %s AND job_type = %s",
+            (int(job_id), job_type)
+        )
     else:
-        cur.execute(f"SELECT id, report_url, report_with_photos_url FROM {schema}.diagnostics WHERE FALSE")
-    for row in cur.fetchall():
-        for url in [row[1], row[2]]:
-            if url and url.startswith(cdn_prefix):
-                key = url[len(cdn_prefix):]
-                size = _check_s3_key(s3, key)
-                if size is not None:
-                    orphan_keys.append(key)
-                    orphan_size += size
-                    print(f"[cleanup] ORPHAN report from DB: {key} ({size} bytes)")
-
-    print(f"[cleanup] Total orphan files: {len(orphan_keys)}, size: {orphan_size}")
+        cur.execute(
+            f"SELECT {JOB_COLUMNS} FROM {schema}.maintenance_jobs WHERE job_type = %s ORDER BY id DESC LIMIT 1",
+            (job_type,)
+        )
+    row = cur.fetchone()
+    return _row_to_job(row) if row else None
+
 
+def _find_running_job(cur, schema, job_type, dry_run):
     cur.execute(
-        f"SELECT DISTINCT diagnostic_id FROM {schema}.diagnostic_photos "
-        f"WHERE diagnostic_id NOT IN (SELECT id FROM {schema}.diagnostics)"
+        f"SELECT {JOB_COLUMNS} FROM {schema}.maintenance_jobs "
+        f"WHERE job_type = %s AND status = 'running' AND dry_run = %s ORDER BY id DESC LIMIT 1",
+        (job_type, dry_run)
     )
-    orphan_photo_diag_ids = set(row[0] for row in cur.fetchall())
+    row = cur.fetchone()
+    return _row_to_job(row) if row else None
 
+
+def _create_job(cur, schema, job_type, dry_run, checkpoint=None):
+    empty_progress = ARCHIVE_EMPTY_PROGRESS if job_type == ARCHIVE_JOB_TYPE else EMPTY_PROGRESS
     cur.execute(
-        f"SELECT DISTINCT diagnostic_id FROM {schema}.checklist_answers "
-        f"WHERE diagnostic_id NOT IN (SELECT id FROM {schema}.diagnostics)"
+        f"INSERT INTO {schema}.maintenance_jobs (job_type, dry_run, checkpoint, progress) "
+        f"VALUES (%s, %s, %s::jsonb, %s::jsonb) RETURNING {JOB_COLUMNS}",
+        (job_type, dry_run, json.dumps(checkpoint or {}), json.dumps(empty_progress))
     )
-    orphan_answer_diag_ids = set(row[0] for row in cur.fetchall())
+    return _row_to_job(cur.fetchone())
 
-    orphan_db_records = len(orphan_photo_diag_ids) + len(orphan_answer_diag_ids)
-    print(f"[cleanup] Orphan DB records: {orphan_db_records}")
 
-    deleted_files = 0
-    deleted_db = 0
+def _save_job(cur, schema, job):
+    cur.execute(
+        f"UPDATE {schema}.maintenance_jobs SET status = %s, checkpoint = %s::jsonb, progress = %s::jsonb, "
+        f"error = %s, updated_at = CURRENT_TIMESTAMP, "
+        f"finished_at = CASE WHEN %s <> 'running' THEN CURRENT_TIMESTAMP ELSE finished_at END "
+        f"WHERE id = %s RETURNING updated_at, finished_at",
+        (job['status'], json.dumps(job['checkpoint']), json.dumps(job['progress']),
+         job.get('error'), job['status'], job['id'])
+    )
+    job['updatedAt'], job['finishedAt'] = cur.fetchone()
 
-    if not dry_run:
-        for key in orphan_keys:
-            try:
-                s3.delete_object(Bucket='files', Key=key)
-                deleted_files += 1
-                print(f"[cleanup] DELETED: {key}")
-            except Exception as e:
-                print(f"[cleanup] Failed to delete {key}: {e}")
-
-        if orphan_photo_diag_ids:
-            ids_str = ','.join(str(i) for i in orphan_photo_diag_ids)
-            cur.execute(f"DELETE FROM {schema}.diagnostic_photos WHERE diagnostic_id IN ({ids_str})")
-            deleted_db += cur.rowcount
-
-        if orphan_answer_diag_ids:
-            ids_str = ','.join(str(i) for i in orphan_answer_diag_ids)
-            cur.execute(f"DELETE FROM {schema}.checklist_answers WHERE diagnostic_id IN ({ids_str})")
-            deleted_db += cur.rowcount
 
-        conn.commit()
+def _job_response(job):
+    if job['jobType'] == ARCHIVE_JOB_TYPE:
+        return _archive_job_response(job)
+    progress = job['progress']
+    checkpoint = job['checkpoint']
+    return {
+        'jobId': job['id'],
+        'jobType': job['jobType'],
+        'status': job['status'],
+        'done': job['status'] == 'done',
+        'dryRun': job['dryRun'],
+        'currentPrefix': SCAN_PREFIXES[checkpoint['prefixIndex']] if checkpoint.get('prefixIndex', 0) < len(SCAN_PREFIXES) else None,
+        'scannedFiles': progress['scannedFiles'],
+        'orphanFiles': progress['orphanFiles'],
+        'orphanSize': progress['orphanSize'],
+        'orphanSizeFormatted': _format_size(progress['orphanSize']),
+        'orphanDbRecords': progress['orphanDbRecords'],
+        'deletedFiles': progress['deletedFiles'],
+        'deletedDbRecords': progress['deletedDbRecords'],
+        'error': job.get('error'),
+        'createdAt': job['createdAt'].isoformat() if job.get('createdAt') else None,
+        'updatedAt': job['updatedAt'].isoformat() if job.get('updatedAt') else None,
+        'finishedAt': job['finishedAt'].isoformat() if job.get('finishedAt') else None,
+    }
 
-    cur.close()
-    conn.close()
 
+def _archive_job_response(job):
+    progress = job['progress']
     return {
-        'statusCode': 200,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
-        },
-        'body': json.dumps({
-            'dryRun': dry_run,
-            'orphanFiles': len(orphan_keys),
-            'orphanSize': orphan_size,
-            'orphanSizeFormatted': _format_size(orphan_size),
-            'orphanDbRecords': orphan_db_records,
-            'deletedFiles': deleted_files,
-            'deletedDbRecords': deleted_db
-        }),
-        'isBase64Encoded': False
+        'jobId': job['id'],
+        'jobType': job['jobType'],
+        'status': job['status'],
+        'done': job['status'] == 'done',
+        'dryRun': job['dryRun'],
+        'cutoff': job['checkpoint'].get('cutoff'),
+        'candidates': progress['candidates'],
+        'archivedDiagnostics': progress['archivedDiagnostics'],
+        'archivedAnswers': progress['archivedAnswers'],
+        'archivedPhotos': progress['archivedPhotos'],
+        'archiveFiles': progress['archiveFiles'],
+        'archiveSize': progress['archiveSize'],
+        'archiveSizeFormatted': _format_size(progress['archiveSize']),
+        'droppedPartitions': progress['droppedPartitions'],
+        'error': job.get('error'),
+        'createdAt': job['createdAt'].isoformat() if job.get('createdAt') else None,
+        'updatedAt': job['updatedAt'].isoformat() if job.get('updatedAt') else None,
+        'finishedAt': job['finishedAt'].isoformat() if job.get('finishedAt') else None,
     }
 
 
-def _check_s3_key(s3, key):
-    try:
-        resp = s3.head_object(Bucket='files', Key=key)
-        return resp.get('ContentLength', 0)
-    except Exception:
-        return None
+def _create_known_keys_table(cur, schema, cdn_prefix):
+    '''Собирает во временную таблицу все S3-ключи, на которые ссылаются живые и архивные диагностики'''
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS known_keys (key TEXT PRIMARY KEY)")
+    cur.execute("TRUNCATE known_keys")
+    cur.execute(
+        f"INSERT INTO known_keys (key) "
+        f"SELECT DISTINCT substr(u.url, length(%s) + 1) FROM ("
+        f"  SELECT p.photo_url FROM {schema}.diagnostic_photos p "
+        f"  WHERE EXISTS (SELECT 1 FROM {schema}.diagnostics d WHERE d.id = p.diagnostic_id) "
+        f"  UNION ALL SELECT report_url FROM {schema}.diagnostics "
+        f"  UNION ALL SELECT report_with_photos_url FROM {schema}.diagnostics "
+        f"  UNION ALL SELECT unnest(ca.photo_urls) FROM {schema}.checklist_answers ca "
+        f"  WHERE ca.photo_urls IS NOT NULL "
+        f"  AND EXISTS (SELECT 1 FROM {schema}.diagnostics d WHERE d.id = ca.diagnostic_id)"
+        f"  UNION ALL SELECT unnest(object_urls) FROM {schema}.archived_diagnostics"
+        f") AS u(url) "
+        f"WHERE left(u.url, length(%s)) = %s",
+        (cdn_prefix, cdn_prefix, cdn_prefix)
+    )
+    count = cur.rowcount
+    cur.execute("ANALYZE known_keys")
+    return count
+
+
+def _find_unknown_keys(cur, objects):
+    '''Anti-join страницы листинга с известными ключами (производные фото — по ключу нормализованного фото)'''
+    cur.execute(
+        "SELECT o.key, o.size FROM unnest(%s::text[], %s::bigint[]) AS o(key, size) "
+        "WHERE NOT EXISTS (SELECT 1 FROM known_keys k WHERE k.key = o.key) "
+        "AND NOT EXISTS (SELECT 1 FROM known_keys k WHERE k.key = regexp_replace(o.key, %s, '.jpg'))",
+        ([obj['Key'] for obj in objects], [obj.get('Size', 0) for obj in objects], PHOTO_VARIANT_PATTERN)
+    )
+    return cur.fetchall()
+
+
+def _delete_objects(s3, keys):
+    '''Пакетное удаление (до 1000 ключей за запрос)'''
+    deleted = 0
+    for start in range(0, len(keys), PAGE_SIZE):
+        batch = keys[start:start + PAGE_SIZE]
+        try:
+            resp = s3.delete_objects(
+                Bucket='files',
+                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+            )
+            errors = resp.get('Errors', [])
+            for err in errors:
+                print(f"[cleanup] Failed to delete {err.get('Key')}: {err.get('Message')}")
+            deleted += len(batch) - len(errors)
+        except Exception as e:
+            print(f"[cleanup] Batch delete failed: {e}")
+    return deleted
+
+
+def _count_orphan_db_records(cur, schema):
+    cur.execute(
+        f"SELECT "
+        f"(SELECT COUNT(DISTINCT p.diagnostic_id) FROM {schema}.diagnostic_photos p "
+        f" WHERE NOT EXISTS (SELECT 1 FROM {schema}.diagnostics d WHERE d.id = p.diagnostic_id)), "
+        f"(SELECT COUNT(DISTINCT ca.diagnostic_id) FROM {schema}.checklist_answers ca "
+        f" WHERE NOT EXISTS (SELECT 1 FROM {schema}.diagnostics d WHERE d.id = ca.diagnostic_id))"
+    )
+    photo_diag_count, answer_diag_count = cur.fetchone()
+    return photo_diag_count + answer_diag_count
 
 
 def _format_size(bytes_val):
@@ -162,4 +650,4 @@ def _format_size(bytes_val):
     elif bytes_val < 1024 * 1024 * 1024:
         return f"{bytes_val / (1024 * 1024):.1f} МБ"
     else:
-        return f"{bytes_val / (1024 * 1024 * 1024):.2f} ГБ"
\ No newline at end of file
+        return f"{bytes_val / (1024 * 1024 * 1024):.2f} ГБ"
@@ -3,9 +3,11 @@ import os
 import boto3
 import psycopg2
 
+from session_token import require_admin
+
 
 def handler(event: dict, context) -> dict:
-    '''Получение информации о состоянии S3 хранилища через БД + проверку S3'''
+    '''Получение информации о состоянии S3 хранилища: агрегат по размерам из БД, по запросу — сверка со списком объектов S3'''
 
     if event.get('httpMethod') == 'OPTIONS':
         return {
@@ -13,12 +15,19 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token'
             },
             'body': '',
             'isBase64Encoded': False
         }
 
+    unauthorized = require_admin(event)
+    if unauthorized:
+        return unauthorized
+
+    query_params = event.get('queryStringParameters', {}) or {}
+    reconcile = query_params.get('reconcile', 'false').lower() == 'true'
+
     db_url = os.environ.get('DATABASE_URL')
     schema = os.environ.get('MAIN_DB_SCHEMA')
     aws_key = os.environ.get('AWS_ACCESS_KEY_ID')
@@ -27,64 +36,34 @@ def handler(event: dict, context) -> dict:
     conn = psycopg2.connect(db_url)
     cur = conn.cursor()
 
-    s3 = boto3.client('s3',
-        endpoint_url='https://bucket.poehali.dev',
-        aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
-        aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
-    )
+    try:
+        reconciled_rows = 0
+        if reconcile:
+            s3 = boto3.client('s3',
+                endpoint_url='https://bucket.poehali.dev',
+                aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+                aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
+            )
+            totals, reconciled_rows = _reconcile_with_bucket(s3, cur, schema, cdn_prefix)
+            conn.commit()
+        else:
+            totals = _aggregate_from_db(cur, schema)
 
-    cur.execute(f"SELECT photo_url FROM {schema}.diagnostic_photos")
-    photo_rows = cur.fetchall()
-
-    photos_count = 0
-    photos_size = 0
-    for row in photo_rows:
-        url = row[0]
-        if url and url.startswith(cdn_prefix):
-            s3_key = url[len(cdn_prefix):]
-            try:
-                resp = s3.head_object(Bucket='files', Key=s3_key)
-                photos_size += resp.get('ContentLength', 0)
-                photos_count += 1
-            except Exception:
-                pass
+        cur.execute(
+            f"SELECT COUNT(*) FROM {schema}.diagnostic_photos p "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {schema}.diagnostics d WHERE d.id = p.diagnostic_id)"
+        )
+        orphan_photo_count = cur.fetchone()[0]
+    finally:
+        cur.close()
+        conn.close()
 
-    cur.execute(
-        f"SELECT DISTINCT d.id FROM {schema}.diagnostics d "
-        f"JOIN {schema}.checklist_answers ca ON ca.diagnostic_id = d.id"
-    )
-    diag_ids = [row[0] for row in cur.fetchall()]
-
-    reports_count = 0
-    reports_size = 0
-    for diag_id in diag_ids:
-        for suffix in ['', '_photos']:
-            key = f"reports/diagnostic_{diag_id}{suffix}.pdf"
-            try:
-                resp = s3.head_object(Bucket='files', Key=key)
-                reports_size += resp.get('ContentLength', 0)
-                reports_count += 1
-            except Exception:
-                pass
-
-    cur.execute(f"SELECT COUNT(*) FROM {schema}.diagnostic_photos WHERE diagnostic_id NOT IN (SELECT id FROM {schema}.diagnostics)")
-    orphan_photo_count = cur.fetchone()[0]
-
-    cur.close()
-    conn.close()
-
-    total_size = photos_size + reports_size
-    total_files = photos_count + reports_count
-
-    def format_size(bytes_val):
-        if bytes_val < 1024:
-            return f"{bytes_val} Б"
-        elif bytes_val < 1024 * 1024:
-            return f"{bytes_val / 1024:.1f} КБ"
-        elif bytes_val < 1024 * 1024 * 1024:
-            return f"{bytes_val / (1024 * 1024):.1f} МБ"
-        else:
-            return f"{bytes_val / (1024 * 1024 * 1024):.2f} ГБ"
+    photos_size, photos_count = totals['photos']
+    reports_size, reports_count = totals['reports']
+    other_size, other_count = totals['other']
+
+    total_size = photos_size + reports_size + other_size
+    total_files = photos_count + reports_count + other_count
 
     return {
         'statusCode': 200,
@@ -94,24 +73,114 @@ def handler(event: dict, context) -> dict:
         },
         'body': json.dumps({
             'totalSize': total_size,
-            'totalSizeFormatted': format_size(total_size),
+            'totalSizeFormatted': _format_size(total_size),
             'totalFiles': total_files,
             'orphanDbRecords': orphan_photo_count,
+            'unsizedFiles': totals['unsized'],
+            'reconciled': reconcile,
+            'reconciledRows': reconciled_rows,
             'photos': {
                 'size': photos_size,
-                'sizeFormatted': format_size(photos_size),
+                'sizeFormatted': _format_size(photos_size),
                 'count': photos_count
             },
             'reports': {
                 'size': reports_size,
-                'sizeFormatted': format_size(reports_size),
+                'sizeFormatted': _format_size(reports_size),
                 'count': reports_count
             },
             'other': {
-                'size': 0,
-                'sizeFormatted': '0 Б',
-                'count': 0
+                'size': other_size,
+                'sizeFormatted': _format_size(other_size),
+                'count': other_count
             }
         }),
         'isBase64Encoded': False
     }
+
+
+def _aggregate_from_db(cur, schema):
+    '''Объём хранилища по размерам, записанным при загрузке файлов'''
+    cur.execute(
+        f"SELECT "
+        f"(SELECT COUNT(*) FROM {schema}.diagnostic_photos), "
+        f"(SELECT COALESCE(SUM(file_size), 0) FROM {schema}.diagnostic_photos), "
+        f"(SELECT COUNT(*) FROM {schema}.diagnostic_photos WHERE file_size IS NULL), "
+        f"COUNT(report_url) + COUNT(report_with_photos_url), "
+        f"COALESCE(SUM(report_size), 0) + COALESCE(SUM(report_with_photos_size), 0), "
+        f"COUNT(*) FILTER (WHERE report_url IS NOT NULL AND report_size IS NULL) + "
+        f"COUNT(*) FILTER (WHERE report_with_photos_url IS NOT NULL AND report_with_photos_size IS NULL) "
+        f"FROM {schema}.diagnostics"
+    )
+    photos_count, photos_size, photos_unsized, reports_count, reports_size, reports_unsized = cur.fetchone()
+    return {
+        'photos': (int(photos_size), photos_count),
+        'reports': (int(reports_size), reports_count),
+        'other': (0, 0),
+        'unsized': photos_unsized + reports_unsized,
+    }
+
+
+def _reconcile_with_bucket(s3, cur, schema, cdn_prefix):
+    '''Постраничный обход бакета через list_objects_v2: точные итоги и дозапись размеров в БД'''
+    totals = {'photos': [0, 0], 'reports': [0, 0], 'other': [0, 0]}
+    reconciled_rows = 0
+
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket='files', PaginationConfig={'PageSize': 1000}):
+        photo_keys, photo_sizes = [], []
+        report_keys, report_sizes = [], []
+        for obj in page.get('Contents', []):
+            key = obj['Key']
+            size = obj.get('Size', 0)
+            if key.startswith('diagnostics/'):
+                category = 'photos'
+                photo_keys.append(key)
+                photo_sizes.append(size)
+            elif key.startswith('reports/'):
+                category = 'reports'
+                report_keys.append(key)
+                report_sizes.append(size)
+            else:
+                category = 'other'
+            totals[category][0] += size
+            totals[category][1] += 1
+
+        if photo_keys:
+            cur.execute(
+                f"UPDATE {schema}.diagnostic_photos p SET file_size = v.size "
+                f"FROM unnest(%s::text[], %s::bigint[]) AS v(key, size) "
+                f"WHERE p.photo_url = %s || v.key AND p.file_size IS DISTINCT FROM v.size",
+                (photo_keys, photo_sizes, cdn_prefix)
+            )
+            reconciled_rows += cur.rowcount
+
+        if report_keys:
+            for url_column, size_column in (('report_url', 'report_size'), ('report_with_photos_url', 'report_with_photos_size')):
+                cur.execute(
+                    f"UPDATE {schema}.diagnostics d SET {size_column} = v.size "
+                    f"FROM unnest(%s::text[], %s::bigint[]) AS v(key, size) "
+                    f"WHERE d.{url_column} = %s || v.key AND d.{size_column} IS DISTINCT FROM v.size",
+                    (report_keys, report_sizes, cdn_prefix)
+                )
+                reconciled_rows += cur.rowcount
+
+    print(f"[storage-info] Reconciled {reconciled_rows} rows with bucket listing")
+
+    return {
+        'photos': tuple(totals['photos']),
+        'reports': tuple(totals['reports']),
+        'other': tuple(totals['other']),
+        'unsized': 0,
+    }, reconciled_rows
+
+
+def _format_size(bytes_val):
+    if bytes_val < 1024:
+        return f"{bytes_val} Б"
+    elif bytes_val < 1024 * 1024:
+        return f"{bytes_val / 1024:.1f} КБ"
+    elif bytes_val < 1024 * 1024 * 1024:
+        return f"{bytes_val / (1024 * 1024):.1f} МБ"
+    else:
+        return f"{bytes_val / (1024 * 1024 * 1024):.2f} ГБ"
@@ -1,14 +1,50 @@
+import hashlib
 import json
 import os
-import base64
+import re
+import tempfile
+import uuid
 import boto3
+import psycopg2
 from datetime import datetime
+from io import BytesIO
+from zoneinfo import ZoneInfo
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from photo_hash import find_similar, image_dhash
+
+# Время жизни подписанной ссылки на загрузку
+UPLOAD_URL_TTL = 900
+MAX_PHOTO_SIZE = 20 * 1024 * 1024
+PHOTO_EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/webp': 'webp',
+    'image/heic': 'heic',
+}
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# Нормализация: оригинал хранится как <имя>.orig.<расширение>, рядом — <имя>.jpg для отчётов и просмотра
+# и <имя>.thumb.jpg для списков. В диагностику попадает ссылка на <имя>.jpg.
+ORIGINAL_SUFFIX = '.orig.'
+DISPLAY_MAX_SIDE = 2048
+THUMB_MAX_SIDE = 480
+# Кадр декодируется с уменьшением в целое число раз, пока длинная сторона не меньше этого значения:
+# 12-Мп кадр 4032x3024 читается как 2016x1512, а не целиком (отображаемая копия — от 1536 до 2048 по длинной стороне)
+DECODE_MIN_SIDE = DISPLAY_MAX_SIDE * 3 // 4
+JPEG_QUALITY = 82
+# Оригинал скачивается во временный файл, в памяти держим не больше этого объёма
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+# Защита от «бомб» распаковки: больше 64 Мп не декодируем
+Image.MAX_IMAGE_PIXELS = 64 * 1000 * 1000
+
 
 def handler(event: dict, context) -> dict:
-    '''API для загрузки фотографий в S3 хранилище'''
-    
+    '''API загрузки фотографий напрямую в S3: presign выдаёт подписанную PUT-ссылку, finalize фиксирует размер и хэш и строит нормализованные производные'''
+
     method = event.get('httpMethod', 'GET')
-    
+
     if method == 'OPTIONS':
         return {
             'statusCode': 200,
@@ -20,70 +56,281 @@ def handler(event: dict, context) -> dict:
             'body': '',
             'isBase64Encoded': False
         }
-    
+
     if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Метод не поддерживается'}),
-            'isBase64Encoded': False
-        }
-    
+        return _response(405, {'error': 'Метод не поддерживается'})
+
     try:
         body = json.loads(event.get('body', '{}'))
-        image_base64 = body.get('image')
-        filename = body.get('filename', f'photo_{datetime.now().timestamp()}.jpg')
-        
-        if not image_base64:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'error': 'Изображение обязательно'}),
-                'isBase64Encoded': False
-            }
-        
-        image_data = base64.b64decode(image_base64)
-        
+        action = body.get('action')
+
+        if action not in ('presign', 'finalize'):
+            return _response(400, {'error': 'Укажите action: presign или finalize'})
+
         s3 = boto3.client('s3',
             endpoint_url='https://bucket.poehali.dev',
             aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
             aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
         )
-        
-        key = f'diagnostics/{filename}'
-        
-        s3.put_object(
-            Bucket='files',
-            Key=key,
-            Body=image_data,
-            ContentType='image/jpeg'
-        )
-        
-        cdn_url = f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{key}"
-        
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'url': cdn_url}),
-            'isBase64Encoded': False
-        }
-        
+        conn = psycopg2.connect(os.environ.get('DATABASE_URL'))
+        try:
+            cur = conn.cursor()
+            if action == 'presign':
+                status, result = _presign(cur, s3, body)
+            else:
+                status, result = _finalize(cur, s3, body)
+            conn.commit()
+            cur.close()
+        finally:
+            conn.close()
+
+        return _response(status, result)
+
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
+        return _response(500, {'error': str(e)})
+
+
+def _response(status, payload):
+    return {
+        'statusCode': status,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps(payload, ensure_ascii=False),
+        'isBase64Encoded': False
+    }
+
+
+def _cdn_url(key):
+    return f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{key}"
+
+
+def _presign(cur, s3, body):
+    '''Регистрирует ключ и выдаёт подписанную ссылку: файл идёт из браузера прямо в хранилище'''
+    schema = os.environ.get('MAIN_DB_SCHEMA')
+    content_type = body.get('contentType') or 'image/jpeg'
+    if content_type not in PHOTO_EXTENSIONS:
+        return 400, {'error': 'Поддерживаются фото JPEG, PNG, WEBP и HEIC'}
+    size = body.get('size')
+    if size is not None and (not isinstance(size, int) or size <= 0 or size > MAX_PHOTO_SIZE):
+        return 400, {'error': f'Размер фото — до {MAX_PHOTO_SIZE // (1024 * 1024)} МБ'}
+
+    diagnostic_id = body.get('diagnosticId')
+    question_number = body.get('questionNumber')
+    now = datetime.now(ZoneInfo('Asia/Krasnoyarsk'))
+    extension = PHOTO_EXTENSIONS[content_type]
+    if diagnostic_id:
+        diagnostic_id = int(diagnostic_id)
+        question_part = f"question_{int(question_number)}_" if question_number else ''
+        stem = f"diagnostics/{diagnostic_id}/{question_part}{now.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    else:
+        # Фото мастера чек-листа загружаются до сохранения диагностики и попадают в неё ссылками из ответов
+        stem = f"diagnostics/uploads/{now.strftime('%Y%m%d')}/{uuid.uuid4().hex}"
+    key = f"{stem}{ORIGINAL_SUFFIX}{extension}"
+
+    cur.execute(
+        f"INSERT INTO {schema}.photo_uploads (object_key, diagnostic_id, question_number, content_type) "
+        f"VALUES (%s, %s, %s, %s)",
+        (key, diagnostic_id or None, int(question_number) if question_number else None, content_type)
+    )
+    upload_url = s3.generate_presigned_url(
+        'put_object',
+        Params={'Bucket': 'files', 'Key': key, 'ContentType': content_type},
+        ExpiresIn=UPLOAD_URL_TTL
+    )
+    return 200, {
+        'key': key,
+        'uploadUrl': upload_url,
+        'method': 'PUT',
+        'headers': {'Content-Type': content_type},
+        'expiresIn': UPLOAD_URL_TTL,
+        'url': _cdn_url(key)
+    }
+
+
+def _finalize(cur, s3, body):
+    '''Подтверждение загрузки: размер и ETag из HEAD объекта, SHA-256 и dHash по содержимому;
+    повтор уже загруженного файла переиспользует объект, новое фото получает нормализованные производные'''
+    schema = os.environ.get('MAIN_DB_SCHEMA')
+    key = body.get('key')
+    sha256 = (body.get('sha256') or '').lower() or None
+    if not key:
+        return 400, {'error': 'Ключ загрузки обязателен'}
+    if sha256 and not SHA256_PATTERN.match(sha256):
+        return 400, {'error': 'sha256 — 64 шестнадцатеричных символа'}
+
+    cur.execute(
+        f"SELECT diagnostic_id, question_number, content_type, file_size, sha256, finalized_at, photo_url "
+        f"FROM {schema}.photo_uploads WHERE object_key = %s FOR UPDATE",
+        (key,)
+    )
+    upload = cur.fetchone()
+    if not upload:
+        return 404, {'error': 'Загрузка не найдена'}
+    diagnostic_id, question_number, content_type, file_size, stored_sha256, finalized_at, photo_url = upload
+    if finalized_at:
+        return 200, {'key': key, 'url': photo_url or _cdn_url(key), 'size': file_size, 'sha256': stored_sha256}
+
+    try:
+        head = s3.head_object(Bucket='files', Key=key)
+    except s3.exceptions.ClientError:
+        return 409, {'error': 'Файл ещё не загружен в хранилище'}
+
+    file_size = head['ContentLength']
+    if file_size > MAX_PHOTO_SIZE:
+        s3.delete_object(Bucket='files', Key=key)
+        cur.execute(f"DELETE FROM {schema}.photo_uploads WHERE object_key = %s", (key,))
+        return 400, {'error': f'Размер фото — до {MAX_PHOTO_SIZE // (1024 * 1024)} МБ'}
+
+    etag = head.get('ETag', '').strip('"') or None
+
+    image, actual_sha256, phash = _read_photo(s3, key)
+    if sha256 and sha256 != actual_sha256:
+        s3.delete_object(Bucket='files', Key=key)
+        cur.execute(f"DELETE FROM {schema}.photo_uploads WHERE object_key = %s", (key,))
+        return 400, {'error': 'Контрольная сумма не совпала — загрузите фото ещё раз'}
+    sha256 = actual_sha256
+    question_index = (question_number or 1) - 1
+
+    # Тот же файл уже загружен: объект переиспользуется, только что загруженный оригинал удаляется
+    derivatives = None
+    duplicate_url, duplicate_question_index = _find_duplicate(cur, s3, schema, key, diagnostic_id, question_index, sha256)
+    if duplicate_url:
+        s3.delete_object(Bucket='files', Key=key)
+        url = duplicate_url
+        photo_size = file_size
+    else:
+        # Без производных (формат, который Pillow не читает) ссылкой остаётся оригинал
+        url = _cdn_url(key)
+        photo_size = file_size
+        if image is not None:
+            derivatives = _store_derivatives(s3, key, image)
+            display_key, photo_size = derivatives['display']
+            url = _cdn_url(display_key)
+
+    cur.execute(
+        f"UPDATE {schema}.photo_uploads SET file_size = %s, etag = %s, sha256 = %s, phash = %s, photo_url = %s, "
+        f"finalized_at = CURRENT_TIMESTAMP WHERE object_key = %s",
+        (file_size, etag, sha256, phash, url, key)
+    )
+
+    similar_photo_id = None
+    if diagnostic_id and duplicate_question_index != question_index:
+        if not duplicate_url:
+            cur.execute(
+                f"SELECT id, phash FROM {schema}.diagnostic_photos WHERE diagnostic_id = %s AND phash IS NOT NULL ORDER BY id",
+                (diagnostic_id,)
+            )
+            similar_photo_id = find_similar(phash, cur.fetchall())
+        cur.execute(
+            f"INSERT INTO {schema}.diagnostic_photos "
+            f"(diagnostic_id, question_index, photo_url, file_size, sha256, phash, similar_photo_id, diagnostic_created_at) "
+            f"VALUES (%s, %s, %s, %s, %s, %s, %s, (SELECT created_at FROM {schema}.diagnostics WHERE id = %s))",
+            (diagnostic_id, question_index, url, photo_size, sha256, phash, similar_photo_id, diagnostic_id)
+        )
+        cur.execute(
+            f"UPDATE {schema}.diagnostics SET photo_count = photo_count + 1 WHERE id = %s",
+            (diagnostic_id,)
+        )
+
+    print(f"[upload] Finalized {key}: {file_size} bytes, duplicate of: {duplicate_url}, derivatives: {derivatives}")
+    response = {
+        'key': key,
+        'url': url,
+        'size': file_size,
+        'sha256': sha256,
+        'etag': etag,
+        'duplicate': bool(duplicate_url),
+        'similarPhotoId': similar_photo_id
+    }
+    if derivatives:
+        response['originalUrl'] = _cdn_url(key)
+        response['thumbUrl'] = _cdn_url(derivatives['thumb'][0])
+    return 200, response
+
+
+def _read_photo(s3, key):
+    '''Скачивает оригинал во временный файл, считает SHA-256 и декодирует кадр для производных и dHash.
+    JPEG декодируется сразу в уменьшенном масштабе (draft), остальные форматы уменьшаются через reduce сразу
+    после декодирования — поворот и масштабирование не работают с полным кадром. Возвращает (кадр или None, sha256, dhash)'''
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as original:
+        s3.download_fileobj('files', key, original)
+        original.seek(0)
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: original.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+        original.seek(0)
+        try:
+            with Image.open(original) as source:
+                width, height = source.size
+                long_side = max(width, height)
+                if source.format == 'JPEG':
+                    # draft сохраняет обе стороны не меньше запрошенных — запрос в пропорциях кадра
+                    source.draft('RGB', (max(1, DECODE_MIN_SIDE * width // long_side), max(1, DECODE_MIN_SIDE * height // long_side)))
+                    image = source
+                else:
+                    factor = long_side // DECODE_MIN_SIDE
+                    image = source.reduce(factor) if factor > 1 else source
+                image = ImageOps.exif_transpose(image)
+                image.thumbnail((DISPLAY_MAX_SIDE, DISPLAY_MAX_SIDE), Image.LANCZOS, reducing_gap=3.0)
+                image = _to_rgb(image)
+        except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+            print(f"[upload] Skip normalization of {key}: {e}")
+            return None, digest.hexdigest(), None
+    return image, digest.hexdigest(), image_dhash(image)
+
+
+def _find_duplicate(cur, s3, schema, key, diagnostic_id, question_index, sha256):
+    '''Ранее загруженный тот же файл: в этой диагностике (предпочтительно к тому же вопросу) или, для мастера
+    чек-листа, среди прежних загрузок без диагностики. Возвращает (url, индекс вопроса) или (None, None)'''
+    if diagnostic_id:
+        cur.execute(
+            f"SELECT photo_url, question_index FROM {schema}.diagnostic_photos "
+            f"WHERE diagnostic_id = %s AND sha256 = %s ORDER BY (question_index = %s) DESC, id LIMIT 1",
+            (diagnostic_id, sha256, question_index)
+        )
+        row = cur.fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    cur.execute(
+        f"SELECT photo_url FROM {schema}.photo_uploads "
+        f"WHERE sha256 = %s AND diagnostic_id IS NULL AND photo_url IS NOT NULL AND object_key <> %s "
+        f"ORDER BY finalized_at DESC LIMIT 1",
+        (sha256, key)
+    )
+    row = cur.fetchone()
+    if not row:
+        return None, None
+    # Загрузки без диагностики очистка удаляет, если на них никто не сослался — проверяем, что объект жив
+    try:
+        s3.head_object(Bucket='files', Key=row[0][len(_cdn_url('')):])
+    except s3.exceptions.ClientError:
+        return None, None
+    return row[0], None
+
+
+def _store_derivatives(s3, key, image):
+    '''Нормализованное фото и миниатюра в JPEG без метаданных рядом с оригиналом'''
+    stem = key.rsplit(ORIGINAL_SUFFIX, 1)[0]
+    thumb = image.copy()
+    thumb.thumbnail((THUMB_MAX_SIDE, THUMB_MAX_SIDE), Image.LANCZOS, reducing_gap=2.0)
+
+    derivatives = {}
+    for name, variant, variant_key in (('display', image, f"{stem}.jpg"), ('thumb', thumb, f"{stem}.thumb.jpg")):
+        buffer = BytesIO()
+        # exif не передаём — метаданные (в том числе геопозиция) в производные не попадают
+        variant.save(buffer, format='JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+        s3.put_object(Bucket='files', Key=variant_key, Body=buffer.getvalue(), ContentType='image/jpeg')
+        derivatives[name] = (variant_key, buffer.tell())
+    return derivatives
+
+
+def _to_rgb(image):
+    '''Прозрачность (PNG) заливается белым, остальные режимы приводятся к RGB'''
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB') if image.mode != 'RGB' else image
@@ -0,0 +1,54 @@
+"""
+Перцептивный хэш фото для поиска повторов: разностный хэш dHash находит тот же кадр после пересжатия
+или уменьшения мессенджером. Точный дубликат определяется по SHA-256, который считается по ходу загрузки.
+
+Одинаковая копия модуля лежит в backend/max-webhook и backend/upload-photo — изменения вносить в обе копии.
+"""
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+# Порог расстояния Хэмминга между dHash, при котором фото считаются похожими (из 64 бит)
+NEAR_DUPLICATE_DISTANCE = 6
+HASH_SIZE = 8
+_MASK = (1 << 64) - 1
+
+
+def image_dhash(image) -> int:
+    '''dHash 8x8: знак разности яркости соседних пикселей уменьшенного кадра.
+    Значение приведено к знаковому 64-битному (столбец BIGINT)'''
+    small = image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            left = pixels[row * (HASH_SIZE + 1) + col]
+            right = pixels[row * (HASH_SIZE + 1) + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def photo_dhash(source):
+    '''dHash фото (байты или файловый объект) с учётом поворота из EXIF; JPEG декодируется сразу
+    в малом масштабе (draft). None — формат не распознан'''
+    try:
+        with Image.open(BytesIO(source) if isinstance(source, bytes) else source) as image:
+            image.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))
+            return image_dhash(ImageOps.exif_transpose(image))
+    except Exception as e:
+        print(f"[WARNING] Failed to compute photo dHash: {str(e)}")
+        return None
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin((a ^ b) & _MASK).count('1')
+
+
+def find_similar(phash, candidates):
+    '''Первый кандидат (id, dhash) с расстоянием не больше порога'''
+    if phash is None:
+        return None
+    for candidate_id, candidate_hash in candidates:
+        if candidate_hash is not None and hamming_distance(phash, candidate_hash) <= NEAR_DUPLICATE_DISTANCE:
+            return candidate_id
+    return None
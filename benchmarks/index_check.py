@@ -0,0 +1,211 @@
+"""
+Проверка планов запросов бота к ответам и фото на заполненной базе.
+
+Скрипт применяет миграции db_migrations к локальному Postgres (схема t_p70271656_max_bot_diagnosis
+пересоздаётся), заполняет её синтетическими диагностиками за несколько месяцев, раскладывает строки
+по месячным секциям и выполняет ANALYZE. Затем для запросов max-webhook по (diagnostic_id, question_number)
+и (diagnostic_id, question_index) берётся EXPLAIN: в каждой непустой секции должен использоваться индекс,
+первые столбцы которого — именно эта пара (uq_checklist_answers_question, idx_diagnostic_photos_question).
+Пустые секции не проверяются: для них планировщик законно выбирает последовательное чтение.
+
+Запросы повторяют текст из backend/max-webhook/index.py; при изменении запросов обновите QUERIES.
+Код выхода 1, если хотя бы один план не использует нужный индекс.
+
+Пример:
+    DATABASE_URL=postgresql://localhost/indexcheck python benchmarks/index_check.py --recreate
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+from datetime import date
+
+import psycopg2
+
+SCHEMA = 't_p70271656_max_bot_diagnosis'
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'db_migrations')
+SEED_MONTHS = 3
+QUESTIONS = 30
+PHOTOS_PER_DIAGNOSTIC = 4
+
+ANSWER_COLUMNS = ('diagnostic_id', 'question_number')
+PHOTO_COLUMNS = ('diagnostic_id', 'question_index')
+
+# (название, запрос, столбцы индекса) — запросы max-webhook
+QUERIES = [
+    ('answer for update',
+     f"SELECT answer_code FROM {SCHEMA}.checklist_answers "
+     f"WHERE diagnostic_id = %(diagnostic_id)s AND question_number = %(question_number)s FOR UPDATE",
+     ANSWER_COLUMNS),
+    ('last answer',
+     f"SELECT question_number FROM {SCHEMA}.checklist_answers "
+     f"WHERE diagnostic_id = %(diagnostic_id)s ORDER BY question_number DESC LIMIT 1",
+     ANSWER_COLUMNS),
+    ('delete answer',
+     f"DELETE FROM {SCHEMA}.checklist_answers "
+     f"WHERE diagnostic_id = %(diagnostic_id)s AND question_number = %(question_number)s RETURNING answer_code",
+     ANSWER_COLUMNS),
+    ('question photos',
+     f"SELECT DISTINCT p.photo_url FROM {SCHEMA}.diagnostic_photos p "
+     f"WHERE p.diagnostic_id = %(diagnostic_id)s AND p.question_index = %(question_index)s",
+     PHOTO_COLUMNS),
+    ('delete photos',
+     f"DELETE FROM {SCHEMA}.diagnostic_photos "
+     f"WHERE diagnostic_id = %(diagnostic_id)s AND question_index = %(question_index)s",
+     PHOTO_COLUMNS),
+]
+
+INDEX_COLUMNS_SQL = '''
+SELECT array_agg(a.attname::text ORDER BY k.ord)
+FROM pg_index i
+JOIN pg_class c ON c.oid = i.indexrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+CROSS JOIN unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+WHERE n.nspname = %s AND c.relname = %s
+'''
+
+
+def migration_files(directory):
+    files = glob.glob(os.path.join(directory, 'V*__*.sql'))
+    return sorted(files, key=lambda path: int(re.match(r'V(\d+)__', os.path.basename(path)).group(1)))
+
+
+def apply_migrations(cur, directory):
+    for path in migration_files(directory):
+        with open(path, encoding='utf-8') as f:
+            cur.execute(f.read())
+    print(f"Применено миграций: {len(migration_files(directory))}")
+
+
+def seed(cur, diagnostics):
+    '''Диагностики за SEED_MONTHS месяцев с ответами на все вопросы и фото части вопросов'''
+    cur.execute(
+        f"INSERT INTO {SCHEMA}.diagnostics "
+        f"(mechanic, car_number, mileage, diagnostic_type, created_at, completed) "
+        f"SELECT 'Механик ' || (g %% 12), 'A' || lpad((g %% 1000)::text, 3, '0') || 'BC124', 10000 + g, "
+        f"CASE WHEN g %% 5 = 0 THEN 'priemka' ELSE '5min' END, "
+        f"date_trunc('month', CURRENT_DATE) - make_interval(months => g %% %s) + make_interval(mins => g), true "
+        f"FROM generate_series(1, %s) g",
+        (SEED_MONTHS, diagnostics)
+    )
+    cur.execute(
+        f"INSERT INTO {SCHEMA}.checklist_answers "
+        f"(diagnostic_id, question_number, answer_type, answer_code, diagnostic_created_at) "
+        f"SELECT d.id, q, 'single', CASE WHEN (d.id + q) %% 9 = 0 THEN 'bad' ELSE 'ok' END, d.created_at "
+        f"FROM {SCHEMA}.diagnostics d CROSS JOIN generate_series(1, %s) q",
+        (QUESTIONS,)
+    )
+    cur.execute(
+        f"INSERT INTO {SCHEMA}.diagnostic_photos "
+        f"(diagnostic_id, question_index, photo_url, file_size, diagnostic_created_at) "
+        f"SELECT d.id, (d.id * 7 + p) %% %s, "
+        f"'https://cdn.poehali.dev/projects/check/bucket/diagnostics/' || d.id || '/' || p || '.jpg', 250000, d.created_at "
+        f"FROM {SCHEMA}.diagnostics d CROSS JOIN generate_series(1, %s) p",
+        (QUESTIONS, PHOTOS_PER_DIAGNOSTIC)
+    )
+
+
+def partition_rows(cur):
+    '''Строки прошлых месяцев попали в секцию по умолчанию — переносим их в месячные секции'''
+    today = date.today()
+    first_month = date(today.year, today.month, 1)
+    for _ in range(SEED_MONTHS - 1):
+        first_month = date(first_month.year - (first_month.month == 1), (first_month.month - 2) % 12 + 1, 1)
+    created = 0
+    for table in ('diagnostics', 'checklist_answers', 'diagnostic_photos'):
+        cur.execute(f"SELECT {SCHEMA}.ensure_monthly_partitions(%s, %s, CURRENT_DATE)", (table, first_month))
+        created += cur.fetchone()[0]
+    print(f"Создано месячных секций: {created}")
+
+
+def scan_nodes(plan):
+    '''Узлы чтения таблиц плана (рекурсивно по вложенным планам)'''
+    if 'Relation Name' in plan:
+        yield plan
+    for child in plan.get('Plans', []):
+        yield from scan_nodes(child)
+
+
+def check_query(cur, name, query, params, expected_columns, row_counts):
+    cur.execute('EXPLAIN (FORMAT JSON) ' + query, params)
+    plan = cur.fetchone()[0][0]['Plan']
+    problems = []
+    checked = 0
+    for node in scan_nodes(plan):
+        relation = node['Relation Name']
+        if not row_counts.get(relation):
+            continue
+        checked += 1
+        index_name = node.get('Index Name')
+        if not index_name:
+            problems.append(f"{relation}: {node['Node Type']} без индекса")
+            continue
+        cur.execute(INDEX_COLUMNS_SQL, (node.get('Schema', SCHEMA), index_name))
+        columns = tuple(cur.fetchone()[0] or ())
+        if columns[:len(expected_columns)] != expected_columns:
+            problems.append(f"{relation}: индекс {index_name} {columns}, ожидался ({', '.join(expected_columns)}, ...)")
+    if not checked:
+        problems.append('в плане нет ни одной непустой секции')
+    status = 'OK  ' if not problems else 'FAIL'
+    print(f"{status} {name}: проверено секций {checked}")
+    for problem in problems:
+        print(f"     {problem}")
+    return not problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Проверка индексов запросов бота по EXPLAIN')
+    parser.add_argument('--diagnostics', type=int, default=6000, help='сколько диагностик создать')
+    parser.add_argument('--migrations', default=MIGRATIONS_DIR, help='каталог миграций')
+    parser.add_argument('--recreate', action='store_true', help=f'пересоздать существующую схему {SCHEMA}')
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        sys.exit('Нужен DATABASE_URL локальной БД для проверки')
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("SELECT to_regnamespace(%s) IS NOT NULL", (SCHEMA,))
+    if cur.fetchone()[0]:
+        if not args.recreate:
+            sys.exit(f'Схема {SCHEMA} уже есть в этой БД; для пересоздания укажите --recreate')
+        cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    # Часть ранних миграций обращается к таблицам без схемы
+    cur.execute(f"SET search_path = {SCHEMA}, public")
+
+    apply_migrations(cur, args.migrations)
+    seed(cur, args.diagnostics)
+    partition_rows(cur)
+    cur.execute(f"ANALYZE {SCHEMA}.diagnostics, {SCHEMA}.checklist_answers, {SCHEMA}.diagnostic_photos")
+
+    cur.execute(
+        "SELECT c.relname, c.reltuples FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = %s AND c.relkind = 'r'",
+        (SCHEMA,)
+    )
+    row_counts = {relname: reltuples > 0 for relname, reltuples in cur.fetchall()}
+
+    cur.execute(
+        f"SELECT d.id, a.question_number, p.question_index FROM {SCHEMA}.diagnostics d "
+        f"JOIN {SCHEMA}.checklist_answers a ON a.diagnostic_id = d.id "
+        f"JOIN {SCHEMA}.diagnostic_photos p ON p.diagnostic_id = d.id "
+        f"ORDER BY d.id DESC LIMIT 1"
+    )
+    diagnostic_id, question_number, question_index = cur.fetchone()
+    params = {'diagnostic_id': diagnostic_id, 'question_number': question_number, 'question_index': question_index}
+
+    # DELETE в EXPLAIN без ANALYZE не выполняется; транзакция — на случай изменения скрипта
+    conn.autocommit = False
+    results = [check_query(cur, name, query, params, columns, row_counts) for name, query, columns in QUERIES]
+    conn.rollback()
+    print(json.dumps({'checked': len(results), 'failed': results.count(False)}))
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == '__main__':
+    main()
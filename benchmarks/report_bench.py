@@ -0,0 +1,419 @@
+"""
+Замер генерации отчётов generate-report на синтетических диагностиках.
+
+Скрипт создаёт в локальном Postgres отдельную схему с таблицами, которые читает generate-report,
+заполняет её диагностиками (5-ти минутка с N неисправностями, Приемка с фото до 40 шт.),
+раздаёт фото с локального HTTP-сервера, а выгрузку в S3 подменяет записью во временный каталог.
+Каждый сценарий выполняется в отдельном процессе, поэтому ru_maxrss — пик именно этого сценария.
+
+Для каждого сценария записываются: время (медиана и минимум по повторам), пик памяти Python
+(tracemalloc) и процесса (ru_maxrss), число страниц и размер PDF. Результат сохраняется в JSON;
+с --baseline печатается сравнение с прошлым прогоном.
+
+Зависимости — как у функции (backend/generate-report/requirements.txt). Фоны страниц и шрифт
+функция при первом запуске скачивает в /tmp, дальше берёт из кэша. Без доступа к CDN —
+флаг --offline: синтетические фоны и локальный шрифт (--font) раздаются тем же HTTP-сервером,
+а кэш фонов и шрифта переносится во временный каталог замера, чтобы не подменить кэш функции в /tmp.
+
+Пример:
+    DATABASE_URL=postgresql://localhost/bench python benchmarks/report_bench.py --output bench.json
+    DATABASE_URL=postgresql://localhost/bench python benchmarks/report_bench.py --baseline bench.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import re
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from queue import Empty
+
+REPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'generate-report')
+sys.path.insert(0, REPORT_DIR)
+
+SCHEMA = 'report_bench'
+AWS_KEY = 'bench'
+PHOTO_SIZE = (1600, 1200)
+
+# Сценарии: тип, число неисправностей (5-ти минутка) или фото (Приемка), отчёт с фото, формат
+SCENARIOS = [
+    {'name': '5min_0_defects', 'type': '5min', 'defects': 0, 'withPhotos': False},
+    {'name': '5min_10_defects', 'type': '5min', 'defects': 10, 'withPhotos': False},
+    {'name': '5min_10_defects_photos', 'type': '5min', 'defects': 10, 'withPhotos': True},
+    {'name': '5min_30_defects_photos', 'type': '5min', 'defects': 30, 'withPhotos': True},
+    {'name': 'priemka_10_photos', 'type': 'priemka', 'photos': 10, 'withPhotos': False},
+    {'name': 'priemka_40_photos', 'type': 'priemka', 'photos': 40, 'withPhotos': False},
+    {'name': '5min_30_defects_json', 'type': '5min', 'defects': 30, 'withPhotos': True, 'format': 'json'},
+    {'name': 'priemka_40_photos_html', 'type': 'priemka', 'photos': 40, 'withPhotos': False, 'format': 'html'},
+]
+
+DDL = f'''
+DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;
+CREATE SCHEMA {SCHEMA};
+CREATE TABLE {SCHEMA}.diagnostics (
+    id SERIAL PRIMARY KEY,
+    mechanic VARCHAR(100),
+    car_number VARCHAR(20),
+    mileage INTEGER,
+    diagnostic_type VARCHAR(20),
+    completed BOOLEAN DEFAULT true,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    report_url TEXT,
+    report_size BIGINT,
+    report_fingerprint CHAR(64),
+    report_with_photos_url TEXT,
+    report_with_photos_size BIGINT,
+    report_with_photos_fingerprint CHAR(64)
+);
+CREATE TABLE {SCHEMA}.checklist_answers (
+    id SERIAL PRIMARY KEY,
+    diagnostic_id INTEGER,
+    question_number INTEGER,
+    question_text TEXT,
+    answer_code VARCHAR(50),
+    answer_value TEXT,
+    answer_note TEXT,
+    sub_answers JSONB
+);
+CREATE TABLE {SCHEMA}.diagnostic_photos (
+    id SERIAL PRIMARY KEY,
+    diagnostic_id INTEGER,
+    question_index INTEGER,
+    photo_url TEXT,
+    caption TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE {SCHEMA}.photo_uploads (
+    object_key TEXT PRIMARY KEY,
+    photo_url TEXT
+);
+'''
+
+
+class LocalS3:
+    '''Замена клиента S3 для замера: объекты пишутся во временный каталог'''
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        with open(self._path(Key), 'wb') as target:
+            target.write(Body)
+        return {'ETag': '"bench"'}
+
+    def delete_object(self, Bucket, Key):
+        if os.path.exists(os.path.join(self.root, Key)):
+            os.remove(os.path.join(self.root, Key))
+        return {}
+
+
+def make_photos(directory, count):
+    '''Синтетические JPEG размером с фото из мессенджера: градиент с шумом, чтобы сжатие было реалистичным'''
+    from PIL import Image, ImageDraw
+    rng = random.Random(42)
+    names = []
+    for number in range(count):
+        image = Image.radial_gradient('L').resize(PHOTO_SIZE).convert('RGB')
+        noise = Image.effect_noise(PHOTO_SIZE, 40).convert('RGB')
+        image = Image.blend(image, noise, 0.35)
+        draw = ImageDraw.Draw(image)
+        for _ in range(30):
+            x, y = rng.randrange(PHOTO_SIZE[0]), rng.randrange(PHOTO_SIZE[1])
+            draw.rectangle([x, y, x + rng.randrange(40, 300), y + rng.randrange(40, 300)],
+                           fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+        name = f'photo_{number:03d}.jpg'
+        image.save(os.path.join(directory, name), format='JPEG', quality=85)
+        names.append(name)
+    return names
+
+
+def make_offline_assets(directory, font_path):
+    '''Фоны страниц A4 при 150 dpi и копия шрифта для замера без доступа к CDN'''
+    from PIL import Image, ImageDraw
+    for name, accent in (('first_page.png', (30, 91, 168)), ('background.png', (120, 150, 200))):
+        image = Image.new('RGBA', (1240, 1754), (255, 255, 255, 0))
+        draw = ImageDraw.Draw(image)
+        draw.rectangle([0, 0, 1240, 260], fill=accent + (255,))
+        draw.rectangle([0, 1690, 1240, 1754], fill=accent + (160,))
+        for step in range(0, 1240, 40):
+            draw.line([step, 260, step + 200, 0], fill=(255, 255, 255, 90), width=6)
+        image.save(os.path.join(directory, name))
+    shutil.copy(font_path, os.path.join(directory, 'font.ttf'))
+
+
+def serve_directory(directory):
+    handler = partial(QuietHandler, directory=directory)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/'
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def _defect_answer(question):
+    '''Ответ «Неисправно» с первыми подпунктами вопроса'''
+    bad = next((option for option in question['options'] if option['value'] == 'bad'), None)
+    sub_options = (bad or {}).get('subOptions', [])
+    if not sub_options:
+        return None
+    first = sub_options[0]
+    if bad.get('allowMultiple'):
+        sub_answers = {'main': [first['value']]}
+        if first.get('subOptions'):
+            sub_answers[f"main-{first['value']}"] = first['subOptions'][0]['value']
+        return sub_answers
+    return {'main': first['value']}
+
+
+def seed(conn, photo_urls, scenario):
+    '''Синтетическая диагностика сценария; возвращает её id'''
+    from checklist_data import get_checklist_questions_full
+    from priemka_data import get_priemka_questions
+
+    cur = conn.cursor()
+    cur.execute(
+        f"INSERT INTO {SCHEMA}.diagnostics (mechanic, car_number, mileage, diagnostic_type, created_at) "
+        f"VALUES (%s, %s, %s, %s, %s) RETURNING id",
+        ('Бенчмарк', 'А123ВС124', 123456, scenario['type'], datetime(2026, 1, 15, 10, 30))
+    )
+    diagnostic_id = cur.fetchone()[0]
+    photos = iter(photo_urls * 10)
+
+    if scenario['type'] == '5min':
+        defects_left = scenario['defects']
+        for question in get_checklist_questions_full():
+            is_bad = defects_left > 0 and any(option['value'] == 'bad' for option in question['options'])
+            sub_answers = _defect_answer(question) if is_bad else None
+            code = 'bad' if is_bad else 'ok'
+            cur.execute(
+                f"INSERT INTO {SCHEMA}.checklist_answers (diagnostic_id, question_number, answer_code, sub_answers) "
+                f"VALUES (%s, %s, %s, %s)",
+                (diagnostic_id, question['id'], code, json.dumps(sub_answers) if sub_answers else None)
+            )
+            if is_bad:
+                defects_left -= 1
+                cur.execute(
+                    f"INSERT INTO {SCHEMA}.diagnostic_photos (diagnostic_id, question_index, photo_url, caption) "
+                    f"VALUES (%s, %s, %s, %s)",
+                    (diagnostic_id, question['id'] - 1, next(photos), 'Синтетическое фото')
+                )
+    else:
+        questions = get_priemka_questions()
+        photos_left = scenario['photos']
+        for index, question in enumerate(questions):
+            # Фото распределяются по вопросам поровну, остаток — на первые вопросы
+            count = photos_left // (len(questions) - index) + (1 if photos_left % (len(questions) - index) else 0)
+            photos_left -= count
+            cur.execute(
+                f"INSERT INTO {SCHEMA}.checklist_answers (diagnostic_id, question_number, answer_code, answer_note) "
+                f"VALUES (%s, %s, %s, %s)",
+                (diagnostic_id, question['id'], 'photo' if count else 'complete', None)
+            )
+            for _ in range(count):
+                cur.execute(
+                    f"INSERT INTO {SCHEMA}.diagnostic_photos (diagnostic_id, question_index, photo_url, caption) "
+                    f"VALUES (%s, %s, %s, %s)",
+                    (diagnostic_id, question['id'] - 1, next(photos), None)
+                )
+    conn.commit()
+    cur.close()
+    return diagnostic_id
+
+
+def count_pages(pdf):
+    return len(re.findall(rb'/Type\s*/Page(?![a-zA-Z])', pdf))
+
+
+def run_scenario(scenario, diagnostic_id, s3_root, repeats, assets_url, cache_dir, queue):
+    '''Выполняется в отдельном процессе: прогоны handler, замер времени и памяти'''
+    os.environ['MAIN_DB_SCHEMA'] = SCHEMA
+    os.environ['AWS_ACCESS_KEY_ID'] = AWS_KEY
+    os.environ['AWS_SECRET_ACCESS_KEY'] = AWS_KEY
+    import psycopg2
+    import index
+
+    s3 = LocalS3(s3_root)
+    index.boto3.client = lambda *args, **kwargs: s3
+    if assets_url:
+        index.FIRST_PAGE_BACKGROUND_URL = assets_url + 'first_page.png'
+        index.OTHER_PAGES_BACKGROUND_URL = assets_url + 'background.png'
+        index.FONT_URL = assets_url + 'font.ttf'
+        index.FIRST_PAGE_BACKGROUND_PATH = os.path.join(cache_dir, 'first_page.jpg')
+        index.OTHER_PAGES_BACKGROUND_PATH = os.path.join(cache_dir, 'background.jpg')
+        index.FONT_PATH = os.path.join(cache_dir, 'font.ttf')
+    output_format = scenario.get('format', 'pdf')
+    event = {
+        'httpMethod': 'GET',
+        'queryStringParameters': {
+            'id': str(diagnostic_id),
+            'with_photos': 'true' if scenario['withPhotos'] else 'false',
+            'format': output_format
+        }
+    }
+    fingerprint_column = 'report_with_photos_fingerprint' if scenario['withPhotos'] else 'report_fingerprint'
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+
+    # Прогрев: шрифт, фоны страниц и импорт reportlab не должны попадать в замер
+    index.handler(event, None)
+
+    timings = []
+    tracemalloc.start()
+    for _ in range(repeats):
+        # Сброс отпечатка: каждый прогон — полный рендер, а не ответ из кэша
+        cur.execute(f"UPDATE {SCHEMA}.diagnostics SET {fingerprint_column} = NULL WHERE id = %s", (diagnostic_id,))
+        conn.commit()
+        started = time.perf_counter()
+        response = index.handler(event, None)
+        timings.append(time.perf_counter() - started)
+        if response['statusCode'] != 200:
+            raise RuntimeError(f"{scenario['name']}: {response['statusCode']} {response['body']}")
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        'wallMedian': statistics.median(timings),
+        'wallMin': min(timings),
+        'tracemallocPeak': traced_peak,
+        # ru_maxrss на Linux в килобайтах
+        'maxRss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        'pages': None,
+        'size': len(response['body'].encode('utf-8')),
+    }
+    if output_format == 'pdf':
+        pdf_url = json.loads(response['body'])['pdfUrl']
+        with open(os.path.join(s3_root, pdf_url.split('/bucket/', 1)[1]), 'rb') as pdf:
+            data = pdf.read()
+        result['pages'] = count_pages(data)
+        result['size'] = len(data)
+    cur.close()
+    conn.close()
+    queue.put(result)
+
+
+def format_size(size):
+    for unit in ('Б', 'КБ', 'МБ'):
+        if abs(size) < 1024:
+            return f'{size:.0f} {unit}'
+        size /= 1024
+    return f'{size:.1f} ГБ'
+
+
+def print_report(results, baseline):
+    header = f"{'сценарий':<28}{'время, с':>10}{'Δ':>8}{'tracemalloc':>13}{'RSS':>10}{'Δ':>8}{'стр.':>6}{'размер':>10}{'Δ':>8}"
+    print(header)
+    print('-' * len(header))
+    for name, result in results.items():
+        base = (baseline or {}).get(name)
+
+        def delta(key):
+            if not base or not base.get(key):
+                return ''
+            return f'{(result[key] / base[key] - 1) * 100:+.0f}%'
+
+        print(
+            f"{name:<28}{result['wallMedian']:>10.2f}{delta('wallMedian'):>8}"
+            f"{format_size(result['tracemallocPeak']):>13}{format_size(result['maxRss']):>10}{delta('maxRss'):>8}"
+            f"{result['pages'] if result['pages'] is not None else '—':>6}{format_size(result['size']):>10}{delta('size'):>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замер генерации отчётов generate-report')
+    parser.add_argument('--repeats', type=int, default=3, help='прогонов на сценарий (после прогрева)')
+    parser.add_argument('--only', help='регулярное выражение для имён сценариев')
+    parser.add_argument('--output', help='куда сохранить результаты (JSON)')
+    parser.add_argument('--baseline', help='результаты прошлого прогона для сравнения (JSON)')
+    parser.add_argument('--offline', action='store_true', help='синтетические фоны и локальный шрифт вместо CDN')
+    parser.add_argument('--font', default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', help='шрифт для --offline')
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        sys.exit('Нужен DATABASE_URL локальной БД для замера (схема report_bench пересоздаётся)')
+
+    import psycopg2
+
+    scenarios = [s for s in SCENARIOS if not args.only or re.search(args.only, s['name'])]
+    work_dir = tempfile.mkdtemp(prefix='report_bench_')
+    photo_dir = os.path.join(work_dir, 'photos')
+    os.makedirs(photo_dir)
+    server = None
+    try:
+        print('Подготовка фото и БД...')
+        names = make_photos(photo_dir, 40)
+        if args.offline:
+            make_offline_assets(photo_dir, args.font)
+        server, base_url = serve_directory(photo_dir)
+        photo_urls = [base_url + name for name in names]
+
+        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        cur = conn.cursor()
+        cur.execute(DDL)
+        conn.commit()
+        cur.close()
+        diagnostic_ids = {scenario['name']: seed(conn, photo_urls, scenario) for scenario in scenarios}
+        conn.close()
+
+        results = {}
+        context = multiprocessing.get_context('spawn')
+        for scenario in scenarios:
+            queue = context.Queue()
+            process = context.Process(
+                target=run_scenario,
+                args=(scenario, diagnostic_ids[scenario['name']], os.path.join(work_dir, 's3'), args.repeats,
+                      base_url if args.offline else None, work_dir, queue)
+            )
+            process.start()
+            result = None
+            while result is None:
+                try:
+                    result = queue.get(timeout=1)
+                except Empty:
+                    if not process.is_alive():
+                        sys.exit(f"Сценарий {scenario['name']} завершился с ошибкой (код {process.exitcode})")
+            process.join()
+            results[scenario['name']] = result
+            print(f"  {scenario['name']}: {result['wallMedian']:.2f} с")
+
+        baseline = None
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as source:
+                baseline = json.load(source)['results']
+
+        print()
+        print_report(results, baseline)
+
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as target:
+                json.dump({
+                    'createdAt': datetime.now().isoformat(timespec='seconds'),
+                    'repeats': args.repeats,
+                    'results': results
+                }, target, ensure_ascii=False, indent=2)
+            print(f'\nРезультаты сохранены в {args.output}')
+    finally:
+        if server:
+            server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,10 @@
+-- Размеры объектов в S3 фиксируются при загрузке, чтобы storage-info считал объём агрегатом без HEAD-запросов
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostic_photos ADD COLUMN IF NOT EXISTS file_size BIGINT;
+
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostics
+ADD COLUMN IF NOT EXISTS report_size BIGINT,
+ADD COLUMN IF NOT EXISTS report_with_photos_size BIGINT;
+
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.diagnostic_photos.file_size IS 'Размер файла фото в байтах (NULL для записей до учёта размеров)';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.diagnostics.report_size IS 'Размер PDF отчёта без фото в байтах';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.diagnostics.report_with_photos_size IS 'Размер PDF отчёта с фото в байтах';
@@ -0,0 +1,21 @@
+-- Фоновые задачи обслуживания (очистка хранилища и т.п.), выполняемые порциями между вызовами функции
+CREATE TABLE IF NOT EXISTS t_p70271656_max_bot_diagnosis.maintenance_jobs (
+    id SERIAL PRIMARY KEY,
+    job_type VARCHAR(50) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'running',
+    dry_run BOOLEAN NOT NULL DEFAULT true,
+    checkpoint JSONB NOT NULL DEFAULT '{}'::jsonb,
+    progress JSONB NOT NULL DEFAULT '{}'::jsonb,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_maintenance_jobs_type_status ON t_p70271656_max_bot_diagnosis.maintenance_jobs(job_type, status, id);
+
+COMMENT ON TABLE t_p70271656_max_bot_diagnosis.maintenance_jobs IS 'Задачи обслуживания с контрольными точками для продолжения в следующем вызове';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.maintenance_jobs.job_type IS 'Тип задачи: storage_cleanup';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.maintenance_jobs.status IS 'Статус: running, done, failed';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.maintenance_jobs.checkpoint IS 'Точка продолжения (префикс и continuation token листинга S3)';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.maintenance_jobs.progress IS 'Счётчики прогресса задачи';
@@ -0,0 +1,6 @@
+-- Пин-коды механиков хранятся в виде солёного хеша (PBKDF2-SHA256).
+-- Открытые pin_code заменяются хешем при первом успешном входе механика.
+ALTER TABLE t_p70271656_max_bot_diagnosis.mechanics ADD COLUMN IF NOT EXISTS pin_hash VARCHAR(128);
+
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.mechanics.pin_hash IS 'Хеш пин-кода в формате pbkdf2_sha256$итерации$соль$хеш';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.mechanics.pin_code IS 'Устаревший открытый пин-код, очищается после перехода на pin_hash';
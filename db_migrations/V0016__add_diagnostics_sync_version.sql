@@ -0,0 +1,58 @@
+-- Версия изменения диагностики для инкрементальной синхронизации кэша админ-панели.
+-- Берётся из последовательности, а не из updated_at: время пишется из разных источников
+-- (CURRENT_TIMESTAMP и локальное время бота), и курсор по нему может пропускать изменения.
+CREATE SEQUENCE IF NOT EXISTS t_p70271656_max_bot_diagnosis.diagnostics_sync_seq;
+
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostics ADD COLUMN IF NOT EXISTS sync_version BIGINT;
+
+UPDATE t_p70271656_max_bot_diagnosis.diagnostics d
+SET sync_version = v.version
+FROM (
+    SELECT id, nextval('t_p70271656_max_bot_diagnosis.diagnostics_sync_seq') AS version
+    FROM (SELECT id FROM t_p70271656_max_bot_diagnosis.diagnostics ORDER BY id) ordered
+) v
+WHERE d.id = v.id AND d.sync_version IS NULL;
+
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostics
+    ALTER COLUMN sync_version SET DEFAULT nextval('t_p70271656_max_bot_diagnosis.diagnostics_sync_seq');
+
+CREATE INDEX IF NOT EXISTS idx_diagnostics_sync_version ON t_p70271656_max_bot_diagnosis.diagnostics(sync_version);
+
+-- Удалённые диагностики: клиент убирает их из кэша
+CREATE TABLE IF NOT EXISTS t_p70271656_max_bot_diagnosis.diagnostics_tombstones (
+    diagnostic_id INTEGER PRIMARY KEY,
+    sync_version BIGINT NOT NULL,
+    deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_diagnostics_tombstones_sync_version ON t_p70271656_max_bot_diagnosis.diagnostics_tombstones(sync_version);
+
+-- Любое изменение строки получает новую версию, удаление оставляет надгробие
+CREATE OR REPLACE FUNCTION t_p70271656_max_bot_diagnosis.diagnostics_bump_sync_version() RETURNS trigger AS $$
+BEGIN
+    NEW.sync_version := nextval('t_p70271656_max_bot_diagnosis.diagnostics_sync_seq');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p70271656_max_bot_diagnosis.diagnostics_record_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO t_p70271656_max_bot_diagnosis.diagnostics_tombstones (diagnostic_id, sync_version)
+    VALUES (OLD.id, nextval('t_p70271656_max_bot_diagnosis.diagnostics_sync_seq'))
+    ON CONFLICT (diagnostic_id) DO UPDATE SET sync_version = EXCLUDED.sync_version, deleted_at = CURRENT_TIMESTAMP;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_diagnostics_sync_version ON t_p70271656_max_bot_diagnosis.diagnostics;
+CREATE TRIGGER trg_diagnostics_sync_version
+    BEFORE UPDATE ON t_p70271656_max_bot_diagnosis.diagnostics
+    FOR EACH ROW EXECUTE FUNCTION t_p70271656_max_bot_diagnosis.diagnostics_bump_sync_version();
+
+DROP TRIGGER IF EXISTS trg_diagnostics_tombstone ON t_p70271656_max_bot_diagnosis.diagnostics;
+CREATE TRIGGER trg_diagnostics_tombstone
+    AFTER DELETE ON t_p70271656_max_bot_diagnosis.diagnostics
+    FOR EACH ROW EXECUTE FUNCTION t_p70271656_max_bot_diagnosis.diagnostics_record_tombstone();
+
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.diagnostics.sync_version IS 'Монотонная версия последнего изменения строки (курсор синхронизации)';
+COMMENT ON TABLE t_p70271656_max_bot_diagnosis.diagnostics_tombstones IS 'Надгробия удалённых диагностик для инкрементальной синхронизации';
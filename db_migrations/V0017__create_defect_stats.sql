@@ -0,0 +1,60 @@
+-- Агрегат дефектов по неделям, механикам, пунктам чек-листа и кодам подответов.
+-- Пополняется при завершении диагностики, уменьшается при её удалении.
+CREATE TABLE IF NOT EXISTS t_p70271656_max_bot_diagnosis.defect_stats (
+    week_start DATE NOT NULL,
+    mechanic_id INTEGER NOT NULL DEFAULT 0,
+    question_number INTEGER NOT NULL,
+    defect_code VARCHAR(200) NOT NULL DEFAULT '',
+    defect_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (week_start, mechanic_id, question_number, defect_code)
+);
+
+CREATE INDEX IF NOT EXISTS idx_defect_stats_mechanic ON t_p70271656_max_bot_diagnosis.defect_stats(mechanic_id, week_start);
+
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostics ADD COLUMN IF NOT EXISTS stats_counted BOOLEAN NOT NULL DEFAULT false;
+
+-- Дефекты одной диагностики в разрезе агрегата: ответ «Неисправно», код — выбранный подпункт
+-- (с уточнением вложенного подпункта через «/»), без подпунктов — пустой код
+CREATE OR REPLACE FUNCTION t_p70271656_max_bot_diagnosis.diagnostic_defects(p_diagnostic_id INTEGER)
+RETURNS TABLE (week_start DATE, mechanic_id INTEGER, question_number INTEGER, defect_code VARCHAR, defect_count INTEGER) AS $$
+    SELECT
+        date_trunc('week', d.created_at)::date,
+        COALESCE(d.mechanic_id, 0),
+        a.question_number,
+        LEFT(m.item || COALESCE('/' || (a.sub_answers ->> ('main-' || m.item)), ''), 200)::varchar,
+        COUNT(*)::integer
+    FROM t_p70271656_max_bot_diagnosis.diagnostics d
+    JOIN t_p70271656_max_bot_diagnosis.checklist_answers a ON a.diagnostic_id = d.id
+    CROSS JOIN LATERAL (
+        SELECT jsonb_array_elements_text(a.sub_answers -> 'main') AS item
+        WHERE jsonb_typeof(a.sub_answers -> 'main') = 'array'
+        UNION ALL
+        SELECT a.sub_answers ->> 'main'
+        WHERE jsonb_typeof(a.sub_answers -> 'main') = 'string'
+        UNION ALL
+        SELECT ''
+        WHERE COALESCE(jsonb_typeof(a.sub_answers -> 'main'), 'null') NOT IN ('array', 'string')
+    ) m
+    WHERE d.id = p_diagnostic_id AND a.answer_value = 'Неисправно'
+    GROUP BY 1, 2, 3, 4
+$$ LANGUAGE sql STABLE;
+
+-- Заполнение агрегата по уже завершённым диагностикам
+INSERT INTO t_p70271656_max_bot_diagnosis.defect_stats (week_start, mechanic_id, question_number, defect_code, defect_count)
+SELECT s.week_start, s.mechanic_id, s.question_number, s.defect_code, SUM(s.defect_count)
+FROM t_p70271656_max_bot_diagnosis.diagnostics d
+CROSS JOIN LATERAL t_p70271656_max_bot_diagnosis.diagnostic_defects(d.id) s
+WHERE d.completed = true AND d.stats_counted = false
+GROUP BY 1, 2, 3, 4
+ON CONFLICT (week_start, mechanic_id, question_number, defect_code)
+DO UPDATE SET defect_count = t_p70271656_max_bot_diagnosis.defect_stats.defect_count + EXCLUDED.defect_count;
+
+-- Служебная отметка не должна выглядеть для кэша админ-панели как изменение диагностик
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostics DISABLE TRIGGER trg_diagnostics_sync_version;
+UPDATE t_p70271656_max_bot_diagnosis.diagnostics SET stats_counted = true WHERE completed = true AND stats_counted = false;
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostics ENABLE TRIGGER trg_diagnostics_sync_version;
+
+COMMENT ON TABLE t_p70271656_max_bot_diagnosis.defect_stats IS 'Число дефектов по неделям, механикам, пунктам чек-листа и кодам подответов';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.defect_stats.mechanic_id IS 'ID механика (0 — диагностика без привязки к механику)';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.defect_stats.defect_code IS 'Код подпункта неисправности, вложенный подпункт через «/»';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.diagnostics.stats_counted IS 'Дефекты диагностики учтены в defect_stats';
@@ -0,0 +1,18 @@
+-- Нормализованный госномер для поиска истории автомобиля: верхний регистр, без пробелов и дефисов,
+-- кириллические буквы, совпадающие по написанию с латинскими, заменены на латинские
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE OR REPLACE FUNCTION t_p70271656_max_bot_diagnosis.normalize_car_number(value TEXT) RETURNS TEXT AS $$
+    SELECT regexp_replace(translate(upper(value), 'АВЕКМНОРСТУХ', 'ABEKMHOPCTYX'), '[[:space:]-]', '', 'g')
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostics
+    ADD COLUMN IF NOT EXISTS car_number_norm VARCHAR(20)
+    GENERATED ALWAYS AS (t_p70271656_max_bot_diagnosis.normalize_car_number(car_number)) STORED;
+
+-- Точный поиск с сортировкой по дате — история одного автомобиля
+CREATE INDEX IF NOT EXISTS idx_diagnostics_car_number_norm ON t_p70271656_max_bot_diagnosis.diagnostics(car_number_norm, created_at DESC);
+-- Нечёткий поиск по части номера (LIKE '%...%' и similarity)
+CREATE INDEX IF NOT EXISTS idx_diagnostics_car_number_norm_trgm ON t_p70271656_max_bot_diagnosis.diagnostics USING gin (car_number_norm gin_trgm_ops);
+
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.diagnostics.car_number_norm IS 'Нормализованный госномер (латиница, без пробелов и дефисов)';
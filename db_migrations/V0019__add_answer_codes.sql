@@ -0,0 +1,73 @@
+-- Компактное хранение ответов: код ответа и свободный текст вместо текста вопроса и подписи ответа.
+-- Подписи подставляются при чтении из справочников чек-листов (answer_catalog.py).
+ALTER TABLE t_p70271656_max_bot_diagnosis.checklist_answers ADD COLUMN IF NOT EXISTS answer_code VARCHAR(32);
+ALTER TABLE t_p70271656_max_bot_diagnosis.checklist_answers ADD COLUMN IF NOT EXISTS answer_note TEXT;
+ALTER TABLE t_p70271656_max_bot_diagnosis.checklist_answers ALTER COLUMN question_text DROP NOT NULL;
+
+-- 5-ти минутка: подписи основных ответов и «Иное: <текст>»
+UPDATE t_p70271656_max_bot_diagnosis.checklist_answers a
+SET answer_code = CASE
+        WHEN a.answer_value = 'Исправно' THEN 'ok'
+        WHEN a.answer_value = 'Неисправно' THEN 'bad'
+        WHEN a.answer_value = 'Не предусмотрено' THEN 'na'
+        WHEN a.answer_value = 'Нет течей' THEN 'no_leaks'
+        WHEN a.answer_value = 'Есть течи' THEN 'has_leaks'
+        WHEN a.answer_value = 'Завершить, замечаний нет' THEN 'complete'
+        WHEN a.answer_value = 'Добавить замечания' THEN 'add_notes'
+        WHEN a.answer_value = 'Требуется дополнительный разбор' THEN 'need_disassembly'
+        WHEN a.answer_value LIKE 'Иное: %' THEN 'other'
+    END,
+    answer_note = CASE WHEN a.answer_value LIKE 'Иное: %' THEN substring(a.answer_value FROM 7) END
+FROM t_p70271656_max_bot_diagnosis.diagnostics d
+WHERE d.id = a.diagnostic_id AND d.diagnostic_type = '5min' AND a.answer_code IS NULL;
+
+-- Приемка: фото с комментарием, замечания текстом и служебные ответы
+UPDATE t_p70271656_max_bot_diagnosis.checklist_answers a
+SET answer_code = CASE
+        WHEN a.answer_value LIKE 'Фото прикреплено%' THEN 'photo'
+        WHEN a.answer_value LIKE 'Замечания: %' THEN 'add_notes'
+        WHEN a.answer_value = 'Замечаний нет' THEN 'complete'
+        WHEN a.answer_value = 'Не предусмотрено' THEN 'not_applicable'
+    END,
+    answer_note = CASE
+        WHEN a.answer_value LIKE 'Фото прикреплено. Комментарий: %' THEN substring(a.answer_value FROM 32)
+        WHEN a.answer_value LIKE 'Замечания: %' THEN substring(a.answer_value FROM 12)
+    END
+FROM t_p70271656_max_bot_diagnosis.diagnostics d
+WHERE d.id = a.diagnostic_id AND d.diagnostic_type = 'priemka' AND a.answer_code IS NULL;
+
+-- Подписи и тексты вопросов справочных типов больше не храним; строки без кода остаются как есть
+UPDATE t_p70271656_max_bot_diagnosis.checklist_answers a
+SET answer_value = NULL, question_text = NULL
+FROM t_p70271656_max_bot_diagnosis.diagnostics d
+WHERE d.id = a.diagnostic_id AND d.diagnostic_type IN ('5min', 'priemka') AND a.answer_code IS NOT NULL;
+
+-- Агрегат дефектов теперь опирается на код ответа
+CREATE OR REPLACE FUNCTION t_p70271656_max_bot_diagnosis.diagnostic_defects(p_diagnostic_id INTEGER)
+RETURNS TABLE (week_start DATE, mechanic_id INTEGER, question_number INTEGER, defect_code VARCHAR, defect_count INTEGER) AS $$
+    SELECT
+        date_trunc('week', d.created_at)::date,
+        COALESCE(d.mechanic_id, 0),
+        a.question_number,
+        LEFT(m.item || COALESCE('/' || (a.sub_answers ->> ('main-' || m.item)), ''), 200)::varchar,
+        COUNT(*)::integer
+    FROM t_p70271656_max_bot_diagnosis.diagnostics d
+    JOIN t_p70271656_max_bot_diagnosis.checklist_answers a ON a.diagnostic_id = d.id
+    CROSS JOIN LATERAL (
+        SELECT jsonb_array_elements_text(a.sub_answers -> 'main') AS item
+        WHERE jsonb_typeof(a.sub_answers -> 'main') = 'array'
+        UNION ALL
+        SELECT a.sub_answers ->> 'main'
+        WHERE jsonb_typeof(a.sub_answers -> 'main') = 'string'
+        UNION ALL
+        SELECT ''
+        WHERE COALESCE(jsonb_typeof(a.sub_answers -> 'main'), 'null') NOT IN ('array', 'string')
+    ) m
+    WHERE d.id = p_diagnostic_id AND (a.answer_code = 'bad' OR (a.answer_code IS NULL AND a.answer_value = 'Неисправно'))
+    GROUP BY 1, 2, 3, 4
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.checklist_answers.answer_code IS 'Код ответа из справочника (ok, bad, na, other, photo, ...)';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.checklist_answers.answer_note IS 'Свободный текст ответа (Иное, замечания, комментарий к фото)';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.checklist_answers.question_text IS 'Текст вопроса; NULL — берётся из справочника по question_number';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.checklist_answers.answer_value IS 'Подпись ответа для строк без кода; NULL — подпись по answer_code';
@@ -0,0 +1,34 @@
+-- Денормализованные счётчики диагностики: поддерживаются при записи фото и ответов,
+-- чтобы списки и решение о формировании отчёта с фото не требовали агрегирующих запросов
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostics ADD COLUMN IF NOT EXISTS photo_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostics ADD COLUMN IF NOT EXISTS defect_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostics ADD COLUMN IF NOT EXISTS answer_count INTEGER NOT NULL DEFAULT 0;
+
+-- Начальные значения по существующим записям; служебное заполнение не меняет версию синхронизации
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostics DISABLE TRIGGER trg_diagnostics_sync_version;
+
+UPDATE t_p70271656_max_bot_diagnosis.diagnostics d
+SET photo_count = p.cnt
+FROM (
+    SELECT diagnostic_id, COUNT(*) AS cnt
+    FROM t_p70271656_max_bot_diagnosis.diagnostic_photos
+    GROUP BY diagnostic_id
+) p
+WHERE d.id = p.diagnostic_id;
+
+UPDATE t_p70271656_max_bot_diagnosis.diagnostics d
+SET answer_count = a.answers, defect_count = a.defects
+FROM (
+    SELECT diagnostic_id,
+           COUNT(*) AS answers,
+           COUNT(*) FILTER (WHERE answer_code = 'bad' OR (answer_code IS NULL AND answer_value = 'Неисправно')) AS defects
+    FROM t_p70271656_max_bot_diagnosis.checklist_answers
+    GROUP BY diagnostic_id
+) a
+WHERE d.id = a.diagnostic_id;
+
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostics ENABLE TRIGGER trg_diagnostics_sync_version;
+
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.diagnostics.photo_count IS 'Количество фото диагностики';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.diagnostics.defect_count IS 'Количество ответов «Неисправно»';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.diagnostics.answer_count IS 'Количество ответов чек-листа';
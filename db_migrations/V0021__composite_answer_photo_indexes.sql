@@ -0,0 +1,60 @@
+-- Составные индексы под запросы бота: ответы ищутся по (diagnostic_id, question_number),
+-- фото — по (diagnostic_id, question_index). Уникальность ответа на вопрос позволяет сохранять ответы через upsert.
+
+-- Повторные ответы на один вопрос (несколько фото в Приемке, повторные нажатия) сводим в одну строку:
+-- остаётся последний ответ, фото и комментарии всех строк объединяются
+WITH duplicates AS (
+    SELECT diagnostic_id, question_number, MAX(id) AS keep_id
+    FROM t_p70271656_max_bot_diagnosis.checklist_answers
+    GROUP BY diagnostic_id, question_number
+    HAVING COUNT(*) > 1
+),
+merged AS (
+    SELECT d.keep_id,
+           (SELECT array_agg(u.url ORDER BY a2.id, u.ord)
+            FROM t_p70271656_max_bot_diagnosis.checklist_answers a2
+            CROSS JOIN LATERAL unnest(a2.photo_urls) WITH ORDINALITY AS u(url, ord)
+            WHERE a2.diagnostic_id = d.diagnostic_id AND a2.question_number = d.question_number) AS photo_urls,
+           (SELECT string_agg(a3.answer_note, '; ' ORDER BY a3.id)
+            FROM t_p70271656_max_bot_diagnosis.checklist_answers a3
+            WHERE a3.diagnostic_id = d.diagnostic_id AND a3.question_number = d.question_number) AS answer_note
+    FROM duplicates d
+)
+UPDATE t_p70271656_max_bot_diagnosis.checklist_answers a
+SET photo_urls = m.photo_urls, answer_note = m.answer_note
+FROM merged m
+WHERE a.id = m.keep_id;
+
+DELETE FROM t_p70271656_max_bot_diagnosis.checklist_answers a
+USING t_p70271656_max_bot_diagnosis.checklist_answers newer
+WHERE newer.diagnostic_id = a.diagnostic_id
+  AND newer.question_number = a.question_number
+  AND newer.id > a.id;
+
+-- Счётчики ответов и дефектов затронутых диагностик (без изменения версии синхронизации)
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostics DISABLE TRIGGER trg_diagnostics_sync_version;
+
+UPDATE t_p70271656_max_bot_diagnosis.diagnostics d
+SET answer_count = a.answers, defect_count = a.defects
+FROM (
+    SELECT diagnostic_id,
+           COUNT(*) AS answers,
+           COUNT(*) FILTER (WHERE answer_code = 'bad' OR (answer_code IS NULL AND answer_value = 'Неисправно')) AS defects
+    FROM t_p70271656_max_bot_diagnosis.checklist_answers
+    GROUP BY diagnostic_id
+) a
+WHERE d.id = a.diagnostic_id AND (d.answer_count <> a.answers OR d.defect_count <> a.defects);
+
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostics ENABLE TRIGGER trg_diagnostics_sync_version;
+
+ALTER TABLE t_p70271656_max_bot_diagnosis.checklist_answers
+    ADD CONSTRAINT uq_checklist_answers_question UNIQUE (diagnostic_id, question_number);
+
+CREATE INDEX IF NOT EXISTS idx_diagnostic_photos_question ON t_p70271656_max_bot_diagnosis.diagnostic_photos(diagnostic_id, question_index);
+
+-- Покрыты составными индексами по ведущему столбцу diagnostic_id
+DROP INDEX IF EXISTS t_p70271656_max_bot_diagnosis.idx_checklist_diagnostic_id;
+DROP INDEX IF EXISTS t_p70271656_max_bot_diagnosis.idx_diagnostic_photos_diagnostic_id;
+-- Поиск по номеру вопроса / индексу фото без диагностики не выполняется
+DROP INDEX IF EXISTS t_p70271656_max_bot_diagnosis.idx_checklist_question_number;
+DROP INDEX IF EXISTS t_p70271656_max_bot_diagnosis.idx_diagnostic_photos_question_index;
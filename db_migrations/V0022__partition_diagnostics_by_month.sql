@@ -0,0 +1,200 @@
+-- Месячное секционирование диагностик, ответов и фото.
+-- diagnostics секционируется по created_at, ответы и фото — по diagnostic_created_at (дате создания
+-- родительской диагностики), поэтому месяц целиком лежит в трёх одноимённых секциях
+-- (diagnostics_2025_03, checklist_answers_2025_03, diagnostic_photos_2025_03) и отсоединяется вместе.
+-- Уникальные ключи включают ключ секционирования; id по-прежнему выдаются общими последовательностями.
+-- Внешний ключ ответов на диагностику снят: он мешает переносу строк между секциями, ответы и фото
+-- удаляются вместе с диагностикой явно.
+
+-- Несгенерированные столбцы таблицы — список для переноса строк
+CREATE OR REPLACE FUNCTION t_p70271656_max_bot_diagnosis.table_copy_columns(p_table REGCLASS) RETURNS TEXT AS $$
+    SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum)
+    FROM pg_attribute
+    WHERE attrelid = p_table AND attnum > 0 AND NOT attisdropped AND attgenerated = ''
+$$ LANGUAGE sql STABLE;
+
+-- Создание недостающих месячных секций таблицы за период [p_from, p_to].
+-- Секция создаётся отдельной таблицей, строки её месяца переносятся из секции по умолчанию,
+-- после чего она присоединяется — так новый месяц можно добавить и после того, как в него уже писали.
+CREATE OR REPLACE FUNCTION t_p70271656_max_bot_diagnosis.ensure_monthly_partitions(p_table TEXT, p_from DATE, p_to DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    v_schema CONSTANT TEXT := 't_p70271656_max_bot_diagnosis';
+    v_parent REGCLASS := format('%I.%I', v_schema, p_table)::regclass;
+    v_key TEXT;
+    v_columns TEXT;
+    v_month DATE := date_trunc('month', p_from)::date;
+    v_next DATE;
+    v_partition TEXT;
+    v_created INTEGER := 0;
+BEGIN
+    SELECT a.attname INTO v_key
+    FROM pg_partitioned_table p
+    JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+    WHERE p.partrelid = v_parent;
+    v_columns := t_p70271656_max_bot_diagnosis.table_copy_columns(v_parent);
+
+    WHILE v_month <= p_to LOOP
+        v_next := (v_month + interval '1 month')::date;
+        v_partition := p_table || '_' || to_char(v_month, 'YYYY_MM');
+        IF to_regclass(format('%I.%I', v_schema, v_partition)) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I.%I (LIKE %I.%I INCLUDING DEFAULTS INCLUDING GENERATED)',
+                v_schema, v_partition, v_schema, p_table);
+            IF to_regclass(format('%I.%I', v_schema, p_table || '_default')) IS NOT NULL THEN
+                EXECUTE format(
+                    'WITH moved AS (DELETE FROM %I.%I WHERE %I >= %L AND %I < %L RETURNING %s) '
+                    'INSERT INTO %I.%I (%s) SELECT %s FROM moved',
+                    v_schema, p_table || '_default', v_key, v_month, v_key, v_next, v_columns,
+                    v_schema, v_partition, v_columns, v_columns
+                );
+            END IF;
+            EXECUTE format('ALTER TABLE %I.%I ATTACH PARTITION %I.%I FOR VALUES FROM (%L) TO (%L)',
+                v_schema, p_table, v_schema, v_partition, v_month, v_next);
+            v_created := v_created + 1;
+        END IF;
+        v_month := v_next;
+    END LOOP;
+    RETURN v_created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Секции всех трёх таблиц с текущего месяца на p_months_ahead месяцев вперёд (вызывается ботом раз в месяц)
+CREATE OR REPLACE FUNCTION t_p70271656_max_bot_diagnosis.ensure_diagnostics_partitions(p_months_ahead INTEGER DEFAULT 2)
+RETURNS INTEGER AS $$
+DECLARE
+    v_table TEXT;
+    v_created INTEGER := 0;
+BEGIN
+    FOREACH v_table IN ARRAY ARRAY['diagnostics', 'checklist_answers', 'diagnostic_photos'] LOOP
+        v_created := v_created + t_p70271656_max_bot_diagnosis.ensure_monthly_partitions(
+            v_table, CURRENT_DATE, (CURRENT_DATE + make_interval(months => p_months_ahead))::date
+        );
+    END LOOP;
+    RETURN v_created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Отсоединение секций месяца от всех трёх таблиц: отсоединённые таблицы остаются в схеме
+-- под теми же именами, их можно выгрузить в архив и удалить без нагрузки на рабочие таблицы.
+-- Для отсоединения без блокировки чтения вручную: ALTER TABLE ... DETACH PARTITION ... CONCURRENTLY.
+CREATE OR REPLACE FUNCTION t_p70271656_max_bot_diagnosis.detach_diagnostics_month(p_month DATE)
+RETURNS TEXT[] AS $$
+DECLARE
+    v_schema CONSTANT TEXT := 't_p70271656_max_bot_diagnosis';
+    v_table TEXT;
+    v_partition TEXT;
+    v_detached TEXT[] := '{}';
+BEGIN
+    FOREACH v_table IN ARRAY ARRAY['checklist_answers', 'diagnostic_photos', 'diagnostics'] LOOP
+        v_partition := v_table || '_' || to_char(p_month, 'YYYY_MM');
+        IF EXISTS (
+            SELECT 1 FROM pg_inherits
+            WHERE inhrelid = to_regclass(format('%I.%I', v_schema, v_partition))
+              AND inhparent = format('%I.%I', v_schema, v_table)::regclass
+        ) THEN
+            EXECUTE format('ALTER TABLE %I.%I DETACH PARTITION %I.%I', v_schema, v_table, v_schema, v_partition);
+            v_detached := v_detached || v_partition;
+        END IF;
+    END LOOP;
+    RETURN v_detached;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Ключи секционирования: дата диагностики обязательна, ответы и фото получают дату родительской диагностики
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostics DISABLE TRIGGER trg_diagnostics_sync_version;
+UPDATE t_p70271656_max_bot_diagnosis.diagnostics
+SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP)
+WHERE created_at IS NULL;
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostics ENABLE TRIGGER trg_diagnostics_sync_version;
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostics ALTER COLUMN created_at SET NOT NULL;
+
+ALTER TABLE t_p70271656_max_bot_diagnosis.checklist_answers ADD COLUMN IF NOT EXISTS diagnostic_created_at TIMESTAMP;
+UPDATE t_p70271656_max_bot_diagnosis.checklist_answers a
+SET diagnostic_created_at = d.created_at
+FROM t_p70271656_max_bot_diagnosis.diagnostics d
+WHERE d.id = a.diagnostic_id;
+UPDATE t_p70271656_max_bot_diagnosis.checklist_answers
+SET diagnostic_created_at = COALESCE(created_at, CURRENT_TIMESTAMP)
+WHERE diagnostic_created_at IS NULL;
+ALTER TABLE t_p70271656_max_bot_diagnosis.checklist_answers ALTER COLUMN diagnostic_created_at SET NOT NULL;
+
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostic_photos ADD COLUMN IF NOT EXISTS diagnostic_created_at TIMESTAMP;
+UPDATE t_p70271656_max_bot_diagnosis.diagnostic_photos p
+SET diagnostic_created_at = d.created_at
+FROM t_p70271656_max_bot_diagnosis.diagnostics d
+WHERE d.id = p.diagnostic_id;
+-- Фото без диагностики (осиротевшие записи) — по дате загрузки
+UPDATE t_p70271656_max_bot_diagnosis.diagnostic_photos
+SET diagnostic_created_at = COALESCE(created_at::timestamp, CURRENT_TIMESTAMP)
+WHERE diagnostic_created_at IS NULL;
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostic_photos ALTER COLUMN diagnostic_created_at SET NOT NULL;
+
+ALTER TABLE t_p70271656_max_bot_diagnosis.checklist_answers DROP CONSTRAINT IF EXISTS fk_diagnostic;
+
+-- Перенос данных: исходная таблица переименовывается, на её месте создаётся секционированная
+-- с теми же столбцами, секции создаются с месяца самой ранней записи, строки копируются.
+-- Последовательности id отвязываются от старых таблиц, чтобы не удалиться вместе с ними.
+DO $$
+DECLARE
+    v_schema CONSTANT TEXT := 't_p70271656_max_bot_diagnosis';
+    v_table TEXT;
+    v_key TEXT;
+    v_old TEXT;
+    v_seq TEXT;
+    v_from DATE;
+    v_columns TEXT;
+BEGIN
+    FOREACH v_table IN ARRAY ARRAY['diagnostics', 'checklist_answers', 'diagnostic_photos'] LOOP
+        v_key := CASE WHEN v_table = 'diagnostics' THEN 'created_at' ELSE 'diagnostic_created_at' END;
+        v_old := v_table || '_unpartitioned';
+        v_seq := pg_get_serial_sequence(format('%I.%I', v_schema, v_table), 'id');
+
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY NONE', v_seq);
+        EXECUTE format('ALTER TABLE %I.%I RENAME TO %I', v_schema, v_table, v_old);
+        EXECUTE format(
+            'CREATE TABLE %I.%I (LIKE %I.%I INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING COMMENTS) PARTITION BY RANGE (%I)',
+            v_schema, v_table, v_schema, v_old, v_key
+        );
+        EXECUTE format('CREATE TABLE %I.%I PARTITION OF %I.%I DEFAULT', v_schema, v_table || '_default', v_schema, v_table);
+
+        EXECUTE format('SELECT date_trunc(''month'', MIN(%I))::date FROM %I.%I', v_key, v_schema, v_old) INTO v_from;
+        PERFORM t_p70271656_max_bot_diagnosis.ensure_monthly_partitions(
+            v_table, COALESCE(v_from, CURRENT_DATE), (CURRENT_DATE + interval '2 months')::date
+        );
+
+        v_columns := t_p70271656_max_bot_diagnosis.table_copy_columns(format('%I.%I', v_schema, v_old)::regclass);
+        EXECUTE format('INSERT INTO %I.%I (%s) SELECT %s FROM %I.%I', v_schema, v_table, v_columns, v_columns, v_schema, v_old);
+        EXECUTE format('DROP TABLE %I.%I', v_schema, v_old);
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY %I.%I.id', v_seq, v_schema, v_table);
+    END LOOP;
+END $$;
+
+-- Ключи и индексы создаются на секционированных таблицах после копирования и наследуются секциями
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostics ADD PRIMARY KEY (id, created_at);
+CREATE INDEX idx_car_number ON t_p70271656_max_bot_diagnosis.diagnostics(car_number);
+CREATE INDEX idx_mechanic ON t_p70271656_max_bot_diagnosis.diagnostics(mechanic);
+CREATE INDEX idx_created_at ON t_p70271656_max_bot_diagnosis.diagnostics(created_at);
+CREATE INDEX idx_diagnostics_sync_version ON t_p70271656_max_bot_diagnosis.diagnostics(sync_version);
+CREATE INDEX idx_diagnostics_car_number_norm ON t_p70271656_max_bot_diagnosis.diagnostics(car_number_norm, created_at DESC);
+CREATE INDEX idx_diagnostics_car_number_norm_trgm ON t_p70271656_max_bot_diagnosis.diagnostics USING gin (car_number_norm gin_trgm_ops);
+
+ALTER TABLE t_p70271656_max_bot_diagnosis.checklist_answers ADD PRIMARY KEY (id, diagnostic_created_at);
+ALTER TABLE t_p70271656_max_bot_diagnosis.checklist_answers
+    ADD CONSTRAINT uq_checklist_answers_question UNIQUE (diagnostic_id, question_number, diagnostic_created_at);
+
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostic_photos ADD PRIMARY KEY (id, diagnostic_created_at);
+CREATE INDEX idx_diagnostic_photos_question ON t_p70271656_max_bot_diagnosis.diagnostic_photos(diagnostic_id, question_index);
+
+CREATE TRIGGER trg_diagnostics_sync_version
+    BEFORE UPDATE ON t_p70271656_max_bot_diagnosis.diagnostics
+    FOR EACH ROW EXECUTE FUNCTION t_p70271656_max_bot_diagnosis.diagnostics_bump_sync_version();
+
+CREATE TRIGGER trg_diagnostics_tombstone
+    AFTER DELETE ON t_p70271656_max_bot_diagnosis.diagnostics
+    FOR EACH ROW EXECUTE FUNCTION t_p70271656_max_bot_diagnosis.diagnostics_record_tombstone();
+
+COMMENT ON TABLE t_p70271656_max_bot_diagnosis.diagnostics IS 'Таблица для хранения данных диагностик автомобилей (секции по месяцам created_at)';
+COMMENT ON TABLE t_p70271656_max_bot_diagnosis.checklist_answers IS 'Ответы на пункты чек-листов (секции по месяцам даты диагностики)';
+COMMENT ON TABLE t_p70271656_max_bot_diagnosis.diagnostic_photos IS 'Фото диагностик (секции по месяцам даты диагностики)';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.checklist_answers.diagnostic_created_at IS 'Дата создания диагностики — ключ секционирования';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.diagnostic_photos.diagnostic_created_at IS 'Дата создания диагностики — ключ секционирования';
@@ -0,0 +1,25 @@
+-- Холодный архив старых диагностик. Данные (диагностика, ответы, ссылки на фото) лежат в S3
+-- в файлах archive/diagnostics/ГГГГ-ММ/*.jsonl.gz, каждая диагностика — отдельный gzip-член файла,
+-- поэтому одну запись можно прочитать Range-запросом по смещению без распаковки всего файла.
+CREATE TABLE IF NOT EXISTS t_p70271656_max_bot_diagnosis.archived_diagnostics (
+    diagnostic_id INTEGER PRIMARY KEY,
+    created_at TIMESTAMP NOT NULL,
+    mechanic VARCHAR(100),
+    car_number VARCHAR(20),
+    car_number_norm VARCHAR(20),
+    diagnostic_type VARCHAR(20),
+    archive_key TEXT NOT NULL,
+    byte_offset BIGINT NOT NULL,
+    byte_length INTEGER NOT NULL,
+    object_urls TEXT[],
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_archived_diagnostics_car_number_norm ON t_p70271656_max_bot_diagnosis.archived_diagnostics(car_number_norm, created_at DESC);
+
+COMMENT ON TABLE t_p70271656_max_bot_diagnosis.archived_diagnostics IS 'Диагностики, перенесённые в архив S3: где лежит запись и на какие объекты она ссылается';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.archived_diagnostics.archive_key IS 'Ключ файла архива в S3';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.archived_diagnostics.byte_offset IS 'Смещение gzip-члена записи в файле архива';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.archived_diagnostics.byte_length IS 'Длина gzip-члена записи в байтах';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.archived_diagnostics.object_urls IS 'URL фото и отчётов архивной диагностики — очистка хранилища их не удаляет';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.maintenance_jobs.job_type IS 'Тип задачи: storage_cleanup, archive';
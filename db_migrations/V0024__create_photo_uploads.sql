@@ -0,0 +1,22 @@
+-- Прямые загрузки фото в S3 по подписанным ссылкам: функция выдаёт ссылку и регистрирует ключ,
+-- браузер загружает файл в хранилище сам, после чего вызов finalize фиксирует размер и хэш.
+CREATE TABLE IF NOT EXISTS t_p70271656_max_bot_diagnosis.photo_uploads (
+    object_key TEXT PRIMARY KEY,
+    diagnostic_id INTEGER,
+    question_number INTEGER,
+    content_type VARCHAR(50) NOT NULL,
+    file_size BIGINT,
+    etag VARCHAR(100),
+    sha256 CHAR(64),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finalized_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_photo_uploads_created_at ON t_p70271656_max_bot_diagnosis.photo_uploads(created_at);
+
+COMMENT ON TABLE t_p70271656_max_bot_diagnosis.photo_uploads IS 'Загрузки фото по подписанным ссылкам (выданные и подтверждённые)';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.photo_uploads.diagnostic_id IS 'Диагностика, к которой привязывается фото (NULL — фото мастера чек-листа до сохранения диагностики)';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.photo_uploads.file_size IS 'Размер загруженного объекта по данным S3';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.photo_uploads.etag IS 'ETag объекта в S3';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.photo_uploads.sha256 IS 'SHA-256 содержимого, посчитанный клиентом';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.photo_uploads.finalized_at IS 'Время подтверждения загрузки; NULL — ссылка выдана, файл не подтверждён';
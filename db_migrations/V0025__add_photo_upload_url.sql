@@ -0,0 +1,4 @@
+-- Итоговая ссылка загрузки: нормализованная производная <имя>.jpg или оригинал, если формат не распознан
+ALTER TABLE t_p70271656_max_bot_diagnosis.photo_uploads ADD COLUMN IF NOT EXISTS photo_url TEXT;
+
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.photo_uploads.photo_url IS 'Ссылка, которая сохраняется в диагностике (нормализованное фото или оригинал)';
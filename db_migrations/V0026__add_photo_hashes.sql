@@ -0,0 +1,16 @@
+-- Хэши фото для поиска повторов: точный дубликат (SHA-256) переиспользует уже загруженный объект,
+-- похожее фото (dHash на расстоянии Хэмминга до 6 бит) сохраняется с отметкой similar_photo_id
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostic_photos ADD COLUMN IF NOT EXISTS sha256 CHAR(64);
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostic_photos ADD COLUMN IF NOT EXISTS phash BIGINT;
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostic_photos ADD COLUMN IF NOT EXISTS similar_photo_id INTEGER;
+
+ALTER TABLE t_p70271656_max_bot_diagnosis.photo_uploads ADD COLUMN IF NOT EXISTS phash BIGINT;
+-- Повторная загрузка того же файла в мастере чек-листа находит прежнюю загрузку
+CREATE INDEX IF NOT EXISTS idx_photo_uploads_sha256 ON t_p70271656_max_bot_diagnosis.photo_uploads(sha256) WHERE sha256 IS NOT NULL;
+
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.diagnostic_photos.sha256 IS 'SHA-256 содержимого фото (NULL для записей до учёта хэшей)';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.diagnostic_photos.phash IS 'Перцептивный хэш dHash 8x8';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.diagnostic_photos.similar_photo_id IS 'Похожее фото этой же диагностики (возможный повтор)';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.diagnostic_photos.photo_url IS 'URL фото; точные дубликаты внутри диагностики ссылаются на один объект';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.photo_uploads.phash IS 'Перцептивный хэш dHash 8x8';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.photo_uploads.sha256 IS 'SHA-256 содержимого, посчитанный сервером при подтверждении (сверяется с присланным клиентом)';
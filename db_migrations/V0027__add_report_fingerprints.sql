@@ -0,0 +1,7 @@
+-- Отпечаток содержимого отчёта: повторный запрос без изменений в диагностике отдаёт уже готовый PDF
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostics
+ADD COLUMN IF NOT EXISTS report_fingerprint CHAR(64),
+ADD COLUMN IF NOT EXISTS report_with_photos_fingerprint CHAR(64);
+
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.diagnostics.report_fingerprint IS 'SHA-256 данных отчёта без фото (шапка, ответы, фото приёмки, версия шаблона), по которым построен report_url';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.diagnostics.report_with_photos_fingerprint IS 'SHA-256 данных отчёта с фото, по которым построен report_with_photos_url';
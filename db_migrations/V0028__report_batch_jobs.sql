@@ -0,0 +1,2 @@
+-- Пакетная выгрузка отчётов за период в ZIP ведётся как задача обслуживания с контрольными точками
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.maintenance_jobs.job_type IS 'Тип задачи: storage_cleanup, archive, report_batch';
@@ -0,0 +1,62 @@
+-- Перенос строк из секции по умолчанию в новую месячную секцию выполняется через DELETE, и он вызывал
+-- унаследованный триггер trg_diagnostics_tombstone: для живых диагностик появлялись надгробия, и клиенты
+-- инкрементальной синхронизации удаляли эти диагностики из кэша. Теперь на время переноса пользовательские
+-- триггеры секции по умолчанию отключаются. Секции создаёт ensure_diagnostics_partitions; его вызывают
+-- max-webhook (save_diagnostic) и diagnostics (POST) перед вставкой. Строки, записанные другим путём
+-- в месяц без секции, остаются в секции по умолчанию до следующего вызова и переносятся им.
+CREATE OR REPLACE FUNCTION t_p70271656_max_bot_diagnosis.ensure_monthly_partitions(p_table TEXT, p_from DATE, p_to DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    v_schema CONSTANT TEXT := 't_p70271656_max_bot_diagnosis';
+    v_parent REGCLASS := format('%I.%I', v_schema, p_table)::regclass;
+    v_key TEXT;
+    v_columns TEXT;
+    v_month DATE := date_trunc('month', p_from)::date;
+    v_next DATE;
+    v_partition TEXT;
+    v_created INTEGER := 0;
+BEGIN
+    SELECT a.attname INTO v_key
+    FROM pg_partitioned_table p
+    JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+    WHERE p.partrelid = v_parent;
+    v_columns := t_p70271656_max_bot_diagnosis.table_copy_columns(v_parent);
+
+    WHILE v_month <= p_to LOOP
+        v_next := (v_month + interval '1 month')::date;
+        v_partition := p_table || '_' || to_char(v_month, 'YYYY_MM');
+        IF to_regclass(format('%I.%I', v_schema, v_partition)) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I.%I (LIKE %I.%I INCLUDING DEFAULTS INCLUDING GENERATED)',
+                v_schema, v_partition, v_schema, p_table);
+            IF to_regclass(format('%I.%I', v_schema, p_table || '_default')) IS NOT NULL THEN
+                -- Перенос — не удаление: триггеры (надгробия синхронизации) на это время отключены
+                EXECUTE format('ALTER TABLE %I.%I DISABLE TRIGGER USER', v_schema, p_table || '_default');
+                EXECUTE format(
+                    'WITH moved AS (DELETE FROM %I.%I WHERE %I >= %L AND %I < %L RETURNING %s) '
+                    'INSERT INTO %I.%I (%s) SELECT %s FROM moved',
+                    v_schema, p_table || '_default', v_key, v_month, v_key, v_next, v_columns,
+                    v_schema, v_partition, v_columns, v_columns
+                );
+                EXECUTE format('ALTER TABLE %I.%I ENABLE TRIGGER USER', v_schema, p_table || '_default');
+            END IF;
+            EXECUTE format('ALTER TABLE %I.%I ATTACH PARTITION %I.%I FOR VALUES FROM (%L) TO (%L)',
+                v_schema, p_table, v_schema, v_partition, v_month, v_next);
+            v_created := v_created + 1;
+        END IF;
+        v_month := v_next;
+    END LOOP;
+    RETURN v_created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Надгробия, которые прежние переносы записали для живых диагностик. Сами диагностики получают новую
+-- версию: клиенты, уже удалившие их по надгробию, загрузят их при следующей синхронизации
+WITH revived AS (
+    DELETE FROM t_p70271656_max_bot_diagnosis.diagnostics_tombstones t
+    USING t_p70271656_max_bot_diagnosis.diagnostics d
+    WHERE d.id = t.diagnostic_id
+    RETURNING t.diagnostic_id
+)
+UPDATE t_p70271656_max_bot_diagnosis.diagnostics
+SET sync_version = nextval('t_p70271656_max_bot_diagnosis.diagnostics_sync_seq')
+WHERE id IN (SELECT diagnostic_id FROM revived);
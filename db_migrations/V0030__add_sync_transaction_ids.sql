@@ -0,0 +1,36 @@
+-- Курсор синхронизации по версии из последовательности мог пропускать изменения: версия выдаётся при UPDATE,
+-- а видна после COMMIT, и долгая транзакция с версией N фиксируется, когда N+1 уже отдана клиенту.
+-- Теперь у строки и надгробия хранится идентификатор транзакции последнего изменения (sync_xid), а курсор —
+-- это xmin снимка (самая старая незавершённая транзакция): всё, что зафиксируется позже, имеет sync_xid не меньше
+-- курсора и придёт при следующей синхронизации. sync_version остаётся порядком выдачи изменений по страницам.
+-- Существующие строки получают sync_xid = 0: они зафиксированы раньше любого нового курсора.
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostics ADD COLUMN IF NOT EXISTS sync_xid XID8 NOT NULL DEFAULT '0';
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostics ALTER COLUMN sync_xid SET DEFAULT pg_current_xact_id();
+
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostics_tombstones ADD COLUMN IF NOT EXISTS sync_xid XID8 NOT NULL DEFAULT '0';
+ALTER TABLE t_p70271656_max_bot_diagnosis.diagnostics_tombstones ALTER COLUMN sync_xid SET DEFAULT pg_current_xact_id();
+
+CREATE INDEX IF NOT EXISTS idx_diagnostics_sync_xid ON t_p70271656_max_bot_diagnosis.diagnostics(sync_xid);
+CREATE INDEX IF NOT EXISTS idx_diagnostics_tombstones_sync_xid ON t_p70271656_max_bot_diagnosis.diagnostics_tombstones(sync_xid);
+
+CREATE OR REPLACE FUNCTION t_p70271656_max_bot_diagnosis.diagnostics_bump_sync_version() RETURNS trigger AS $$
+BEGIN
+    NEW.sync_version := nextval('t_p70271656_max_bot_diagnosis.diagnostics_sync_seq');
+    NEW.sync_xid := pg_current_xact_id();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p70271656_max_bot_diagnosis.diagnostics_record_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO t_p70271656_max_bot_diagnosis.diagnostics_tombstones (diagnostic_id, sync_version, sync_xid)
+    VALUES (OLD.id, nextval('t_p70271656_max_bot_diagnosis.diagnostics_sync_seq'), pg_current_xact_id())
+    ON CONFLICT (diagnostic_id) DO UPDATE SET
+        sync_version = EXCLUDED.sync_version, sync_xid = EXCLUDED.sync_xid, deleted_at = CURRENT_TIMESTAMP;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.diagnostics.sync_version IS 'Версия последнего изменения строки: порядок выдачи изменений синхронизации (видимость по версии не монотонна)';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.diagnostics.sync_xid IS 'Транзакция последнего изменения строки — граница курсора синхронизации';
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.diagnostics_tombstones.sync_xid IS 'Транзакция удаления диагностики';
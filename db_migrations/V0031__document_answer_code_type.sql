@@ -0,0 +1,7 @@
+-- answer_code остаётся VARCHAR, а не enum или smallint-кодом.
+-- Коды короткие (ok, bad, na — большинство строк), и на диске такая строка занимает 3–4 байта
+-- с однобайтовым заголовком; enum всегда 4 байта с выравниванием, smallint — 2 байта, но требует
+-- таблицы соответствия. Набор кодов открыт: это значения вариантов из справочников чек-листов
+-- (checklist_data.py, priemka_data.py), и новый вариант в справочнике не должен требовать ALTER TYPE.
+-- Смена типа переписала бы все месячные секции checklist_answers ради экономии в пределах байта на строку.
+COMMENT ON COLUMN t_p70271656_max_bot_diagnosis.checklist_answers.answer_code IS 'Код ответа из справочника (ok, bad, na, other, photo, значения вариантов вопросов); VARCHAR намеренно — набор кодов открыт';
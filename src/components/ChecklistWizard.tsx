@@ -7,6 +7,17 @@ import { Progress } from '@/components/ui/progress';
 import Icon from '@/components/ui/icon';
 import { checklistQuestions, type ChecklistQuestion, type AnswerOption } from '@/data/checklistData';
 
+const UPLOAD_PHOTO_URL = 'https://functions.poehali.dev/b394c821-025d-42c4-aa3a-200c10a6ddc0';
+
+// SHA-256 файла для учёта загрузки; crypto.subtle есть только в защищённом контексте
+const sha256Hex = async (file: File): Promise<string | undefined> => {
+  if (!window.crypto?.subtle) return undefined;
+  const digest = await window.crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+  return Array.from(new Uint8Array(digest))
+    .map((byte) => byte.toString(16).padStart(2, '0'))
+    .join('');
+};
+
 type Answer = {
   questionId: number;
   questionText: string;
@@ -136,30 +147,46 @@ const ChecklistWizard = ({ onComplete, onCancel }: ChecklistWizardProps) => {
     
     for (const file of files) {
       try {
-        const reader = new FileReader();
-        const base64 = await new Promise<string>((resolve, reject) => {
-          reader.onload = () => {
-            const result = reader.result as string;
-            const base64Data = result.split(',')[1];
-            resolve(base64Data);
-          };
-          reader.onerror = reject;
-          reader.readAsDataURL(file);
+        // Файл уходит в хранилище по подписанной ссылке, функция получает только метаданные
+        const presignResponse = await fetch(UPLOAD_PHOTO_URL, {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json',
+          },
+          body: JSON.stringify({
+            action: 'presign',
+            contentType: file.type || 'image/jpeg',
+            size: file.size,
+            questionNumber: currentQuestion.id,
+          }),
         });
-        
-        const response = await fetch('https://functions.poehali.dev/b394c821-025d-42c4-aa3a-200c10a6ddc0', {
+        if (!presignResponse.ok) continue;
+        const upload = await presignResponse.json();
+
+        const [putResponse, sha256] = await Promise.all([
+          fetch(upload.uploadUrl, {
+            method: 'PUT',
+            headers: upload.headers,
+            body: file,
+          }),
+          sha256Hex(file),
+        ]);
+        if (!putResponse.ok) continue;
+
+        const finalizeResponse = await fetch(UPLOAD_PHOTO_URL, {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
           },
           body: JSON.stringify({
-            image: base64,
-            filename: file.name,
+            action: 'finalize',
+            key: upload.key,
+            sha256,
           }),
         });
         
-        if (response.ok) {
-          const data = await response.json();
+        if (finalizeResponse.ok) {
+          const data = await finalizeResponse.json();
           uploadedUrls.push(data.url);
         }
       } catch (error) {
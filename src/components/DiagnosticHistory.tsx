@@ -15,6 +15,8 @@ type Diagnostic = {
   createdAt: string;
 };
 
+const GENERATE_REPORT_URL = 'https://functions.poehali.dev/65879cb6-37f7-4a96-9bdc-04cfe5915ba6';
+
 const diagnosticTypeLabels: Record<string, string> = {
   'priemka': 'Приемка',
   '5min': '5-ти минутка',
@@ -60,7 +62,7 @@ const DiagnosticHistory = () => {
     const key = `${id}-${withPhotos ? 'photo' : 'no'}`;
     setGeneratingPdfId(key);
     try {
-      let url = `https://functions.poehali.dev/65879cb6-37f7-4a96-9bdc-04cfe5915ba6?id=${id}`;
+      let url = `${GENERATE_REPORT_URL}?id=${id}`;
       if (withPhotos) {
         url += '&with_photos=true';
       }
@@ -237,6 +239,21 @@ const DiagnosticHistory = () => {
                   </div>
                   
                   <div className="flex gap-2">
+                    <Button
+                      asChild
+                      variant="outline"
+                      size="sm"
+                      className="bg-primary/10 hover:bg-primary/20 border-primary/30 text-primary hover:text-primary"
+                    >
+                      <a
+                        href={`${GENERATE_REPORT_URL}?id=${diagnostic.id}&format=html`}
+                        target="_blank"
+                        rel="noopener noreferrer"
+                      >
+                        <Icon name="Eye" size={16} className="mr-2" />
+                        Просмотр
+                      </a>
+                    </Button>
                     {diagnostic.diagnosticType === '5min' ? (
                       <>
                         <Button
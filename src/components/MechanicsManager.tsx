@@ -21,12 +21,12 @@ import {
 import { Badge } from '@/components/ui/badge';
 import Icon from '@/components/ui/icon';
 import { useToast } from '@/hooks/use-toast';
+import { adminHeaders } from '@/lib/adminAuth';
 
 type Mechanic = {
   id: number;
   name: string;
   phone: string;
-  pinCode: string;
   isActive: boolean;
   createdAt: string;
 };
@@ -96,7 +96,7 @@ const MechanicsManager = () => {
       setFormData({
         name: mechanic.name,
         phone: mechanic.phone,
-        pinCode: mechanic.pinCode,
+        pinCode: '',
       });
     } else {
       setEditingMechanic(null);
@@ -108,7 +108,11 @@ const MechanicsManager = () => {
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
 
-    if (!formData.name || !formData.phone || formData.pinCode.length !== 4) {
+    // Пин-код хранится в виде хеша: при редактировании пустое поле оставляет прежний пин-код
+    const pinValid = editingMechanic
+      ? formData.pinCode.length === 0 || formData.pinCode.length === 4
+      : formData.pinCode.length === 4;
+    if (!formData.name || !formData.phone || !pinValid) {
       toast({
         title: 'Ошибка',
         description: 'Заполните все поля корректно',
@@ -126,7 +130,7 @@ const MechanicsManager = () => {
 
       const response = await fetch(mechanicsApiUrl, {
         method,
-        headers: { 'Content-Type': 'application/json' },
+        headers: adminHeaders({ 'Content-Type': 'application/json' }),
         body: JSON.stringify(body),
       });
 
@@ -155,7 +159,7 @@ const MechanicsManager = () => {
     try {
       const response = await fetch(mechanicsApiUrl, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: adminHeaders({ 'Content-Type': 'application/json' }),
         body: JSON.stringify({
           id: mechanic.id,
           isActive: !mechanic.isActive,
@@ -188,6 +192,7 @@ const MechanicsManager = () => {
     try {
       const response = await fetch(`${mechanicsApiUrl}?id=${id}`, {
         method: 'DELETE',
+        headers: adminHeaders(),
       });
 
       if (!response.ok) throw new Error('Ошибка удаления');
@@ -258,7 +263,7 @@ const MechanicsManager = () => {
 
               <div className="space-y-2">
                 <Label htmlFor="pinCode" className="text-slate-300">
-                  Пин-код (4 цифры)
+                  {editingMechanic ? 'Новый пин-код (оставьте пустым, чтобы не менять)' : 'Пин-код (4 цифры)'}
                 </Label>
                 <Input
                   id="pinCode"
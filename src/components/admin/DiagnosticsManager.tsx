@@ -7,6 +7,7 @@ import { Badge } from '@/components/ui/badge';
 import Icon from '@/components/ui/icon';
 import { useToast } from '@/hooks/use-toast';
 import { useDebounce } from '@/hooks/useDebounce';
+import { adminHeaders } from '@/lib/adminAuth';
 
 const diagnosticTypeLabels: Record<string, string> = {
   priemka: 'Приемка',
@@ -38,6 +39,7 @@ const DiagnosticsManager = ({
   const [dateFrom, setDateFrom] = useState('');
   const [dateTo, setDateTo] = useState('');
   const [deleteMode, setDeleteMode] = useState(false);
+  const [exporting, setExporting] = useState(false);
   const [deleteDateFrom, setDeleteDateFrom] = useState('');
   const [deleteDateTo, setDeleteDateTo] = useState('');
   const [currentPage, setCurrentPage] = useState(1);
@@ -93,7 +95,8 @@ const DiagnosticsManager = ({
   const deleteDiagnostic = async (id: number) => {
     try {
       const response = await fetch(`https://functions.poehali.dev/e76024e1-4735-4e57-bf5f-060276b574c8?id=${id}`, {
-        method: 'DELETE'
+        method: 'DELETE',
+        headers: adminHeaders()
       });
       
       if (!response.ok) throw new Error('Ошибка удаления');
@@ -144,7 +147,7 @@ const DiagnosticsManager = ({
       try {
         const response = await fetch(
           `https://functions.poehali.dev/e76024e1-4735-4e57-bf5f-060276b574c8?id=${diagnostic.id}`,
-          { method: 'DELETE' }
+          { method: 'DELETE', headers: adminHeaders() }
         );
         if (response.ok) {
           deleted++;
@@ -177,6 +180,35 @@ const DiagnosticsManager = ({
     setCurrentPage(1);
   };
 
+  // Выгрузка формируется на сервере по фильтрам типа и дат и отдаётся ссылкой на файл
+  const exportDiagnostics = async (format: 'csv' | 'xlsx') => {
+    setExporting(true);
+    try {
+      const params = new URLSearchParams({ export: format });
+      if (dateFrom) params.set('from', dateFrom);
+      if (dateTo) params.set('to', dateTo);
+      if (filterType !== 'all') params.set('type', filterType);
+
+      const response = await fetch(
+        `https://functions.poehali.dev/e76024e1-4735-4e57-bf5f-060276b574c8?${params}`,
+        { headers: adminHeaders() }
+      );
+      if (!response.ok) throw new Error('Ошибка выгрузки');
+
+      const result = await response.json();
+      window.open(result.url, '_blank');
+      toast({ title: 'Выгрузка готова', description: `Строк: ${result.rows}` });
+    } catch (error) {
+      toast({
+        title: 'Ошибка',
+        description: 'Не удалось выгрузить диагностики',
+        variant: 'destructive'
+      });
+    } finally {
+      setExporting(false);
+    }
+  };
+
   const goToPage = (page: number) => {
     if (page >= 1 && page <= totalPages) {
       setCurrentPage(page);
@@ -224,6 +256,31 @@ const DiagnosticsManager = ({
               )}
             </CardDescription>
           </div>
+          <div className="flex items-center gap-2">
+          {!deleteMode && (
+            <>
+              <Button
+                size="sm"
+                variant="outline"
+                onClick={() => exportDiagnostics('xlsx')}
+                disabled={exporting}
+                className="flex items-center gap-2"
+              >
+                <Icon name={exporting ? "Loader2" : "FileSpreadsheet"} size={16} className={exporting ? "animate-spin" : ""} />
+                Excel
+              </Button>
+              <Button
+                size="sm"
+                variant="outline"
+                onClick={() => exportDiagnostics('csv')}
+                disabled={exporting}
+                className="flex items-center gap-2"
+              >
+                <Icon name="FileDown" size={16} />
+                CSV
+              </Button>
+            </>
+          )}
           <Button
             size="sm"
             variant={deleteMode ? "outline" : "destructive"}
@@ -233,6 +290,7 @@ const DiagnosticsManager = ({
             <Icon name={deleteMode ? "X" : "Trash2"} size={16} />
             {deleteMode ? "Отмена" : "Удалить по датам"}
           </Button>
+          </div>
         </div>
       </CardHeader>
       <CardContent className="space-y-4">
@@ -377,6 +435,17 @@ const DiagnosticsManager = ({
                             <span className="text-xs text-slate-500">
                               {new Date(diagnostic.createdAt).toLocaleString('ru-RU')}
                             </span>
+                            {Number(diagnostic.defectCount) > 0 && (
+                              <Badge variant="outline" className="bg-red-500/10 text-red-400 border-red-500/30">
+                                Неисправностей: {diagnostic.defectCount}
+                              </Badge>
+                            )}
+                            {Number(diagnostic.photoCount) > 0 && (
+                              <span className="text-xs text-slate-400 flex items-center gap-1">
+                                <Icon name="Camera" size={12} />
+                                {diagnostic.photoCount}
+                              </span>
+                            )}
                           </div>
                           <div className="text-sm text-slate-300">
                             <div>Механик: <span className="text-white font-medium">{diagnostic.mechanic}</span></div>
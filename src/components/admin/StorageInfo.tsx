@@ -3,17 +3,23 @@ import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import Icon from '@/components/ui/icon';
 import { useToast } from '@/hooks/use-toast';
+import { adminHeaders } from '@/lib/adminAuth';
 
 type StorageData = {
   totalSize: number;
   totalSizeFormatted: string;
   totalFiles: number;
+  unsizedFiles?: number;
   photos: { size: number; sizeFormatted: string; count: number };
   reports: { size: number; sizeFormatted: string; count: number };
   other: { size: number; sizeFormatted: string; count: number };
 };
 
 type CleanupResult = {
+  jobId: number;
+  done: boolean;
+  error?: string | null;
+  scannedFiles: number;
   dryRun: boolean;
   orphanFiles: number;
   orphanSize: number;
@@ -25,6 +31,8 @@ type CleanupResult = {
 
 const STORAGE_URL = 'https://functions.poehali.dev/e1bacd58-95dc-4051-ae23-ee4fefa08c66';
 const CLEANUP_URL = 'https://functions.poehali.dev/2698715e-5a7c-43d5-bc62-78b8d2a798c6';
+// Пауза перед повтором, если вызов не продвинул задачу (её порцию обрабатывает другой вызов)
+const CLEANUP_RETRY_DELAY = 2000;
 
 const StorageInfo = () => {
   const { toast } = useToast();
@@ -33,11 +41,14 @@ const StorageInfo = () => {
   const [scanning, setScanning] = useState(false);
   const [cleaning, setCleaning] = useState(false);
   const [scanResult, setScanResult] = useState<CleanupResult | null>(null);
+  const [scannedFiles, setScannedFiles] = useState(0);
 
-  const loadData = async () => {
+  const loadData = async (reconcile = false) => {
     setLoading(true);
     try {
-      const response = await fetch(STORAGE_URL);
+      const response = await fetch(reconcile ? `${STORAGE_URL}?reconcile=true` : STORAGE_URL, {
+        headers: adminHeaders()
+      });
       if (response.ok) {
         setData(await response.json());
       }
@@ -52,21 +63,38 @@ const StorageInfo = () => {
     loadData();
   }, []);
 
+  // Задача очистки выполняется порциями: повторяем вызов, пока сервер не сообщит о завершении
+  const runCleanupJob = async (dryRun: boolean): Promise<CleanupResult> => {
+    let jobId: number | undefined;
+    let scanned = -1;
+    setScannedFiles(0);
+    for (;;) {
+      const response = await fetch(CLEANUP_URL, {
+        method: 'POST',
+        headers: adminHeaders({ 'Content-Type': 'application/json' }),
+        body: JSON.stringify(jobId ? { dryRun, jobId } : { dryRun, restart: true })
+      });
+      if (!response.ok) throw new Error('Cleanup request failed');
+      const result: CleanupResult = await response.json();
+      jobId = result.jobId;
+      setScannedFiles(result.scannedFiles);
+      if (result.done) return result;
+      if (result.error) throw new Error(result.error);
+      if (result.scannedFiles === scanned) {
+        await new Promise((resolve) => setTimeout(resolve, CLEANUP_RETRY_DELAY));
+      }
+      scanned = result.scannedFiles;
+    }
+  };
+
   const scanOrphans = async () => {
     setScanning(true);
     setScanResult(null);
     try {
-      const response = await fetch(CLEANUP_URL, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ dryRun: true })
-      });
-      if (response.ok) {
-        const result: CleanupResult = await response.json();
-        setScanResult(result);
-        if (result.orphanFiles === 0 && result.orphanDbRecords === 0) {
-          toast({ title: 'Всё чисто', description: 'Ненужных файлов не найдено' });
-        }
+      const result = await runCleanupJob(true);
+      setScanResult(result);
+      if (result.orphanFiles === 0 && result.orphanDbRecords === 0) {
+        toast({ title: 'Всё чисто', description: 'Ненужных файлов не найдено' });
       }
     } catch (e) {
       console.error('Scan error:', e);
@@ -85,23 +113,16 @@ const StorageInfo = () => {
     }
     setCleaning(true);
     try {
-      const response = await fetch(CLEANUP_URL, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ dryRun: false })
+      const result = await runCleanupJob(false);
+      const msgs = [];
+      if (result.deletedFiles) msgs.push(`${result.deletedFiles} файлов`);
+      if (result.deletedDbRecords) msgs.push(`${result.deletedDbRecords} записей БД`);
+      toast({
+        title: 'Очистка завершена',
+        description: msgs.length ? `Удалено: ${msgs.join(', ')}` : 'Нечего удалять'
       });
-      if (response.ok) {
-        const result: CleanupResult = await response.json();
-        const msgs = [];
-        if (result.deletedFiles) msgs.push(`${result.deletedFiles} файлов`);
-        if (result.deletedDbRecords) msgs.push(`${result.deletedDbRecords} записей БД`);
-        toast({
-          title: 'Очистка завершена',
-          description: msgs.length ? `Удалено: ${msgs.join(', ')}` : 'Нечего удалять'
-        });
-        setScanResult(null);
-        loadData();
-      }
+      setScanResult(null);
+      loadData();
     } catch (e) {
       console.error('Cleanup error:', e);
       toast({ title: 'Ошибка', description: 'Не удалось выполнить очистку', variant: 'destructive' });
@@ -127,7 +148,7 @@ const StorageInfo = () => {
             <Button
               size="sm"
               variant="ghost"
-              onClick={loadData}
+              onClick={() => loadData()}
               disabled={loading}
               className="h-8 w-8 p-0"
             >
@@ -201,6 +222,17 @@ const StorageInfo = () => {
               </div>
             </div>
 
+            {!!data.unsizedFiles && (
+              <button
+                type="button"
+                onClick={() => loadData(true)}
+                disabled={loading}
+                className="text-xs text-slate-400 hover:text-white underline underline-offset-2"
+              >
+                Размер {data.unsizedFiles} файлов не учтён — сверить с хранилищем
+              </button>
+            )}
+
             {scanResult && (scanResult.orphanFiles > 0 || scanResult.orphanDbRecords > 0) && (
               <div className="bg-amber-950/30 border border-amber-700/40 rounded-lg p-3 space-y-3">
                 <div className="flex items-center gap-2 text-amber-400 text-sm font-medium">
@@ -222,7 +254,7 @@ const StorageInfo = () => {
                   {cleaning ? (
                     <>
                       <Icon name="Loader2" size={14} className="animate-spin mr-2" />
-                      Удаление...
+                      Удаление... ({scannedFiles} файлов проверено)
                     </>
                   ) : (
                     <>
@@ -244,7 +276,7 @@ const StorageInfo = () => {
               {scanning ? (
                 <>
                   <Icon name="Loader2" size={14} className="animate-spin mr-2" />
-                  Сканирование...
+                  Сканирование... ({scannedFiles} файлов проверено)
                 </>
               ) : (
                 <>
@@ -4,10 +4,32 @@ interface CacheEntry {
   data: any[];
   timestamp: number;
   etag?: string;
+  cursor?: string;
 }
 
+interface SyncResponse {
+  items: any[];
+  deleted: number[];
+  cursor: string;
+  hasMore: boolean;
+}
+
+const API_URL = 'https://functions.poehali.dev/e76024e1-4735-4e57-bf5f-060276b574c8';
+const LIST_LIMIT = 500;
 const CACHE_KEY = 'diagnostics_cache';
 const CACHE_DURATION = 5 * 60 * 1000; // 5 минут
+// Надгробия удалённых записей хранятся на сервере 30 дней; старый кэш проще загрузить заново
+const SYNC_MAX_AGE = 7 * 24 * 60 * 60 * 1000;
+
+const mergeChanges = (data: any[], changes: SyncResponse): any[] => {
+  const deleted = new Set(changes.deleted);
+  const changed = new Map(changes.items.map((item) => [item.id, item]));
+  const merged = data
+    .filter((item) => !deleted.has(item.id) && !changed.has(item.id))
+    .concat(changes.items);
+  merged.sort((a, b) => new Date(b.createdAt).getTime() - new Date(a.createdAt).getTime());
+  return merged.slice(0, LIST_LIMIT);
+};
 
 export const useCachedDiagnostics = () => {
   const [diagnostics, setDiagnostics] = useState<any[]>([]);
@@ -16,33 +38,39 @@ export const useCachedDiagnostics = () => {
   const abortControllerRef = useRef<AbortController | null>(null);
   const cacheRef = useRef<CacheEntry | null>(null);
 
-  const loadFromCache = useCallback(() => {
+  const readCache = useCallback((): CacheEntry | null => {
     try {
       const cached = localStorage.getItem(CACHE_KEY);
       if (cached) {
         const entry: CacheEntry = JSON.parse(cached);
-        const age = Date.now() - entry.timestamp;
-        
-        if (age < CACHE_DURATION) {
-          cacheRef.current = entry;
-          setDiagnostics(entry.data);
-          return true;
-        } else {
-          localStorage.removeItem(CACHE_KEY);
+        if (Date.now() - entry.timestamp < SYNC_MAX_AGE) {
+          return entry;
         }
+        localStorage.removeItem(CACHE_KEY);
       }
     } catch (err) {
       console.error('Cache read error:', err);
     }
-    return false;
+    return null;
   }, []);
 
-  const saveToCache = useCallback((data: any[], etag?: string) => {
+  const loadFromCache = useCallback((maxAge = CACHE_DURATION) => {
+    const entry = readCache();
+    if (entry && Date.now() - entry.timestamp < maxAge) {
+      cacheRef.current = entry;
+      setDiagnostics(entry.data);
+      return true;
+    }
+    return false;
+  }, [readCache]);
+
+  const saveToCache = useCallback((data: any[], etag?: string, cursor?: string) => {
     try {
       const entry: CacheEntry = {
         data,
         timestamp: Date.now(),
-        etag
+        etag,
+        cursor
       };
       cacheRef.current = entry;
       localStorage.setItem(CACHE_KEY, JSON.stringify(entry));
@@ -65,34 +93,50 @@ export const useCachedDiagnostics = () => {
     
     abortControllerRef.current = new AbortController();
 
+    const signal = abortControllerRef.current.signal;
+
     try {
-      const response = await fetch(
-        'https://functions.poehali.dev/e76024e1-4735-4e57-bf5f-060276b574c8?limit=500',
-        {
-          signal: abortControllerRef.current.signal
+      // При наличии курсора запрашиваем только изменения с момента прошлой синхронизации
+      const cached = readCache();
+      if (cached?.cursor) {
+        let data = cached.data;
+        let cursor = cached.cursor;
+        for (;;) {
+          const response = await fetch(`${API_URL}?since=${encodeURIComponent(cursor)}`, { signal });
+          if (!response.ok) throw new Error('Ошибка синхронизации');
+          const changes: SyncResponse = await response.json();
+          data = mergeChanges(data, changes);
+          cursor = changes.cursor;
+          if (!changes.hasMore) break;
         }
-      );
+        setDiagnostics(data);
+        saveToCache(data, cached.etag, cursor);
+        return;
+      }
+
+      const response = await fetch(`${API_URL}?limit=${LIST_LIMIT}`, { signal });
 
       if (!response.ok) throw new Error('Ошибка загрузки');
 
       const data = await response.json();
       const safeData = Array.isArray(data) ? data : [];
       const etag = response.headers.get('ETag') || undefined;
+      const cursor = response.headers.get('X-Sync-Cursor') || undefined;
       
       setDiagnostics(safeData);
-      saveToCache(safeData, etag);
+      saveToCache(safeData, etag, cursor);
     } catch (err: any) { // eslint-disable-line @typescript-eslint/no-explicit-any
       if (err.name === 'AbortError') {
         return;
       }
-      if (!loadFromCache()) {
+      if (!loadFromCache(SYNC_MAX_AGE)) {
         setError('Не удалось загрузить диагностики');
       }
-      console.error('Fetch error:', err.message || err, 'for', 'https://functions.poehali.dev/e76024e1-4735-4e57-bf5f-060276b574c8?limit=500');
+      console.error('Fetch error:', err.message || err, 'for', API_URL);
     } finally {
       setLoading(false);
     }
-  }, [loadFromCache, saveToCache]);
+  }, [loadFromCache, readCache, saveToCache]);
 
   const invalidateCache = useCallback(() => {
     localStorage.removeItem(CACHE_KEY);
@@ -119,8 +163,10 @@ export const useCachedDiagnostics = () => {
     diagnostics,
     loading,
     error,
-    reload: invalidateCache,
+    // Обновление дозапрашивает изменения по курсору; invalidate сбрасывает кэш и загружает список заново
+    reload: () => loadDiagnostics(true),
     refresh: () => loadDiagnostics(true),
+    invalidate: invalidateCache,
     isCached,
     cacheAge
   };
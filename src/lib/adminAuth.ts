@@ -0,0 +1,29 @@
+const TOKEN_KEY = 'admin_token';
+
+const decodePayload = (token: string): { exp?: number } | null => {
+  const [payload] = token.split('.');
+  if (!payload) return null;
+  try {
+    const base64 = payload.replace(/-/g, '+').replace(/_/g, '/');
+    return JSON.parse(atob(base64.padEnd(base64.length + ((4 - (base64.length % 4)) % 4), '=')));
+  } catch {
+    return null;
+  }
+};
+
+export const getAdminToken = (): string | null => localStorage.getItem(TOKEN_KEY);
+
+// Подпись проверяет сервер; на клиенте смотрим только срок действия, чтобы вовремя отправить на вход
+export const isAdminTokenValid = (): boolean => {
+  const token = getAdminToken();
+  if (!token) return false;
+  const payload = decodePayload(token);
+  return !!payload?.exp && payload.exp * 1000 > Date.now();
+};
+
+export const clearAdminToken = () => localStorage.removeItem(TOKEN_KEY);
+
+export const adminHeaders = (headers: Record<string, string> = {}): Record<string, string> => {
+  const token = getAdminToken();
+  return token ? { ...headers, 'X-Auth-Token': token } : headers;
+};
@@ -2,6 +2,7 @@ import { useEffect, Component, ReactNode } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useToast } from '@/hooks/use-toast';
 import { useCachedDiagnostics } from '@/hooks/useCachedDiagnostics';
+import { clearAdminToken, isAdminTokenValid } from '@/lib/adminAuth';
 import AdminHeader from '@/components/admin/AdminHeader';
 import WebhookManager from '@/components/admin/WebhookManager';
 import DiagnosticsManager from '@/components/admin/DiagnosticsManager';
@@ -47,8 +48,8 @@ const Admin = () => {
   const setupUrl = 'https://functions.poehali.dev/8e7d060d-23fb-4628-88e9-e251279d6a28';
 
   useEffect(() => {
-    const token = localStorage.getItem('admin_token');
-    if (!token) {
+    if (!isAdminTokenValid()) {
+      clearAdminToken();
       navigate('/login');
     }
   }, [navigate]);
@@ -60,7 +61,7 @@ const Admin = () => {
   }, [error]); // eslint-disable-line react-hooks/exhaustive-deps
 
   const handleLogout = () => {
-    localStorage.removeItem('admin_token');
+    clearAdminToken();
     toast({ title: 'Выход выполнен' });
     navigate('/login');
   };